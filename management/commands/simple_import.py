@@ -0,0 +1,150 @@
+import json
+import sys
+import warnings
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from ...simple_imports.system_importer import SystemImporter
+from ...simple_imports.checkpoint import FileCheckpoint
+from ...simple_imports.sources import get_source
+from ...simple_imports.progress import ChunkStats, ThroughputObserver
+from ...simple_imports.tuning import AdaptiveChunkSize
+
+
+class ProgressReporter(ThroughputObserver):
+    """Writes running totals, throughput and an ETA to the command's stderr after every chunk
+    """
+
+    def __init__(self, stderr, **kwargs):
+        super().__init__(**kwargs)
+        self.stderr = stderr
+
+    def chunk_committed(self, importer: SystemImporter, stats: ChunkStats):
+        super().chunk_committed(importer, stats)
+
+        message = f'{self.rows_read} rows  {self.rows_per_second or 0:.0f} rows/s'
+        if self.eta is not None:
+            message = f'{message}  {stats.done:.1%}  ETA {self.eta:.0f}s'
+
+        #: Redraw a single line on a terminal, one line per chunk otherwise (e.g. when logging to a file)
+        if sys.stderr.isatty():
+            self.stderr.write(f'\r{message}', ending='')
+        else:
+            self.stderr.write(message)
+        self.stderr.flush()
+
+    def finished(self, importer: SystemImporter):
+        super().finished(importer)
+        if sys.stderr.isatty():
+            self.stderr.write('')
+
+
+class Command(BaseCommand):
+    help = ('Import a file with a list of ModelImporters (the transitive closure of the root importer\'s dependencies).'
+            '  Progress is reported on stderr, and a json summary is written to stdout when the import finishes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('importers', help='Dotted path to a list of ModelImporter classes')
+        parser.add_argument('path', help='Input file: csv, jsonl or xlsx (csv/jsonl may be gz, bz2 or xz compressed)')
+        parser.add_argument('--chunk-size', type=int, default=10000,
+                            help='Rows resolved and committed together (default: 10000)')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Threads per lookup/build stage; more than 1 runs the import as a pipeline')
+        parser.add_argument('--batch-size', type=int, default=None, help='Objects per INSERT statement')
+        parser.add_argument('--checkpoint', default=None,
+                            help='Checkpoint file, to resume an interrupted import from its last committed chunk '
+                                 '(removed once the import finishes)')
+        parser.add_argument('--header', action='store_true', help='The first row of the file holds column names')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Run the whole import, then roll it back')
+        parser.add_argument('--database', default=None, help='Database alias objects are written to')
+        parser.add_argument('--read-database', default=None,
+                            help='Database alias dependencies are looked up in (e.g. a read replica)')
+        parser.add_argument('--stall-timeout', type=float, default=None,
+                            help='Abort the import if a single chunk takes longer than this many seconds')
+        parser.add_argument('--adaptive', action='store_true',
+                            help='Tune the chunk size for throughput as the import runs (within a tenth and ten '
+                                 'times --chunk-size)')
+        parser.add_argument('--memory-budget', type=int, default=None, metavar='MB',
+                            help='(--adaptive) Shrink chunks while the process uses more memory than this')
+        parser.add_argument('--check-indexes', action='store_true',
+                            help='Report dependencies whose lookups can\'t use an index (with the plan of a sample '
+                                 'lookup) before importing')
+        parser.add_argument('--scope', action='append', default=[], metavar='FIELD=VALUE',
+                            help='Look dependencies up within FIELD=VALUE (e.g. company_id=3) for the models having '
+                                 'that field; may be repeated')
+
+    def handle(self, *args, **options):
+        try:
+            importers = import_string(options['importers'])
+        except ImportError as e:
+            raise CommandError(f'Could not import {options["importers"]}: {e}')
+
+        if options['dry_run'] and options['workers'] > 1:
+            #: Pipeline workers write through their own connections, which the rollback wouldn't cover
+            raise CommandError('--dry-run can only be used with a single worker.')
+
+        scope = {}
+        for entry in options['scope']:
+            name, sep, value = entry.partition('=')
+            if not sep or not name:
+                raise CommandError(f'Invalid --scope {entry!r} (expected FIELD=VALUE).')
+            scope[name] = value
+
+        source = get_source(options['path'], header=options['header'])
+        checkpoint = FileCheckpoint(options['checkpoint']) if options['checkpoint'] and not options['dry_run'] \
+            else None
+
+        reporter = ProgressReporter(self.stderr, stall_timeout=options['stall_timeout'])
+        observers = [reporter]
+        if options['adaptive']:
+            chunk_size = options['chunk_size']
+            memory_budget = options['memory_budget'] * 2 ** 20 if options['memory_budget'] else None
+            observers.append(AdaptiveChunkSize(min_size=max(1, chunk_size // 10), max_size=chunk_size * 10,
+                                               memory_budget=memory_budget))
+
+        importer = SystemImporter(
+            importers, source, chunk_size=options['chunk_size'], checkpoint=checkpoint,
+            batch_size=options['batch_size'], observers=observers, using=options['read_database'],
+            write_using=options['database'], scope=scope
+        )
+
+        if options['check_indexes']:
+            self.check_indexes(importer)
+
+        if options['dry_run']:
+            with transaction.atomic(using=options['database']):
+                self.run(importer, options['workers'])
+                transaction.set_rollback(True)
+        else:
+            self.run(importer, options['workers'])
+
+        self.stdout.write(json.dumps({
+            'rows': importer.row_offset,
+            'created': importer.stored_objects,
+            'errors': len(importer.errors),
+            'unchanged': importer.unchanged_rows,
+            'seconds': round(reporter.seconds, 3),
+            'rows_per_second': round(reporter.rows_per_second, 1) if reporter.rows_per_second else None,
+            'dry_run': options['dry_run'],
+        }))
+
+    def check_indexes(self, importer: SystemImporter):
+        with warnings.catch_warnings():
+            #: (Reported below instead)
+            warnings.simplefilter('ignore')
+            reports = importer.check_indexes(explain=True)
+
+        for report in reports:
+            self.stderr.write(report.message)
+            if report.plan:
+                self.stderr.write(f'  {report.plan}')
+
+    @staticmethod
+    def run(importer: SystemImporter, workers: int):
+        if workers > 1:
+            importer.import_pipelined(workers=workers)
+        else:
+            importer.import_data()
@@ -21,23 +21,29 @@ setup(
     classifiers=[
         'Environment :: Web Environment',
         'Framework :: Django',
-        'Framework :: Django :: 2.0',
+        'Framework :: Django :: 4.1',
         'Intended Audience :: Developers',
         'License :: OSI Approved :: BSD License',  # example license
         'Operating System :: OS Independent',
         'Programming Language :: Python',
-        'Programming Language :: Python :: 3.6',
+        'Programming Language :: Python :: 3.8',
         'Development Status :: 3 - Alpha',
         'Topic :: Internet :: WWW/HTTP',
         'Topic :: Internet :: WWW/HTTP :: Dynamic Content',
     ],
     # Taken from pip freeze
     install_requires=[
-        'Django>=2.0',
+        #: (async querysets, e.g. afirst/abulk_create)
+        'Django>=4.1',
         'python-dateutil>=2.7.0',
         'flexible-dotdict>=0.2.1',
         'pytz>=2018.3',
         'six>=1.11.0'
     ],
-    python_requires='>=3.6, <4',
+    extras_require={
+        'excel': ['openpyxl>=2.5'],
+        'columnar': ['numpy>=1.14', 'pandas>=0.23'],
+        'tuning': ['psutil'],
+    },
+    python_requires='>=3.8, <4',
 )
\ No newline at end of file
@@ -0,0 +1,175 @@
+"""Session tuning for large imports (see `SystemImporter.bulk_load`).
+
+    with importer.bulk_load(defer_indexes=True):
+        importer.import_data()
+
+Within the block, connections to the database trade durability of the most recent commits for write throughput:
+SQLite runs in WAL mode without an fsync per commit (`synchronous = NORMAL`) and with a larger page cache, and
+PostgreSQL commits without waiting for the WAL flush (`synchronous_commit = off`).  Neither setting can corrupt the
+database: a crash (of the machine, rather than the process) may only lose the last few commits, which a checkpointed
+import simply re-imports.  Previous values are restored when the block exits.
+"""
+import re
+
+from typing import *
+
+from django.db import connections, models, router
+from django.db.backends.signals import connection_created
+
+SQLITE_SETTINGS: Dict[str,Union[str,int]] = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -65536,  #: (in KiB when negative, i.e. 64MB)
+    'temp_store': 'MEMORY',
+}
+
+POSTGRESQL_SETTINGS: Dict[str,Union[str,int]] = {
+    'synchronous_commit': 'off',
+}
+
+DEFAULT_SETTINGS = {
+    'sqlite': SQLITE_SETTINGS,
+    'postgresql': POSTGRESQL_SETTINGS,
+}
+
+#: PRAGMA values can't be passed as parameters
+_PRAGMA_VALUE = re.compile(r'^-?[A-Za-z0-9_]+$')
+
+
+class BulkLoad(object):
+    """Context manager applying bulk-load session settings (and optionally dropping secondary indexes) for a block.
+
+    Settings apply to the connection of the thread entering the block, and to every connection opened for the same
+    alias while the block runs (e.g. by the worker threads of `SystemImporter.import_pipelined`).
+
+    With `defer_indexes`, the non-unique indexes of `models` (i.e. indexes that don't enforce a constraint) are
+    dropped on entry, and created again from their original definitions on exit, even if the block raised.  If
+    re-creating them fails, the error lists the statements still to run (also kept in `self.dropped_indexes`).
+    Only SQLite and PostgreSQL support index deferral; other backends keep their indexes.
+    """
+
+    def __init__(self, models: Iterable[Type[models.Model]] = (), using: str = None,
+                 settings: Dict[str,Union[str,int]] = None, defer_indexes: bool = False):
+        """
+        :param models:          The models being written (whose indexes are deferred)
+        :param using:           Database alias (defaults to where the first model is routed for writes)
+        :param settings:        Overrides (or additions) to the backend's default settings, e.g.
+                                {'synchronous': 'OFF'} to skip fsyncs altogether
+        :param defer_indexes:   Drop secondary indexes of `models` for the block
+        """
+        self.models = list(models)
+        self.using = using or (router.db_for_write(self.models[0]) if self.models else 'default')
+        self.overrides = settings or {}
+        self.defer_indexes = defer_indexes
+
+        self.vendor: str = None
+        self.settings: Dict[str,Union[str,int]] = {}
+        self.previous: Dict[str,Union[str,int]] = {}
+
+        #: (name, CREATE INDEX statement) of the indexes dropped on entry, and not yet created again
+        self.dropped_indexes: List[Tuple[str,str]] = []
+
+    def __enter__(self) -> 'BulkLoad':
+        connection = connections[self.using]
+        if connection.in_atomic_block:
+            #: SQLite can't switch journal modes within a transaction, and the settings would end with it on others
+            raise RuntimeError('A bulk load must start outside of any transaction.')
+
+        self.vendor = connection.vendor
+        self.settings = {**DEFAULT_SETTINGS.get(self.vendor, {}), **self.overrides}
+
+        connection.ensure_connection()
+        self.previous = self._read_settings(connection)
+        self._apply_settings(connection, self.settings)
+        connection_created.connect(self._on_connection_created)
+
+        if self.defer_indexes:
+            self._drop_indexes(connection)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        connection_created.disconnect(self._on_connection_created)
+        connection = connections[self.using]
+        try:
+            if self.dropped_indexes:
+                self._create_indexes(connection)
+        finally:
+            self._apply_settings(connection, self.previous)
+
+    def _on_connection_created(self, sender, connection, **kwargs):
+        if connection.alias == self.using:
+            self._apply_settings(connection, self.settings)
+
+    def _read_settings(self, connection) -> Dict[str,Union[str,int]]:
+        previous = {}
+        with connection.cursor() as cursor:
+            for name in self.settings:
+                if self.vendor == 'sqlite':
+                    cursor.execute(f'PRAGMA {self._check_pragma(name)}')
+                elif self.vendor == 'postgresql':
+                    cursor.execute('SELECT current_setting(%s)', [name])
+                else:
+                    continue
+                previous[name] = cursor.fetchone()[0]
+        return previous
+
+    def _apply_settings(self, connection, settings: Dict[str,Union[str,int]]):
+        if not settings:
+            return
+
+        with connection.cursor() as cursor:
+            for name, value in settings.items():
+                if self.vendor == 'sqlite':
+                    cursor.execute(f'PRAGMA {self._check_pragma(name)} = {self._check_pragma(value)}')
+                elif self.vendor == 'postgresql':
+                    cursor.execute('SELECT set_config(%s, %s, false)', [name, str(value)])
+
+    @staticmethod
+    def _check_pragma(value) -> str:
+        value = str(value)
+        if not _PRAGMA_VALUE.match(value):
+            raise ValueError(f'Invalid pragma name or value: {value!r}')
+        return value
+
+    def _get_secondary_indexes(self, cursor, table: str) -> List[Tuple[str,str]]:
+        """(name, definition) of the indexes of `table` that neither are unique nor back a constraint
+        """
+        if self.vendor == 'sqlite':
+            #: Indexes created for UNIQUE/PRIMARY KEY constraints have no sql
+            cursor.execute(
+                "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = %s AND sql IS NOT NULL",
+                [table]
+            )
+            return [(name, sql) for name, sql in cursor.fetchall() if not sql.upper().startswith('CREATE UNIQUE')]
+
+        if self.vendor == 'postgresql':
+            cursor.execute(
+                'SELECT c.relname, pg_get_indexdef(i.indexrelid) FROM pg_index i '
+                'JOIN pg_class c ON c.oid = i.indexrelid JOIN pg_class t ON t.oid = i.indrelid '
+                'WHERE t.relname = %s AND pg_table_is_visible(t.oid) AND NOT i.indisunique AND NOT i.indisprimary '
+                'AND NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conindid = i.indexrelid)',
+                [table]
+            )
+            return list(cursor.fetchall())
+
+        return []
+
+    def _drop_indexes(self, connection):
+        qn = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            for model in self.models:
+                for name, sql in self._get_secondary_indexes(cursor, model._meta.db_table):
+                    cursor.execute(f'DROP INDEX {qn(name)}')
+                    self.dropped_indexes.append((name, sql))
+
+    def _create_indexes(self, connection):
+        with connection.cursor() as cursor:
+            while self.dropped_indexes:
+                name, sql = self.dropped_indexes[0]
+                try:
+                    cursor.execute(sql)
+                except Exception as e:
+                    statements = '; '.join(sql for _, sql in self.dropped_indexes)
+                    raise RuntimeError(f'Could not re-create index {name} after the bulk load ({e}).  '
+                                       f'Statements still to run: {statements}') from e
+                self.dropped_indexes.pop(0)
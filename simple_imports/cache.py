@@ -0,0 +1,89 @@
+import threading
+from collections import OrderedDict
+
+from typing import *
+
+from django.db.models import Model
+
+
+class DependencyCache(object):
+    """Objects retrieved by the managers' batch lookups, keyed by model and lookup values, so that keys seen by an
+    earlier chunk (or an earlier file of a batch, see `SystemImporter.import_batch`) are not queried again.
+
+    Only objects that were found are cached (a key that's missing now may be created later).  Entries are evicted
+    least recently used first once there are more than `max_entries` of them.
+
+    N.B: Cached objects aren't refreshed: objects deleted or re-keyed by someone else while the cache is in use are
+         still handed out.  Share a cache across the files of a batch, not across batches.
+    """
+
+    def __init__(self, max_entries: int = 100000):
+        self.max_entries = max_entries
+
+        self.entries: OrderedDict = OrderedDict()
+        self.lock = threading.Lock()
+
+        #: Keys added since the last `self.commit`, in order (so entries added under a rolled back savepoint can be
+        #: dropped again, see `self.rollback`)
+        self.journal: List[tuple] = []
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def get_key(model: Type[Model], attnames: Sequence[str], values: Sequence, scope: tuple = ()) -> tuple:
+        """
+        :param scope:   Identifies the filters the lookup was made within (see `ImporterManager.scope_key`)
+        """
+        return model._meta.label, tuple(attnames), tuple(values), scope
+
+    def get(self, model: Type[Model], attnames: Sequence[str], values: Sequence,
+            scope: tuple = ()) -> Optional[Model]:
+        key = self.get_key(model, attnames, values, scope)
+        with self.lock:
+            obj = self.entries.get(key)
+            if obj is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return obj
+
+    def add(self, model: Type[Model], attnames: Sequence[str], values: Sequence, obj: Model, scope: tuple = ()):
+        key = self.get_key(model, attnames, values, scope)
+        with self.lock:
+            if key in self.entries:
+                return
+            self.entries[key] = obj
+            self.journal.append(key)
+
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def savepoint(self) -> int:
+        """
+        :return: a marker to pass to `self.rollback`
+        """
+        with self.lock:
+            return len(self.journal)
+
+    def rollback(self, savepoint: int):
+        """Forget the entries added since `savepoint` (e.g. objects auto-created by a transaction that was rolled
+        back)
+        """
+        with self.lock:
+            for key in self.journal[savepoint:]:
+                self.entries.pop(key, None)
+            del self.journal[savepoint:]
+
+    def commit(self):
+        """Entries added so far are committed to the database, so they no longer need to be rolled back
+        """
+        with self.lock:
+            self.journal = []
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.journal = []
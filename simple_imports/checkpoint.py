@@ -0,0 +1,95 @@
+import json
+import os
+
+from typing import *
+
+from django.core.cache import caches
+from django.core.cache.backends.db import DatabaseCache
+from django.db import router
+
+
+class Checkpoint(object):
+    """Records how far a chunked `SystemImporter` run has gotten, so that a failed run can be restarted from the
+    first chunk that was not committed.  The checkpoint is cleared once the import finishes.
+
+    State is a small dictionary:
+        {'row': <index of the next row to import>,
+         'offset': <position of that row in the input `Source` (a byte offset for csv files)>,
+         'source': <the `Source.identity` of the input (e.g. the file's path, size and mtime), or None>,
+         'deferred': <[file row, raw values] of the rows read, but deferred to the end of the import (see
+                      `SystemImporter.deferred_rows`)>}
+
+    N.B: Checkpoints kept in the database being imported into (see `self.is_transactional`) are written in the
+         chunk's own transaction.  Others are written immediately *after* the chunk's transaction commits: a crash
+         between the commit and the checkpoint write will cause that single chunk to be imported again on restart.
+    """
+
+    def load(self) -> Optional[Dict[str,Any]]:
+        raise NotImplementedError
+
+    def save(self, row: int, offset: int, source: Dict[str,Any] = None, deferred: List[list] = None):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def is_transactional(self, using: str) -> bool:
+        """Whether saving the checkpoint within a transaction on the database `using` makes it part of that
+        transaction (i.e. the checkpoint is committed, or rolled back, with the chunk)
+        """
+        return False
+
+
+class FileCheckpoint(Checkpoint):
+    """Persists checkpoint state as json in a local file.  Writes are atomic (write to a temp file, then rename).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self) -> Optional[Dict[str,Any]]:
+        if not os.path.exists(self.path):
+            return None
+
+        with open(self.path, 'r') as f:
+            return json.load(f)
+
+    def save(self, row: int, offset: int, source: Dict[str,Any] = None, deferred: List[list] = None):
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            #: (Typed values of deferred rows, e.g. dates read from excel, are read back as strings)
+            json.dump({'row': row, 'offset': offset, 'source': source, 'deferred': deferred or []}, f, default=str)
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class CacheCheckpoint(Checkpoint):
+    """Persists checkpoint state through django's cache framework.  Pointing `alias` at a cache configured with
+    the `DatabaseCache` backend keeps checkpoints in a small table of the database being imported into, where they
+    are written in the same transaction as the chunk they record.
+    """
+
+    def __init__(self, key: str, alias: str = 'default'):
+        self.key = f'simple_imports:checkpoint:{key}'
+        self.alias = alias
+
+    def load(self) -> Optional[Dict[str,Any]]:
+        return caches[self.alias].get(self.key)
+
+    def save(self, row: int, offset: int, source: Dict[str,Any] = None, deferred: List[list] = None):
+        state = {'row': row, 'offset': offset, 'source': source, 'deferred': deferred or []}
+        #: timeout=None => never expires
+        caches[self.alias].set(self.key, state, timeout=None)
+
+    def clear(self):
+        caches[self.alias].delete(self.key)
+
+    def is_transactional(self, using: str) -> bool:
+        cache = caches[self.alias]
+        return isinstance(cache, DatabaseCache) and router.db_for_write(cache.cache_model_class) == using
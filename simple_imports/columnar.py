@@ -0,0 +1,121 @@
+"""Whole-column typing for `SystemImporter.import_columns`.
+
+numpy and pandas are optional (`pip install django_simple_imports[columnar]`): when they are installed, columns are
+converted with their vectorized routines, otherwise with a plain (but still per-column) python fallback.
+"""
+import math
+
+from typing import *
+from datetime import date,datetime
+from decimal import Decimal
+
+from . import helpers, converters
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+try:
+    import pandas as pd
+except ImportError:  # pragma: no cover
+    pd = None
+
+
+def as_sequence(values) -> Sequence:
+    """Accepts lists, numpy arrays, pandas Series/Index and (py)arrow arrays
+    """
+    if hasattr(values, 'to_numpy'):
+        try:
+            return values.to_numpy(zero_copy_only=False)  #: arrow
+        except TypeError:
+            return values.to_numpy()
+    return values
+
+
+def is_missing(value) -> bool:
+    """Whether a cell holds no value (None, or the NaN/NaT/NA of numpy and pandas)
+    """
+    if value is None:
+        return True
+    if pd is not None:
+        try:
+            return bool(pd.isna(value))
+        except (TypeError, ValueError):  #: (Not a scalar)
+            return False
+    return isinstance(value, float) and math.isnan(value)
+
+
+def has_missing(values: Sequence) -> bool:
+    """Whether any cell of a column holds no value (see `is_missing`)
+    """
+    if pd is not None:
+        return bool(pd.isna(pd.Series(values, dtype=object)).any())
+    return any(is_missing(v) for v in values)
+
+
+def _parse_iso_date(value) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        return helpers.get_typed_value(date, value)
+
+
+def _parse_iso_datetime(value) -> datetime:
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return helpers.get_typed_value(datetime, value)
+
+
+def type_column(datatype: type, values) -> List:
+    """The columnar counterpart to `helpers.get_typed_value`: convert a whole column of raw values at once.
+
+    Raises ValueError (or TypeError) if any value of the column doesn't convert, including missing values (of any
+    datatype) and non-integral floats of int columns (rather than casting them to garbage, or e.g. to 'nan').
+    """
+    values = as_sequence(values)
+    if has_missing(values):
+        raise ValueError('The column has missing values.')
+
+    if pd is not None and datatype in (date, datetime):
+        converted = pd.to_datetime(pd.Series(values))
+        if converted.isna().any():  #: (Empty strings are read as NaT)
+            raise ValueError('The column has empty values.')
+        if datatype == date:
+            return list(converted.dt.date)
+        return list(converted.dt.to_pydatetime())
+
+    if np is not None and datatype in (int, float) and len(values):
+        array = np.asarray(values)
+        #: Casting 1.7 to int gives 1
+        if datatype == int and array.dtype.kind == 'f' and not (array % 1 == 0).all():
+            raise ValueError('The column has non-integral values.')
+        return array.astype(datatype).tolist()
+
+    if datatype == date:
+        return [_parse_iso_date(v) for v in values]
+    if datatype == datetime:
+        return [_parse_iso_datetime(v) for v in values]
+    if datatype == Decimal:
+        #: str() first, so that floats convert to their shortest repr rather than their exact binary value
+        return [v if isinstance(v, Decimal) else Decimal(str(v)) for v in values]
+    if datatype in (int, float, bool, str):
+        convert = converters.CONVERTERS[datatype]
+        return [convert(v) for v in values]
+
+    return list(values)
+
+
+def unique(values: Sequence) -> List:
+    """Distinct values of a (typed) column, in order of first appearance
+    """
+    if pd is not None:
+        return list(pd.unique(pd.Series(values, dtype=object)))
+    return list(dict.fromkeys(values))
@@ -0,0 +1,170 @@
+"""Converters from raw (csv) values to the python values of model fields, derived from the fields themselves (see
+`ModelImporter.__init_subclass__`), so importers don't need to spell out a `field_types` entry for every field.
+
+Every converter passes values that are already typed through untouched (e.g. from json or excel sources), and
+raises `ValueError` for values that don't fit the field.
+"""
+from typing import *
+from datetime import date,datetime
+from decimal import Decimal
+
+from dateutil.parser import parse as parsedt
+from django.db import models
+
+#: Raw values accepted for boolean fields (compared case-insensitively)
+TRUE_VALUES = frozenset(('1', 't', 'true', 'y', 'yes', 'on'))
+FALSE_VALUES = frozenset(('0', 'f', 'false', 'n', 'no', 'off'))
+
+
+def get_python_type(field: models.Field) -> type:
+    """The type `helpers.get_typed_value` (and `columnar.type_column`) would convert the field's values to
+    """
+    if field.is_relation:
+        return models.Model
+    if isinstance(field, models.BooleanField):
+        return bool
+    if isinstance(field, (models.IntegerField, models.AutoField)):
+        return int
+    if isinstance(field, models.FloatField):
+        return float
+    if isinstance(field, models.DecimalField):
+        return Decimal
+    #: DateTimeField is a subclass of DateField
+    if isinstance(field, models.DateTimeField):
+        return datetime
+    if isinstance(field, models.DateField):
+        return date
+    return str
+
+
+def _to_int(value) -> int:
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, float) and not value.is_integer():
+        #: (int() would truncate it, or fail obscurely on NaN)
+        raise ValueError(f'{value!r} is not an integer.')
+    return int(value)
+
+
+def _to_float(value) -> float:
+    if isinstance(value, float):
+        return value
+    return float(value)
+
+
+def _to_decimal(value) -> Decimal:
+    if isinstance(value, Decimal):
+        return value
+    #: str() first, so that floats convert to their shortest repr rather than their exact binary value
+    return Decimal(str(value))
+
+
+def _to_bool(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    value = str(value).strip().lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise ValueError(f'{value!r} is not a boolean.')
+
+
+def _to_date(value) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        #: Much faster than dateutil, and what most exports use
+        return date.fromisoformat(value)
+    except ValueError:
+        return parsedt(value).date()
+
+
+def _to_datetime(value) -> datetime:
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return parsedt(value)
+
+
+def _to_str(value) -> str:
+    if isinstance(value, str):
+        return value
+    if value is None:
+        #: (Rather than 'None'; nullable fields never get here, see `_with_nulls`)
+        raise ValueError('A value is required.')
+    return str(value)
+
+
+def _identity(value):
+    return value
+
+
+CONVERTERS: Dict[type,Callable[[Any],Any]] = {
+    int: _to_int,
+    float: _to_float,
+    Decimal: _to_decimal,
+    bool: _to_bool,
+    date: _to_date,
+    datetime: _to_datetime,
+    str: _to_str,
+    #: Related objects are retrieved by the dependencies' managers, and pushed in as model instances (or lists)
+    models.Model: _identity,
+}
+
+
+def _with_choices(field: models.Field) -> Callable:
+    """Accept a choice's value or its label, and reject anything else
+    """
+    choices = {}
+    for value, label in field.flatchoices:
+        choices[str(value)] = value
+        choices.setdefault(str(label), value)
+    valid = set(choices.values())
+
+    def convert_choice(value):
+        if value in valid:
+            return value
+        try:
+            return choices[_to_str(value)]
+        except KeyError:
+            raise ValueError(f'{value!r} is not a valid choice for {field.name}.') from None
+
+    return convert_choice
+
+
+def _with_nulls(convert: Callable) -> Callable:
+    """Nullable fields read empty values as None
+    """
+    def convert_nullable(value):
+        if value is None or value == '':
+            return None
+        return convert(value)
+
+    return convert_nullable
+
+
+def get_converter(field: models.Field) -> Callable[[Any],Any]:
+    datatype = get_python_type(field)
+    convert = CONVERTERS[datatype]
+
+    if field.choices and not field.is_relation:
+        convert = _with_choices(field)
+
+    if field.null and datatype is not str:
+        convert = _with_nulls(convert)
+
+    return convert
+
+
+def get_model_converters(model: Type[models.Model]) -> Dict[str,Callable[[Any],Any]]:
+    """A converter for every concrete (and m2m) field of `model`, by field name (reverse relations are left out)
+    """
+    return {
+        field.name: get_converter(field) for field in model._meta.get_fields()
+        if field.concrete or (field.many_to_many and not field.auto_created)
+    }
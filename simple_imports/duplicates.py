@@ -0,0 +1,143 @@
+import os
+import sqlite3
+import tempfile
+
+from typing import *
+
+from .fingerprints import get_digest
+
+#: Policies for rows sharing a root key with another row of the same file
+FIRST_WINS = 'first'
+LAST_WINS = 'last'
+REPORT = 'report'  #: None of the rows sharing a key are imported; all of them are reported
+
+
+class DigestMap(object):
+    """Maps key digests to a (count, row) pair.  Entries are kept in a dict until there are more than `max_keys` of
+    them, after which they are spilled into a temporary sqlite file (in `spill_dir`), keeping memory bounded.
+    """
+
+    def __init__(self, max_keys: int = None, spill_dir: str = None):
+        self.max_keys = max_keys
+        self.spill_dir = spill_dir
+
+        self.entries: Dict[bytes,Tuple[int,int]] = {}
+
+        self.spill_path: str = None
+        self.connection: sqlite3.Connection = None
+
+    def _spill(self):
+        fd, self.spill_path = tempfile.mkstemp(suffix='.sqlite3', dir=self.spill_dir)
+        os.close(fd)
+
+        self.connection = sqlite3.connect(self.spill_path, check_same_thread=False)
+        self.connection.execute(
+            'CREATE TABLE digests (digest BLOB PRIMARY KEY, count INTEGER NOT NULL, row INTEGER NOT NULL)'
+        )
+        self.connection.executemany(
+            'INSERT INTO digests (digest, count, row) VALUES (?, ?, ?)',
+            ((digest, count, row) for digest, (count, row) in self.entries.items())
+        )
+        self.entries = {}
+
+    def get(self, digest: bytes) -> Optional[Tuple[int,int]]:
+        if self.connection is None:
+            return self.entries.get(digest)
+
+        return self.connection.execute(
+            'SELECT count, row FROM digests WHERE digest = ?', (digest,)
+        ).fetchone()
+
+    def set(self, digest: bytes, count: int, row: int):
+        if self.connection is None:
+            self.entries[digest] = (count, row)
+            if self.max_keys is not None and len(self.entries) > self.max_keys:
+                self._spill()
+            return
+
+        self.connection.execute(
+            'INSERT OR REPLACE INTO digests (digest, count, row) VALUES (?, ?, ?)', (digest, count, row)
+        )
+
+    def close(self):
+        self.entries = {}
+        if self.connection is not None:
+            self.connection.close()
+            os.remove(self.spill_path)
+            self.connection = None
+
+
+class DuplicateDetector(object):
+    """Detects rows of a file that share the root importer's key tuple, before any of them reach the database.
+
+    With `FIRST_WINS`, keys are checked while rows are streamed.  `LAST_WINS` and `REPORT` need to know about rows
+    further down the file, so `SystemImporter` first streams the whole file through `self.scan` (no database work
+    is done during this pass).
+
+    Every row that is dropped is recorded in `self.duplicates` as (row, key, row kept for the key or None).
+    """
+
+    def __init__(self, policy: str = FIRST_WINS, max_keys: int = 1000000, spill_dir: str = None):
+        """
+        :param policy:      One of FIRST_WINS, LAST_WINS or REPORT
+        :param max_keys:    Number of keys held in memory before spilling to disk (None => never spill)
+        :param spill_dir:   Directory for the spilled keys (defaults to the system's temp dir)
+        """
+        if policy not in (FIRST_WINS, LAST_WINS, REPORT):
+            raise ValueError(f'Unknown duplicate policy: {policy}')
+
+        self.policy = policy
+        self.max_keys = max_keys
+        self.spill_dir = spill_dir
+
+        self.keys = DigestMap(max_keys, spill_dir)
+        self.duplicates: List[Tuple[int,Tuple[str,...],Optional[int]]] = []
+
+    @property
+    def requires_scan(self) -> bool:
+        return self.policy != FIRST_WINS
+
+    def scan(self, row: int, key: Iterable[str]):
+        """Count a key ahead of streaming (required for LAST_WINS and REPORT, or to seed FIRST_WINS with the rows of
+        a previously committed part of the file)
+        """
+        digest = get_digest(key)
+        entry = self.keys.get(digest)
+        if entry is None:
+            self.keys.set(digest, 1, row)
+        elif self.policy == FIRST_WINS:
+            return
+        else:
+            self.keys.set(digest, entry[0] + 1, row)
+
+    def accept(self, row: int, key: Iterable[str]) -> bool:
+        """
+        :return: Whether the row should be imported
+        """
+        key = tuple(key)
+        digest = get_digest(key)
+        entry = self.keys.get(digest)
+
+        if self.policy == FIRST_WINS:
+            if entry is None:
+                self.keys.set(digest, 1, row)
+                return True
+            if entry[1] == row:
+                return True
+            self.duplicates.append((row, key, entry[1]))
+            return False
+
+        count, last_row = entry
+        if self.policy == LAST_WINS:
+            if last_row == row:
+                return True
+            self.duplicates.append((row, key, last_row))
+            return False
+
+        if count == 1:
+            return True
+        self.duplicates.append((row, key, None))
+        return False
+
+    def close(self):
+        self.keys.close()
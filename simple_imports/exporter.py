@@ -0,0 +1,203 @@
+"""Streaming exports in the column layout of a list of importers, for round trips (export, transform, re-import)
+through the same `ModelImporter` definitions.
+
+Every column of `SystemImporter.csv_import_format` belongs to an importer, which is reached from the root importer
+through a path of `dependent_imports` fields (e.g. `created_by` -> `user` for a Tag's username).  Paths without
+many-to-many steps are joined in with `select_related`, the others are prefetched, and the root's objects are
+streamed with `.iterator(chunk_size=...)`: memory stays constant, at a few queries per chunk.
+"""
+from typing import *
+
+from django.db import models
+from django.db.models import QuerySet
+
+from . import helpers
+from .graph import ImporterGraph
+from .model_importer import ModelImporter
+from .sources import DEFAULT_DELIMITER
+from .system_importer import M2M_DELIMITER
+
+
+class ExportColumn(object):
+    """How a column's value is read from a root object
+    """
+    __slots__ = ('importer', 'field', 'path', 'm2m_steps', 'is_m2m')
+
+    def __init__(self, importer: ModelImporter, field: str, path: List[str], m2m_steps: Set[int], is_m2m: bool):
+        """
+        :param path:        `dependent_imports` fields leading from the root importer to `importer`
+        :param m2m_steps:   Indexes of the many-to-many steps of `path`
+        :param is_m2m:      The column holds the values of every related object (joined on M2M_DELIMITER), as the
+                            importer reads it
+        """
+        self.importer = importer
+        self.field = field
+        self.path = path
+        self.m2m_steps = m2m_steps
+        self.is_m2m = is_m2m
+
+
+class SystemExporter(ImporterGraph):
+
+    def __init__(self, importers: List[ModelImporter], root: ModelImporter = None, queryset: QuerySet = None,
+                 using: str = None, chunk_size: int = 2000, delimiter: str = DEFAULT_DELIMITER):
+        """
+        :param importers:   The importers the file will be imported with (their layout is the export's)
+        :param root:        The importer whose objects are exported, one per row (defaults to the last importer in
+                            dependency order, i.e. `SystemImporter`'s default root).  Every column must be reachable
+                            from it through `dependent_imports`.
+        :param queryset:    The root objects to export (defaults to all of them, by pk)
+        :param using:       Database alias (when no queryset is given)
+        :param chunk_size:  Root objects fetched (and related objects prefetched) at a time
+        :param delimiter:   Column delimiter (as `sources.CsvSource`'s)
+        """
+        self.importers = importers
+        self.chunk_size = chunk_size
+        self.delimiter = delimiter
+
+        self.graph = []
+        self.sorted_vertices = []
+        self._construct_adjacency_graph()
+        self._topologically_sort_graph()
+
+        self.location_to_importer = {}
+        self.location_to_csv_field = {}
+        self.csv_import_format = self._get_import_fields()
+
+        self.root: ModelImporter = root or self.sorted_vertices[-1].importer
+        if self.root not in importers:
+            raise ValueError(f'Root {self.root.__name__} is not one of the importers.')
+
+        self.columns: List[ExportColumn] = self._get_columns()
+
+        if queryset is None:
+            queryset = self.root.model.objects.using(using)
+        elif queryset.model is not self.root.model:
+            raise ValueError(f'Expected a queryset of {self.root.model.__name__}, not {queryset.model.__name__}.')
+        if not queryset.ordered:
+            queryset = queryset.order_by('pk')
+        self.queryset = queryset
+
+    def _get_paths(self) -> Dict[ModelImporter,List[str]]:
+        """The shortest path of `dependent_imports` fields from the root to every importer it depends on (the first
+        one found, for importers reachable through several)
+        """
+        paths = {self.root: []}
+        queue = [self.root]
+        while queue:
+            importer = queue.pop(0)
+            for fname, dependency in importer.dependent_imports.items():
+                if dependency not in paths:
+                    paths[dependency] = paths[importer] + [fname]
+                    queue.append(dependency)
+        return paths
+
+    def _get_columns(self) -> List[ExportColumn]:
+        paths = self._get_paths()
+        is_m2m = {v.importer: v.is_m2m for v in self.sorted_vertices}
+
+        columns = []
+        for location in sorted(self.location_to_importer):
+            importer = self.location_to_importer[location]
+            if importer not in paths:
+                raise ValueError(f'{importer.__name__} can\'t be reached from {self.root.__name__} through '
+                                 f'dependent_imports, so its columns can\'t be exported.')
+
+            path = paths[importer]
+            m2m_steps = set()
+            model = self.root.model
+            for step, fname in enumerate(path):
+                if helpers.is_many_to_many(fname, model):
+                    m2m_steps.add(step)
+                model = model._meta.get_field(fname).related_model
+
+            columns.append(ExportColumn(importer, self.location_to_csv_field[location], path, m2m_steps,
+                                        is_m2m[importer]))
+        return columns
+
+    def get_queryset(self) -> QuerySet:
+        """`self.queryset`, joined with (or prefetching) the objects every column is read from
+        """
+        select_related = set()
+        prefetch_related = set()
+        for column in self.columns:
+            if not column.path:
+                continue
+            lookup = '__'.join(column.path)
+            if column.m2m_steps:
+                prefetch_related.add(lookup)
+            else:
+                select_related.add(lookup)
+
+        queryset = self.queryset
+        if select_related:
+            queryset = queryset.select_related(*sorted(select_related))
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*sorted(prefetch_related))
+        return queryset
+
+    @staticmethod
+    def _get_related(obj: models.Model, column: ExportColumn) -> List[models.Model]:
+        """The objects `column` is read from.  Past a many-to-many step, only the first related object (by pk) is
+        followed, unless the step leads to the column's own importer and the column is many-to-many.
+        """
+        objs = [obj]
+        for step, fname in enumerate(column.path):
+            if not objs or objs[0] is None:
+                return []
+
+            if step not in column.m2m_steps:
+                objs = [getattr(objs[0], fname)]
+                continue
+
+            #: (.all() is served by the prefetched objects)
+            related = sorted(getattr(objs[0], fname).all(), key=lambda o: o.pk)
+            objs = related if column.is_m2m and step == len(column.path) - 1 else related[:1]
+
+        return [o for o in objs if o is not None]
+
+    def _format(self, value, column: ExportColumn) -> str:
+        if value is None:
+            return ''
+        if isinstance(value, models.Model):
+            value = value.pk
+
+        value = str(value)
+        if self.delimiter in value or '\n' in value or '\r' in value or (column.is_m2m and M2M_DELIMITER in value):
+            #: Files aren't quoted (see `sources.CsvSource`), so such values wouldn't be read back
+            raise ValueError(f'{column.importer.__name__}.{column.field} value {value!r} can\'t be exported: it '
+                             f'contains a delimiter or line break.')
+        return value
+
+    def get_row(self, obj: models.Model) -> List[str]:
+        """The values of the row that imports `obj`
+        """
+        row = []
+        for column in self.columns:
+            values = [self._format(getattr(o, column.field), column) for o in self._get_related(obj, column)]
+            row.append(M2M_DELIMITER.join(values) if column.is_m2m else (values[0] if values else ''))
+        return row
+
+    def rows(self) -> Iterator[List[str]]:
+        for obj in self.get_queryset().iterator(chunk_size=self.chunk_size):
+            yield self.get_row(obj)
+
+    def export(self, path_or_file: Union[str,TextIO], header: bool = False, encoding: str = 'utf-8') -> int:
+        """Write every row to a file (or open text file)
+
+        :param header:  Write the column names first (import with `header=True`)
+        :return: the number of rows written
+        """
+        if isinstance(path_or_file, str):
+            with open(path_or_file, 'w', encoding=encoding, newline='') as f:
+                return self.export(f, header=header)
+
+        if header:
+            path_or_file.write(self.delimiter.join(self.location_to_csv_field[i]
+                                                   for i in sorted(self.location_to_csv_field)) + '\n')
+
+        n_rows = 0
+        for row in self.rows():
+            path_or_file.write(self.delimiter.join(row) + '\n')
+            n_rows += 1
+        return n_rows
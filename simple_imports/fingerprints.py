@@ -0,0 +1,96 @@
+import hashlib
+import sqlite3
+import threading
+
+from typing import *
+
+#: Separates the values of a key tuple before it is hashed
+KEY_SEPARATOR = '\x1f'
+
+#: (see `FingerprintStore.compare`)
+NEW = 'new'
+CHANGED = 'changed'
+UNCHANGED = 'unchanged'
+
+
+def get_digest(values: Iterable) -> bytes:
+    """Hash a sequence of raw field values
+    """
+    return hashlib.blake2b(
+        KEY_SEPARATOR.join(str(v) for v in values).encode('utf-8'), digest_size=16
+    ).digest()
+
+
+class FingerprintStore(object):
+    """Remembers a fingerprint (digest of the raw row) for each root key imported by previous runs, so that
+    incremental imports of full snapshots can skip rows that have not changed.
+
+    Fingerprints are kept in a local sqlite file, and only the rows of the chunks currently being imported are held
+    in memory.  Rows are *staged* while a chunk is parsed, and only written to the file once the chunk's transaction
+    has committed (see `SystemImporter.store_data`), so rows which failed to import, or were rolled back, are
+    retried on the next run.
+
+    N.B: The file and the database are committed separately, so imports are at-least-once: a crash between the
+         chunk's commit and the fingerprint write leaves that chunk's rows without fingerprints, and the next run
+         imports them again (as it would without fingerprints).
+
+    Imports only ever create objects: a row whose key was imported before, but whose other values have changed,
+    is reported rather than imported again (which would create a second object for the key).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+        #: Rows may be staged from a different thread than the one they are committed from (see
+        #: `SystemImporter.aimport_data`), hence the lock
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS fingerprints (key BLOB PRIMARY KEY, digest BLOB NOT NULL)'
+        )
+
+        #: file row -> (key digest, row digest) of the rows staged, but not yet committed
+        self.pending: Dict[int,Tuple[bytes,bytes]] = {}
+
+    def compare(self, key: Iterable[str], values: Iterable[str]) -> Tuple[str,bytes,bytes]:
+        """
+        :param key:     Raw values of the root importer's `required_fields` for the row
+        :param values:  Every raw value of the row
+        :return: (NEW, CHANGED or UNCHANGED since the last run, key digest, row digest)
+        """
+        key_digest = get_digest(key)
+        row_digest = get_digest(values)
+
+        with self.lock:
+            stored = self.connection.execute(
+                'SELECT digest FROM fingerprints WHERE key = ?', (key_digest,)
+            ).fetchone()
+
+        if stored is None:
+            return NEW, key_digest, row_digest
+        return CHANGED if stored[0] != row_digest else UNCHANGED, key_digest, row_digest
+
+    def stage(self, row: int, key_digest: bytes, row_digest: bytes):
+        with self.lock:
+            self.pending[row] = (key_digest, row_digest)
+
+    def commit(self, rows: Iterable[int]):
+        """Write the staged fingerprints of `rows` (i.e. the rows that were imported)
+        """
+        with self.lock, self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO fingerprints (key, digest) VALUES (?, ?)',
+                [self.pending[row] for row in rows if row in self.pending]
+            )
+
+            #: Staged rows up to the last one committed are done with (whether they were imported or not)
+            last_row = max(rows, default=None)
+            if last_row is not None:
+                self.pending = {row: digests for row, digests in self.pending.items() if row > last_row}
+
+    def discard(self):
+        with self.lock:
+            self.pending = {}
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,84 @@
+from typing import *
+
+from django.db import models
+from django.db.models.fields.related_descriptors import ManyToManyDescriptor
+
+from dotdict import DotDict
+
+from .sorter import Sorter
+
+
+class ImporterGraph(object):
+    """The dependency graph of a list of `ModelImporter`s (`self.importers`), sorted topologically, and the column
+    layout of the files they import (see `self.csv_import_format`).  Shared by `SystemImporter` and
+    `exporter.SystemExporter`, so that exported files have exactly the layout imports expect.
+
+    Subclasses set `self.importers`, `self.graph = []`, `self.location_to_importer = {}` and
+    `self.location_to_csv_field = {}` before calling the methods below.
+    """
+
+    def _construct_adjacency_graph(self):
+
+        for i,vertex in enumerate(self.importers):
+            #: TODO: Replace DotDict with a Node class
+            self.graph.append(DotDict({
+                'id': i,
+                'Adj': [],
+                'p': None,
+                'color': "WHITE",
+                'd': 0,
+                'f': 0,
+                'importer': vertex,
+                #: Discloses whether this vertex in the graph is m2m to any others (will be set by vertices with
+                #: dependent imports back to it)
+                'is_m2m': False
+            }))
+
+        #: Once this for loop is complete, circle back and add to the Adjacencies
+        for vertex in self.graph:
+
+            #: Should return a dictionary
+            neighbors = vertex.importer.dependent_imports
+
+            if not neighbors:
+                continue
+
+            for field,importer in neighbors.items(): #: This is deterministic and therefore the results are.
+                inner_vertex = next((x for x in self.graph if x.importer==importer),None)
+                assert inner_vertex is not None
+                vertex.Adj.append(self.graph[inner_vertex.id])
+
+                #: Tell the vertex that it is many-2-many with respect to itself
+                #: TODO: use this from the helpers file if it's still necesary
+                if self.is_many_to_many(field,vertex.importer.model):
+                    self.graph[inner_vertex.id].is_m2m = True
+
+    def _topologically_sort_graph(self):
+        sorter = Sorter()
+        sorter.dfs(self.graph)
+        self.sorted_vertices = sorter.sorted_vertices
+
+    def _get_import_fields(self):
+        fields = ""
+        count = 0; #: TODO: Move to enumerated field
+        for v in self.sorted_vertices:
+            if v.importer.required_fields is None:
+                continue
+
+            for field in v.importer.required_fields:
+
+                self.location_to_importer[count] = v.importer
+
+                self.location_to_csv_field[count] = field
+
+                fields = f'{fields}{field},'
+                count+=1
+
+        return fields
+
+    def is_many_to_many(self, field: str, model: models.Model):
+        if isinstance(getattr(model,field),models.ManyToManyField) or \
+                isinstance(getattr(model,field),ManyToManyDescriptor):
+            return True
+        else:
+            return False
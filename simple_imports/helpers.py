@@ -12,13 +12,20 @@
 #         new_dict[k] = v
 #     return new_dict
 from typing import *
+import random
+import time
 from datetime import date,datetime
 from dateutil.parser import parse as parsedt
 from decimal import Decimal
+from django.db import OperationalError, transaction
 from django.db.models import Model
 
 def get_typed_value(datatype,value):
 
+    #: Sources other than csv files may provide values that are already typed
+    if isinstance(datatype, type) and isinstance(value, datatype) and not isinstance(value, bool):
+        return value
+
     if datatype == date:
         return parsedt(value).date()
     if datatype == datetime:
@@ -27,9 +34,76 @@ def get_typed_value(datatype,value):
         return Decimal(value)
     if datatype == float:
         return float(value)
+    if datatype == int:
+        return int(value)
 
     return value #: Returns string or object content as is
 
+
+def get_sort_key(kvs: Dict[str,Any], fields: Iterable[str] = ()) -> Tuple[str,...]:
+    """A deterministic, comparable key for the key/values of a row (related objects are represented by their pk)
+
+    :param fields: Fields to order by first (e.g. an importer's required_fields); the rest follow by name
+    """
+    fields = [f for f in fields if f in kvs]
+    fields += sorted(k for k in kvs.keys() if k not in fields)
+    return tuple(
+        str(kvs[k].pk if isinstance(kvs[k], Model) else kvs[k]) for k in fields
+    )
+
+
+#: SQLSTATEs of deadlocks, lock timeouts (lock_not_available) and serialization failures
+POSTGRESQL_LOCK_ERRORS = frozenset(('40P01', '55P03', '40001'))
+#: ER_LOCK_DEADLOCK, ER_LOCK_WAIT_TIMEOUT
+MYSQL_LOCK_ERRORS = frozenset((1213, 1205))
+#: SQLITE_BUSY, SQLITE_LOCKED (primary result codes, i.e. the low byte of extended ones)
+SQLITE_LOCK_ERRORS = frozenset((5, 6))
+#: (For versions of sqlite3 without error codes on exceptions)
+SQLITE_LOCK_MESSAGES = ('database is locked', 'database table is locked')
+
+
+def is_lock_error(error: Exception) -> bool:
+    """Whether a database error was caused by a deadlock or lock timeout (and is therefore worth retrying), going by
+    the driver's error code
+    """
+    if not isinstance(error, OperationalError):
+        return False
+
+    #: django re-raises driver errors as its own, from the original
+    cause = error.__cause__ or error
+    sqlstate = getattr(cause, 'pgcode', None) or getattr(cause, 'sqlstate', None)  #: (psycopg2, psycopg 3)
+    if sqlstate is not None:
+        return sqlstate in POSTGRESQL_LOCK_ERRORS
+
+    sqlite_code = getattr(cause, 'sqlite_errorcode', None)
+    if sqlite_code is not None:
+        return sqlite_code & 0xff in SQLITE_LOCK_ERRORS
+
+    if error.args and isinstance(error.args[0], int):
+        return error.args[0] in MYSQL_LOCK_ERRORS
+
+    return str(error).startswith(SQLITE_LOCK_MESSAGES)
+
+
+def retry_on_lock(func: Callable, retries: int = 3, backoff: float = 0.1, using: Union[str,Iterable[str]] = None):
+    """Call `func`, retrying with exponential backoff (and jitter) if it fails on a deadlock or lock timeout.
+
+    `func` should wrap its work in its own transaction.  If it is called within an outer atomic block (on any of the
+    aliases `using`), the outer transaction is already broken by the error, so it is not retried.
+    """
+    aliases = [using] if using is None or isinstance(using, str) else list(using)
+    attempt = 0
+    while True:
+        try:
+            return func()
+        except OperationalError as e:
+            if attempt >= retries or not is_lock_error(e) or \
+                    any(transaction.get_connection(alias).in_atomic_block for alias in aliases):
+                raise
+
+            time.sleep(backoff * (2 ** attempt) * random.uniform(0.5, 1.5))
+            attempt += 1
+
 from django.db.models import Model,ManyToManyField
 from django.db.models.fields.related_descriptors import ManyToManyDescriptor
 
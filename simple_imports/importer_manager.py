@@ -3,22 +3,51 @@ from collections import defaultdict
 from typing import *
 from copy import deepcopy
 
-from django.db.models import Model
-from django.db.models import Q,QuerySet,Model
+from asgiref.sync import sync_to_async
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q,QuerySet,Model,Field
 
-from . import helpers
+from . import helpers, columnar, converters, normalization
 
 from .model_importer import ModelImporter
+from .cache import DependencyCache
 
 class RecordData(object):
     """Stores queried object from the database and associated query, and helper metadata (possible object)
     object associated with the query isn't present in the system.
+
+    Records are kept for every row of every manager until the import (or chunk) finishes, so they are slotted, and
+    their query is built from the manager's kvs when it's asked for rather than stored.
     """
-    def __init__(self, query: Q = None, available: bool = False):
-        self.query: Q = query
+    __slots__ = ('manager', 'row', 'col', 'available', 'object')
+
+    def __init__(self, manager: 'ImporterManager', row: int, col: int = 0, available: bool = False):
+        self.manager: ImporterManager = manager
+        self.row: int = row
+        self.col: int = col
         self.available: bool = available
         self.object: Model = None
 
+    @property
+    def query(self) -> Q:
+        return self.manager._get_query(self.manager.kvs[self.row][self.col])
+
+
+def get_model_scope(model: Type[Model], scope: Optional[Dict[str,Any]]) -> Dict[str,Any]:
+    """The entries of `scope` that apply to `model` (i.e. that name one of its fields, by name or attname)
+    """
+    if not scope:
+        return {}
+
+    model_scope = {}
+    for name, value in scope.items():
+        try:
+            model._meta.get_field(name)
+        except FieldDoesNotExist:
+            continue
+        model_scope[name] = value
+    return model_scope
+
 
 class ImporterManager(object):
     """Stores key,value pairs needed to get or create objects from/in a relational database in `self.kvs`, then
@@ -40,13 +69,31 @@ class ImporterManager(object):
          See `self.update_kvs` for TODO on this count
     """
 
-    def __init__(self, importer: ModelImporter=None, create: bool=False):
+    def __init__(self, importer: ModelImporter=None, create: bool=False, cache: DependencyCache = None,
+                 using: str = None, write_using: str = None, scope: Dict[str,Any] = None):
+        """
+        :param using:       Database alias lookups are made in (None => as routed by django)
+        :param write_using: Database alias objects are created in (None => as routed by django)
+        :param scope:       Fixed filters (e.g. {'company_id': 3}) ANDed into the lookups of models having those
+                            fields (entries for fields the model doesn't have are ignored)
+        """
         #: How this manager is used outside itself depends less on the importer and hence the model, but more on
         #: its reverse relations
         self.importer = importer
 
         self.create = create
 
+        #: Shared with other managers (and chunks), to skip lookups of objects that were already retrieved
+        self.cache = cache
+
+        #: The importer's own aliases take precedence
+        self.using = importer.using if importer.using is not None else using
+        self.write_using = importer.write_using if importer.write_using is not None else write_using
+
+        self.scope: Dict[str,Any] = get_model_scope(importer.model, scope)
+        #: Part of the cache keys of scoped lookups (so that objects found in one scope aren't handed to another)
+        self.scope_key: tuple = (tuple(sorted(self.scope)), helpers.get_sort_key(self.scope)) if self.scope else ()
+
         self.kvs = defaultdict(list)
         self.objects: QuerySet = None
 
@@ -69,6 +116,17 @@ class ImporterManager(object):
         #: Maps row to one or more elements of RecordData
         self.object_row_map: Dict[int,List[RecordData]] = defaultdict(list)
 
+        #: Distinct values of a field, when they are known up front (e.g. see `self.update_kvs_column`); used to
+        #: build the `__in` lookups of `self._retrieve_records`
+        self.distinct_values: Dict[str,Sequence] = {}
+
+        #: (create) The row of each object returned by the last call to `self.get_objects_from_rows`
+        self.object_rows: List[int] = []
+
+        #: (create) Keys of the rows of the same file that each row references, by row and field (see
+        #:  `ModelImporter.file_references`)
+        self.file_references: Dict[int,Dict[str,tuple]] = defaultdict(dict)
+
     def update_kvs(self, field_name: str, value, row: int, col: int=0):
         """N.B: - This is definitely a leaky abstraction -- this method represents the way in which this class
         is driven after initialization.  For each row of a read csv file
@@ -79,10 +137,17 @@ class ImporterManager(object):
           before `self.get_available_rows` is called, or any of the data getter methods queried
 
         TODO: This requirement isn't yet enforced
+
+        Values that can't be converted to the field's type are recorded in `self.errors` (and stored as None)
         """
-        typed_value = helpers.get_typed_value(
-            self.importer.field_types[field_name],value
-        )
+        try:
+            typed_value = self.importer.get_converter(field_name)(value)
+        except (ValueError, TypeError, ArithmeticError) as e:  #: (decimal.InvalidOperation is an ArithmeticError)
+            self.errors.setdefault(row, {})[field_name] = f'Invalid value {value!r}: {e}'
+            typed_value = None
+
+        if field_name in self.importer.normalize_keys:
+            typed_value = normalization.normalize(typed_value, self.importer.normalize_keys[field_name])
 
         #: Ensure the object is wrapped in a list <-- is this really a way you want to constrain this?
         if self.m2m_field[field_name] and type(typed_value) != list:
@@ -100,6 +165,57 @@ class ImporterManager(object):
         else:
             self.kvs[row].append({field_name: typed_value})
 
+    def update_kvs_column(self, field_name: str, values: Sequence, start_row: int = 0,
+                          distinct_values: Sequence = None):
+        """Columnar counterpart to `self.update_kvs`: sets `field_name` for the rows start_row, start_row+1, ...
+        from `values`, which must already be typed (see `columnar.type_column`).  Values of m2m fields are lists,
+        spread accross columns.
+
+        :param distinct_values: The distinct (non-null) values of the column, if they've already been computed
+        """
+        if self.m2m_field[field_name]:
+            for row,value in enumerate(values, start=start_row):
+                for col,v in enumerate(value if isinstance(value, list) else [value]):
+                    self.update_kvs(field_name, v, row=row, col=col)
+            return
+
+        operations = self.importer.normalize_keys.get(field_name)
+        if operations:
+            values = [normalization.normalize(v, operations) for v in values]
+            if distinct_values is not None:
+                distinct_values = dict.fromkeys(normalization.normalize(v, operations) for v in distinct_values)
+
+        for row,value in enumerate(values, start=start_row):
+            if self.kvs[row]:
+                self.kvs[row][0][field_name] = value
+            else:
+                self.kvs[row].append({field_name: value})
+
+        if distinct_values is not None:
+            self.distinct_values[field_name] = list(distinct_values)
+
+    def load_column(self, field_name: str, values: Sequence, start_row: int = 0):
+        """Sets (non-m2m) `field_name` for the rows start_row, start_row+1, ... from a column of raw values.
+
+        Columns of fields converted as plain types are typed as a whole (see `columnar.type_column`).  Columns of
+        other fields (choices, nullable fields, `field_types` overrides), and columns with any value that doesn't
+        convert (including missing values), go through the field's converter value by value, as in `self.update_kvs`:
+        missing values are read as None (which only nullable fields accept), and invalid values are recorded in
+        `self.errors`.
+        """
+        datatype = self.importer.get_field_type(field_name)
+        if self.importer.get_converter(field_name) is converters.CONVERTERS.get(datatype):
+            try:
+                typed = columnar.type_column(datatype, values)
+            except (ValueError, TypeError, ArithmeticError):
+                pass
+            else:
+                self.update_kvs_column(field_name, typed, start_row, distinct_values=columnar.unique(typed))
+                return
+
+        for row,value in enumerate(values, start=start_row):
+            self.update_kvs(field_name, None if columnar.is_missing(value) else value, row=row)
+
     def get_latest_row(self):
         #: This is incremented externally, because it is from that perspective that it will be known whether
         #: one is managing something that is many to many or not
@@ -122,6 +238,50 @@ class ImporterManager(object):
             for col in range(len(self.kvs[row])-1): #: Have another think about this -1/+1
                 self.kvs[row][col+1].update(kvs)
 
+    def _prepare_records(self) -> bool:
+        """Create a (not yet retrieved) record for every row/col of `self.kvs`
+
+        :return: False if there are no kvs to retrieve objects for
+        """
+        if not self.kvs:
+            return False
+
+        if self.object_row_map:
+            raise RuntimeError('This Method has already been called.  Retreive data through it\'s getter methods')
+
+        self.propogate_kvs_for_m2m()
+        for row in range(self.get_latest_row() + 1):
+            for col in range(len(self.kvs[row])):
+                self.object_row_map[row].append(RecordData(self, row, col))
+
+        return True
+
+    def _get_query(self, kv: Dict[str,Any]) -> Q:
+        """The query for a record: normalized fields are matched on their normalized annotation (see
+        `self._get_queryset`)
+        """
+        if not self.importer.normalize_keys:
+            return Q(**kv)
+        return Q(**{
+            normalization.get_alias(k) if k in self.importer.normalize_keys else k: v for k,v in kv.items()
+        })
+
+    def _get_queryset(self) -> QuerySet:
+        """The model's objects in `self.using` (within `self.scope`), annotated with the normalized values of
+        normalized fields
+        """
+        queryset = self.importer.model.objects.using(self.using)
+        if self.scope:
+            queryset = queryset.filter(**self.scope)
+        if self.importer.normalize_keys:
+            queryset = queryset.annotate(**{
+                normalization.get_alias(name): normalization.get_expression(
+                    self.importer.model._meta.get_field(name).attname, operations
+                )
+                for name, operations in self.importer.normalize_keys.items()
+            })
+        return queryset
+
     def get_available_rows(self) -> Dict[int,List[RecordData]]:
         """Find all available objects given the key/values that have been provided thus far.
 
@@ -131,30 +291,204 @@ class ImporterManager(object):
         :returns: {row <-> List[RecordData],...} pairs.  This returned dictionary can be queried directly or through
                   the methods outlined below.
         """
-        if not self.kvs:
+        if not self._prepare_records():
             return None
 
-        if self.object_row_map:
-            raise RuntimeError('This Method has already been called.  Retreive data through it\'s getter methods')
+        self._retrieve_records(self._skip_absent_records())
 
-        self.propogate_kvs_for_m2m()
-        #: Build up cumulative query for hitting the database once, and track each records cumulative contribution
-        #: to the overall query
-        query = None
-        for row in range(self.get_latest_row() + 1):
-            for col, kv in enumerate(self.kvs[row]):
+        return self.object_row_map
+
+    async def aget_available_rows(self) -> Dict[int,List[RecordData]]:
+        """Async counterpart to `self.get_available_rows` (using django's async queryset interface)
+        """
+        if not self._prepare_records():
+            return None
+
+        await self._aretrieve_records(await sync_to_async(self._skip_absent_records)())
+
+        return self.object_row_map
+
+    def _skip_absent_records(self) -> Dict[int,List[RecordData]]:
+        """(Importers with a `key_filter`) Leave the records whose keys are definitely not in the table unavailable,
+        without looking them up
+
+        :return: the rows with records left to retrieve
+        """
+        key_filter = self.importer.key_filter
+        if key_filter is None:
+            return self.object_row_map
+
+        fields = self._get_lookup_fields(self.object_row_map)
+        if fields is None:
+            return self.object_row_map
+
+        normalize_keys = self.importer.normalize_keys
+
+        def normalize(values: tuple) -> tuple:
+            return tuple(
+                normalization.normalize(value, normalize_keys[field.name]) if field.name in normalize_keys else value
+                for field, value in zip(fields, values)
+            )
+
+        key_filter.refresh(self.importer.model, [field.attname for field in fields], using=self.using,
+                           transform=normalize if normalize_keys else None)
+
+        return {
+            row: record_list for row,record_list in self.object_row_map.items()
+            if any(key_filter.might_contain(self._get_record_values(row, col, fields))
+                   for col in range(len(record_list)))
+        }
+
+    def _get_lookup_fields(self, row_records: Dict[int,List[RecordData]]) -> Optional[List[Field]]:
+        """The model fields filtered on by every record of `row_records`, if records can be matched to objects by
+        their values (i.e. every key is a concrete field, rather than a lookup such as m2m's `__in`)
+        """
+        names = None
+        for row,record_list in row_records.items():
+            for col in range(len(record_list)):
+                kv_names = set(self.kvs[row][col].keys())
+                if names is None:
+                    names = kv_names
+                elif names != kv_names:
+                    return None
+
+        if not names:
+            return None
 
+        fields = []
+        for name in sorted(names):
+            try:
+                field = self.importer.model._meta.get_field(name)
+            except FieldDoesNotExist:
+                return None
+            if not field.concrete or field.many_to_many:
+                return None
+            fields.append(field)
+
+        return fields
+
+    @staticmethod
+    def _get_field_value(field: Field, value):
+        """Represent `value` the way it's read back from `getattr(obj, field.attname)`
+        """
+        if isinstance(value, Model):
+            return value.pk
+        if field.is_relation:
+            return field.target_field.to_python(value)
+        return field.to_python(value)
+
+    def _get_indexed_query(self, row_records: Dict[int,List[RecordData]], fields: List[Field]) -> QuerySet:
+        """Batch lookup: the candidates for every record, retrieved with one `__in` filter per field (see
+        `self._match_indexed_records`)
+        """
+        query = Q()
+        for field in fields:
+            values = self.distinct_values.get(field.name)
+            if values is None:
+                values = {
+                    self._get_field_value(field, self.kvs[row][col][field.name])
+                    for row,record_list in row_records.items() for col in range(len(record_list))
+                }
+            lookup = normalization.get_alias(field.name) if field.name in self.importer.normalize_keys \
+                else field.attname
+            field_query = Q(**{f'{lookup}__in': [v for v in values if v is not None]})
+            if None in values:
+                #: Q(field=None) matches NULLs (and e.g. rows with a missing dependency are given None)
+                field_query |= Q(**{f'{field.attname}__isnull': True})
+
+            query &= field_query
+
+        self.objects = self._get_queryset().filter(query)
+        return self.objects.order_by('pk')
+
+    def _match_indexed_records(self, row_records: Dict[int,List[RecordData]], fields: List[Field],
+                               objects: Iterable[Model]):
+        """Index the candidates in memory by their values for `fields`, then match each record against the index
+        """
+        normalize_keys = self.importer.normalize_keys
+        index: Dict[tuple,Model] = {}
+        for obj in objects:
+            #: Like `.first()` below, the lowest pk wins when several objects match
+            index.setdefault(tuple(
+                normalization.normalize(getattr(obj, field.attname), normalize_keys[field.name])
+                if field.name in normalize_keys else getattr(obj, field.attname)
+                for field in fields
+            ), obj)
+
+        for row,record_list in row_records.items():
+            for col,rec in enumerate(record_list):
+                obj = index.get(self._get_record_values(row, col, fields))
+
+                rec.available = True if obj else False
+                rec.object = obj
+
+        if self.cache is not None:
+            attnames = [field.attname for field in fields]
+            for values,obj in index.items():
+                self.cache.add(self.importer.model, attnames, values, obj, scope=self.scope_key)
+
+    def _get_record_values(self, row: int, col: int, fields: List[Field]) -> tuple:
+        kv = self.kvs[row][col]
+        return tuple(self._get_field_value(field, kv[field.name]) for field in fields)
+
+    def _match_cached_records(self, row_records: Dict[int,List[RecordData]],
+                              fields: List[Field]) -> Dict[int,List[RecordData]]:
+        """Resolve the records whose objects are in `self.cache`
+
+        :return: the rows with records left to retrieve
+        """
+        if self.cache is None:
+            return row_records
+
+        attnames = [field.attname for field in fields]
+        remaining = {}
+        for row,record_list in row_records.items():
+            for col,rec in enumerate(record_list):
+                obj = self.cache.get(self.importer.model, attnames, self._get_record_values(row, col, fields),
+                                     scope=self.scope_key)
+                if obj is None:
+                    remaining[row] = record_list
+                    continue
+
+                rec.available = True
+                rec.object = obj
+
+        return remaining
+
+    def _get_combined_query(self, row_records: Dict[int,List[RecordData]]) -> Optional[QuerySet]:
+        """Build up cumulative query for hitting the database once, and track each records cumulative contribution
+        to the overall query
+        """
+        query = None
+        for row,record_list in row_records.items():
+            for rec in record_list:
                 if query is None:
-                    query = Q(**kv)
+                    query = rec.query
                 else:
-                    query |= Q(**kv)
+                    query |= rec.query
+
+        if query is None:
+            return None
 
-                self.object_row_map[row].append(RecordData(query=Q(**kv)))
+        self.objects = self._get_queryset().filter(query).distinct()
+        return self.objects
 
-        self.objects = self.importer.model.objects.filter(query).distinct()
+    def _retrieve_records(self, row_records: Dict[int,List[RecordData]]):
+        """Query the database once for every record in `row_records`, and mark each as available (or not)
+        """
+        fields = self._get_lookup_fields(row_records)
+        if fields is not None:
+            row_records = self._match_cached_records(row_records, fields)
+            if not row_records:
+                return
+            objects = self._get_indexed_query(row_records, fields).iterator()
+            return self._match_indexed_records(row_records, fields, objects)
+
+        if self._get_combined_query(row_records) is None:
+            return
 
         #: With self.objects, go back through and collect each objects
-        for row,record_list in self.object_row_map.items():
+        for row,record_list in row_records.items():
 
             for col,rec in enumerate(record_list):
 
@@ -165,30 +499,154 @@ class ImporterManager(object):
 
                 obj = objs.first()
 
-                self.object_row_map[row][col].available = True if obj else False
-                self.object_row_map[row][col].object = obj
+                rec.available = True if obj else False
+                rec.object = obj
 
-        return self.object_row_map
+    async def _aretrieve_records(self, row_records: Dict[int,List[RecordData]]):
+        fields = self._get_lookup_fields(row_records)
+        if fields is not None:
+            row_records = self._match_cached_records(row_records, fields)
+            if not row_records:
+                return
+            objects = [obj async for obj in self._get_indexed_query(row_records, fields)]
+            return self._match_indexed_records(row_records, fields, objects)
+
+        if self._get_combined_query(row_records) is None:
+            return
+
+        for row,record_list in row_records.items():
+            for col,rec in enumerate(record_list):
+                obj = await self.objects.filter(rec.query).afirst()
+
+                rec.available = True if obj else False
+                rec.object = obj
+
+    def _get_missing_objects(self) -> Tuple[Dict[int,List[RecordData]],List[Model]]:
+        """
+        :return: (the rows with records that weren't found, new objects for them in a deterministic order)
+        """
+        if any(self.m2m_field.values()):
+            raise RuntimeError('Cannot currently create objects that have a m2m dependency.')
 
-    def get_objects_from_rows(self) -> List[Model]:
+        missing: Dict[int,List[RecordData]] = {}
+        new_kvs = {}
+        for row,record_list in self.object_row_map.items():
+            if row in self.errors:
+                continue
+
+            for col,rec in enumerate(record_list):
+                if rec.available:
+                    continue
+
+                missing[row] = record_list
+                #: Rows referencing the same object only create it once
+                key = helpers.get_sort_key(self.kvs[row][col], self.importer.required_fields or ())
+                new_kvs.setdefault(key, self.kvs[row][col])
+
+        return missing, [self.importer.model(**self._get_scoped_kvs(new_kvs[key])) for key in sorted(new_kvs.keys())]
+
+    def _get_scoped_kvs(self, kv: Dict[str,Any]) -> Dict[str,Any]:
+        """Add the scope's fields that `kv` doesn't set (so that objects created from it are found within the scope)
+        """
+        if not self.scope:
+            return kv
+
+        kv = dict(kv)
+        for name, value in self.scope.items():
+            field = self.importer.model._meta.get_field(name)
+            if field.name not in kv and field.attname not in kv:
+                kv[name] = value
+        return kv
+
+    def create_missing_rows(self, ignore_conflicts: bool = False) -> List[Model]:
+        """Bulk create the objects that `self.get_available_rows` could not find (for importers with `auto_create`),
+        then retrieve them again so they are available to dependent managers.
+
+        Objects are created in a deterministic (sorted) order, so that concurrent imports creating overlapping
+        objects lock rows in the same order.  With `ignore_conflicts`, objects that were created in the meantime by
+        another import are skipped by the database (ON CONFLICT DO NOTHING), and picked up by the re-retrieval.
+
+        Rows with errors (i.e. unresolved dependencies) are left alone.  From then on, this manager's lookups are made
+        in `self.write_using` (so they see the objects that were just created).
+        :return: the objects that were passed to bulk_create
+        """
+        missing, objects = self._get_missing_objects()
+        if not objects:
+            return []
+
+        self.importer.model.objects.using(self.write_using).bulk_create(objects, ignore_conflicts=ignore_conflicts)
+
+        #: The new objects (or the ones that conflicted with them) may not have reached a replica yet
+        self.using = self.write_using
+        self._retrieve_records(missing)
+        return objects
+
+    async def acreate_missing_rows(self, ignore_conflicts: bool = False) -> List[Model]:
+        """Async counterpart to `self.create_missing_rows`
+        """
+        missing, objects = self._get_missing_objects()
+        if not objects:
+            return []
+
+        await self.importer.model.objects.using(self.write_using).abulk_create(
+            objects, ignore_conflicts=ignore_conflicts
+        )
+
+        self.using = self.write_using
+        await self._aretrieve_records(missing)
+        return objects
+
+    def get_objects_from_rows(self, ordered: bool = False) -> List[Model]:
         """This is really going to be for the 'root' object (i.e. the object actually getting imported).
 
         Therefore if a set of ImporterManagers are being used for both dependent data and the object that's being
         created, this function will _only_ be called for the object being created
+
+        :param ordered: Return objects sorted by their field values rather than by row (so that concurrent imports
+                        insert overlapping keys in the same order)
+        """
+        return [self.importer.model(**kv) for kv in self.get_kvs_from_rows(ordered)]
+
+    def get_kvs_from_rows(self, ordered: bool = False) -> List[Dict[str,Any]]:
+        """The key/values of the new objects (i.e. `self.get_objects_from_rows`, without instantiating models)
         """
         if not self.create:
             raise ValueError('This should only be called for model managers associated with new objects, '
                              'not dependent objects')
 
-        objects = []
+        rows = range(self.get_latest_row() + 1)
+        if ordered:
+            rows = sorted(rows, key=lambda r: helpers.get_sort_key(self.kvs[r][0], self.importer.required_fields or ()))
+
+        kvs = []
+        self.object_rows = []
         #: Collect objects; if any have many to many fields, document them
-        for row in range(self.get_latest_row() + 1):
+        for row in rows:
+            #: Rows whose dependencies could not be resolved are left out (see `self.errors`)
+            if row in self.errors:
+                continue
 
-            objects.append(
-                self.importer.model(**self.kvs[row][0])
-            )
+            kvs.append(self.kvs[row][0])
+            self.object_rows.append(row)
 
-        return objects
+        return kvs
+
+    def set_created_objects(self, objects: List[Model]):
+        """(create) Make the objects built by `self.get_objects_from_rows` (once they've been written) available to
+        the managers depending on this one, as if they had been retrieved by `self.get_available_rows`.
+
+        Backends that don't return primary keys from bulk inserts get the objects retrieved again instead.
+        """
+        self.using = self.write_using
+        self.object_row_map.clear()
+        if any(obj is None or obj.pk is None for obj in objects):
+            self.get_available_rows()
+            return
+
+        for row,obj in zip(self.object_rows, objects):
+            record = RecordData(self, row, available=True)
+            record.object = obj
+            self.object_row_map[row].append(record)
 
     def get_objs_and_meta(self, row: int) -> List[RecordData]:
         """ Queries `self.object_row_map` by row
@@ -0,0 +1,212 @@
+"""Checks that the lookups of dependency importers can use an index (see `SystemImporter.check_indexes`).
+
+A dependency's objects are looked up by the values of its key/values (`required_fields`, plus the objects of its
+own `dependent_imports`), ANDed with the import's scope (see `SystemImporter`'s `scope`).  Such a lookup can use any
+index whose leading column is one of those columns; without one, every chunk scans the table.  Normalized keys are
+filtered on an expression, so they need the functional index of `ModelImporter.get_key_indexes` instead.
+
+The `required_fields` are what tells objects apart, so they need an index of their own: foreign keys (which django
+always indexes) and scope columns only narrow a lookup down to every object of a parent, or of a tenant, which are
+then filtered one by one.  Only unique foreign key or scope indexes (e.g. a scope on the primary key) will do.
+"""
+import warnings
+
+from typing import *
+
+from django.db import connections, models, router
+from django.db.models import UniqueConstraint
+
+from .model_importer import ModelImporter
+from .importer_manager import get_model_scope
+
+
+class ScanWarning(UserWarning):
+    """A dependency's lookups can't use an index
+    """
+
+
+class IndexReport(object):
+    """The outcome of checking one importer's lookups
+    """
+
+    def __init__(self, importer: ModelImporter, columns: List[str], index: Optional[str],
+                 declared: Optional[str] = None, key_columns: List[str] = None, partial: Optional[str] = None):
+        """
+        :param columns:     Columns the lookups filter on
+        :param index:       An index of the database the lookups can use (None => they scan the table)
+        :param declared:    (index is None) An index the model declares that would do, but the database lacks
+        :param key_columns: Columns of the `required_fields` the lookups filter on
+        :param partial:     (index is None) A (non-unique) index of a foreign key or scope column the lookups can
+                            narrow down with, before filtering on the key columns without an index
+        """
+        self.importer = importer
+        self.columns = columns
+        self.index = index
+        self.declared = declared
+        self.key_columns = key_columns if key_columns is not None else columns
+        self.partial = partial
+
+        #: (see `explain_lookup`)
+        self.plan: Optional[str] = None
+
+    @property
+    def scans(self) -> bool:
+        return self.index is None
+
+    @property
+    def message(self) -> str:
+        model = self.importer.model
+        if not self.scans:
+            return f'{self.importer.__name__} looks {model.__name__} up through the index {self.index}.'
+
+        if self.partial is not None:
+            message = f'{self.importer.__name__} looks {model.__name__} up by {", ".join(self.key_columns)}, but no ' \
+                      f'index of {model._meta.db_table} starts with any of them: lookups can only narrow the table ' \
+                      f'down through {self.partial}, and scan what it matches.'
+        else:
+            message = f'{self.importer.__name__} looks {model.__name__} up by {", ".join(self.columns)}, but no ' \
+                      f'index of {model._meta.db_table} starts with any of them: every lookup will scan the table.'
+        if self.declared is not None:
+            message += f'  ({self.declared} is declared by the model, but missing from the database: is a ' \
+                       f'migration unapplied?)'
+        return message
+
+
+def get_lookup_fields(importer: ModelImporter) -> List[models.Field]:
+    """The model fields an importer's lookups filter on (many-to-many dependencies are looked up through their
+    join table, and are left out)
+    """
+    names = list(importer.required_fields or ()) + list(importer.dependent_imports.keys())
+    fields = []
+    for name in names:
+        field = importer.model._meta.get_field(name)
+        if field.concrete and not field.many_to_many:
+            fields.append(field)
+    return fields
+
+
+def _get_declared_indexes(model: Type[models.Model]) -> Dict[str,Tuple[Optional[str],bool]]:
+    """Name (or description) -> (leading column (None for expression indexes), whether the column alone is unique) of
+    the indexes the model declares
+    """
+    meta = model._meta
+    declared = {}
+    for field in meta.concrete_fields:
+        if field.primary_key or field.unique or field.db_index:
+            declared[f'{meta.db_table}.{field.column}'] = (field.column, field.primary_key or field.unique)
+
+    for index in meta.indexes:
+        column = meta.get_field(index.fields[0].lstrip('-')).column if index.fields else None
+        declared[index.name or f'{meta.db_table} index'] = (column, False)
+
+    for fields in meta.unique_together:
+        declared[f'unique_together {fields}'] = (meta.get_field(fields[0]).column, len(fields) == 1)
+    for constraint in meta.constraints:
+        if isinstance(constraint, UniqueConstraint) and constraint.fields:
+            declared[constraint.name] = (meta.get_field(constraint.fields[0]).column, len(constraint.fields) == 1)
+
+    return declared
+
+
+def _get_database_indexes(model: Type[models.Model], using: str) -> Optional[Dict[str,Tuple[Optional[str],bool]]]:
+    """Name -> (leading column, whether the column alone is unique) of the table's indexes, as introspected (None if
+    the table can't be introspected)
+    """
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if model._meta.db_table not in connection.introspection.table_names(cursor):
+            return None
+        constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+
+    return {
+        name: (
+            (constraint['columns'] or [None])[0],
+            bool(constraint['unique'] or constraint['primary_key']) and len(constraint['columns'] or ()) == 1
+        )
+        for name, constraint in constraints.items()
+        if constraint['index'] or constraint['unique'] or constraint['primary_key']
+    }
+
+
+def check_importer(importer: ModelImporter, using: str = None, scope: Dict[str,Any] = None) -> IndexReport:
+    """Whether the lookups of `importer` (within `scope`) can use an index of the database
+    """
+    model = importer.model
+    using = using or router.db_for_read(model)
+
+    lookup_fields = get_lookup_fields(importer)
+    required_fields = set(importer.required_fields or ())
+    columns = [field.column for field in lookup_fields if field.name not in importer.normalize_keys]
+    columns += [model._meta.get_field(name).column for name in get_model_scope(model, scope)]
+    #: Normalized fields are filtered on an expression: only their functional index will do
+    key_indexes = {index.name for index in importer.get_key_indexes()}
+
+    #: (Without required_fields, the dependencies are the key)
+    key_columns = columns
+    if required_fields:
+        key_columns = [field.column for field in lookup_fields
+                       if field.name in required_fields and field.name not in importer.normalize_keys]
+
+    def find(indexes: Dict[str,Tuple[Optional[str],bool]]) -> Optional[str]:
+        for name, (column, unique) in indexes.items():
+            if (column is not None and (column in key_columns or (unique and column in columns))) or \
+                    name in key_indexes:
+                return name
+        return None
+
+    def find_partial(indexes: Dict[str,Tuple[Optional[str],bool]]) -> Optional[str]:
+        for name, (column, _) in indexes.items():
+            if column is not None and column in columns:
+                return name
+        return None
+
+    declared_indexes = _get_declared_indexes(model)
+    declared = find(declared_indexes)
+    database_indexes = _get_database_indexes(model, using)
+    if database_indexes is None:
+        #: Not migrated (yet): the model's declarations are all there is to go by
+        database_indexes = declared_indexes
+        declared = None
+
+    index = find(database_indexes)
+    if index is not None:
+        return IndexReport(importer, columns, index, key_columns=key_columns)
+    return IndexReport(importer, columns, None, declared=declared, key_columns=key_columns,
+                       partial=find_partial(database_indexes))
+
+
+def explain_lookup(importer: ModelImporter, using: str = None, sample_size: int = 100) -> Optional[str]:
+    """The database's plan for a batch lookup of `sample_size` existing keys (the way `ImporterManager` filters a
+    chunk), or None if the table has no rows to sample
+    """
+    model = importer.model
+    using = using or router.db_for_read(model)
+    fields = [field for field in get_lookup_fields(importer) if field.name not in importer.normalize_keys]
+    if not fields:
+        return None
+
+    attnames = [field.attname for field in fields]
+    sample = list(model.objects.using(using).values_list(*attnames)[:sample_size])
+    if not sample:
+        return None
+
+    filters = {f'{attname}__in': list({values[i] for values in sample}) for i, attname in enumerate(attnames)}
+    return model.objects.using(using).filter(**filters).explain()
+
+
+def check_indexes(importers: Iterable[ModelImporter], using: str = None, scope: Dict[str,Any] = None,
+                  explain: bool = False) -> List[IndexReport]:
+    """Check the lookups of every importer, warning (`ScanWarning`) about those that will scan
+
+    :param explain: Attach the plan of a sample lookup to each report (see `explain_lookup`)
+    """
+    reports = []
+    for importer in importers:
+        importer_using = importer.using or using
+        report = check_importer(importer, using=importer_using, scope=scope)
+        if report.scans:
+            warnings.warn(report.message, ScanWarning, stacklevel=2)
+        if explain:
+            report.plan = explain_lookup(importer, using=importer_using)
+        reports.append(report)
+    return reports
@@ -0,0 +1,179 @@
+"""Probabilistic pre-checks of dependency keys (see `ModelImporter.key_filter`).
+
+A `KeyFilter` holds a bloom filter of the key values of every object of a dependency's model.  Records whose key is
+definitely not in the table are marked missing (and so reach `auto_create`, or are reported) without being part of
+the batch lookup; only keys that may exist are queried.  Bloom filters have no false negatives, so the lookups that
+are skipped could only ever have come back empty.
+
+The filter is kept up to date incrementally: every refresh adds the objects whose (auto-incremented) primary key is
+past the highest one seen so far.
+
+N.B: Keys that are *changed* in place, or objects committed out of primary key order (e.g. by concurrent writers
+     with long transactions), are not picked up by incremental refreshes, and would be reported missing.  Call
+     `KeyFilter.rebuild` after such changes.
+"""
+import json
+import math
+import os
+import struct
+import threading
+
+from typing import *
+
+from django.db import models
+
+from .fingerprints import get_digest
+
+#: Marks the end of the json header of a persisted filter (the bits follow)
+HEADER_END = b'\n'
+
+
+class BloomFilter(object):
+    """A fixed-size bloom filter of tuples of values
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01, bits: bytearray = None, count: int = 0):
+        """
+        :param capacity:    Number of keys the filter is sized for (past it, the false positive rate grows)
+        :param error_rate:  False positive rate at capacity
+        """
+        if capacity < 1 or not 0 < error_rate < 1:
+            raise ValueError('A bloom filter needs a positive capacity and an error rate between 0 and 1.')
+
+        self.capacity = capacity
+        self.error_rate = error_rate
+
+        self.n_bits = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.n_hashes = max(1, round(self.n_bits / capacity * math.log(2)))
+        self.bits = bits if bits is not None else bytearray((self.n_bits + 7) // 8)
+        self.count = count
+
+    def _get_positions(self, values: Sequence) -> Iterator[int]:
+        #: Double hashing: the k positions are derived from two halves of a single digest
+        h1, h2 = struct.unpack('<QQ', get_digest(values))
+        for i in range(self.n_hashes):
+            yield (h1 + i * h2) % self.n_bits
+
+    def add(self, values: Sequence):
+        for position in self._get_positions(values):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, values: Sequence) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._get_positions(values))
+
+
+class KeyFilter(object):
+    """A bloom filter of the key values of a model's objects, optionally persisted to a local file (so a run only
+    scans the objects created since the previous one).
+
+    The filter is (re)built for whichever fields it's refreshed with: importers looking a model up by different
+    fields need a filter each.
+    """
+
+    def __init__(self, path: str = None, capacity: int = 1000000, error_rate: float = 0.01):
+        """
+        :param path:        Local file to persist the filter to (None => kept in memory only)
+        :param capacity:    Initial number of keys the filter is sized for (the filter is rebuilt twice as large if
+                            the table outgrows it)
+        :param error_rate:  Rate of absent keys that are still looked up
+        """
+        self.path = path
+        self.capacity = capacity
+        self.error_rate = error_rate
+
+        self.lock = threading.Lock()
+
+        self.bloom: BloomFilter = None
+        #: What `self.bloom` holds: {'model': label, 'fields': [attnames], 'last_pk': highest pk added}
+        self.state: Dict[str,Any] = {}
+
+        #: Number of keys reported absent (i.e. lookups skipped) since the filter was created
+        self.skipped = 0
+
+        if self.path is not None and os.path.exists(self.path):
+            self._load()
+
+    def _load(self):
+        with open(self.path, 'rb') as f:
+            header = json.loads(f.readline())
+            bits = bytearray(f.read())
+
+        self.bloom = BloomFilter(header['capacity'], header['error_rate'], bits=bits, count=header['count'])
+        self.state = header['state']
+
+    def save(self):
+        if self.path is None or self.bloom is None:
+            return
+
+        header = {
+            'capacity': self.bloom.capacity, 'error_rate': self.bloom.error_rate, 'count': self.bloom.count,
+            'state': self.state,
+        }
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(json.dumps(header).encode('utf-8') + HEADER_END)
+            f.write(self.bloom.bits)
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def _is_incremental(model: Type[models.Model]) -> bool:
+        """New objects can be told apart by their primary key only if it's auto-incremented
+        """
+        return isinstance(model._meta.pk, models.fields.AutoFieldMixin)
+
+    def refresh(self, model: Type[models.Model], attnames: Sequence[str], using: str = None,
+                transform: Callable[[tuple],tuple] = None):
+        """Add the objects created since the last refresh (or build the filter, if it was built for other fields or
+        has outgrown its capacity)
+
+        :param attnames:    The fields keys are made of
+        :param transform:   Applied to the values read from the database (e.g. to normalize them the way the
+                            importer normalizes keys)
+        """
+        with self.lock:
+            attnames = list(attnames)
+            if self.bloom is None or self.state.get('model') != model._meta.label or \
+                    self.state.get('fields') != attnames or self.bloom.count > self.bloom.capacity or \
+                    not self._is_incremental(model):
+                capacity = self.capacity
+                if self.bloom is not None and self.bloom.count > self.bloom.capacity:
+                    capacity = self.bloom.capacity * 2
+                self.bloom = BloomFilter(capacity, self.error_rate)
+                self.state = {'model': model._meta.label, 'fields': attnames, 'last_pk': None}
+
+            objects = model.objects.using(using)
+            if self.state['last_pk'] is not None:
+                objects = objects.filter(pk__gt=self.state['last_pk'])
+
+            added = False
+            for pk, *values in objects.order_by('pk').values_list('pk', *attnames).iterator():
+                self.bloom.add(transform(tuple(values)) if transform is not None else tuple(values))
+                self.state['last_pk'] = pk
+                added = True
+
+            if added:
+                self.save()
+
+    def rebuild(self):
+        """Drop the filter (it's built from scratch by the next refresh)
+        """
+        with self.lock:
+            self.bloom = None
+            self.state = {}
+            if self.path is not None and os.path.exists(self.path):
+                os.remove(self.path)
+
+    def might_contain(self, values: Sequence) -> bool:
+        """False if no object has the key `values` (as of the last refresh); True if one may
+        """
+        if self.bloom is None:
+            return True
+        if tuple(values) in self.bloom:
+            return True
+
+        self.skipped += 1
+        return False
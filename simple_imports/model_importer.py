@@ -1,8 +1,13 @@
 from typing import *
 from collections import OrderedDict
+from functools import partial
 
+from django.apps import apps
 from django.db import models
 
+from . import helpers, converters, normalization
+from .membership import KeyFilter
+
 class ModelImporter(object):
     """
     Essentially defines a node in a dependency graph of models to import.
@@ -11,23 +16,109 @@ class ModelImporter(object):
 
     dependent_imports: OrderedDict = OrderedDict()
 
-    #: If this is true, and this object represents an object being created, it will bulk create the associated models
-    #:         before returning them
+    #: If this is true, and this object represents a dependency, rows for which no object is found are bulk created
+    #:         (from the row's key/values) before being returned to the objects depending on them
     auto_create: bool = False
 
     auto_create_m2m: bool = True #: It means you bulk create all
 
+    #: (Roots) Write new rows with plain INSERTs built from the row's key/values, rather than instantiating a model per
+    #:         row for `bulk_create` (see `raw_insert.RawInserter`; not available for models with save logic)
+    raw_insert: bool = False
+
+    #: (Roots) Dependencies (of the root's own model, e.g. a parent) that may be defined by other rows of the same
+    #:         file.  References that aren't in the database are matched against the keys of the chunk's rows, and
+    #:         the new objects are written in waves (parents before children); empty references leave the field
+    #:         null.  Rows referencing rows of later chunks are imported at the end of the file (see
+    #:         `SystemImporter.deferred_rows`).  See `SystemImporter._insert_in_waves`.
+    file_references: Tuple[str,...] = ()
+
     #: TODO: Perhaps there should be a separate class variable required_fields_for_create (to distinguish what should
     #:       be necessary for getting vs. creating)
     #:       It's assumed that taken together, these will return the unique tuple from the model table
     required_fields: tuple = None
 
     #: From this you could infer modifiers __iexact, __contains, etc
+    #:  Optional for the model's own fields: their types (and converters) are derived from `model._meta` (see
+    #:  `self.get_converter`); an entry here is only needed for other keys, or to convert a field differently
     field_types: Dict[str,type] = dict()
 
+    #: Fields whose values are normalized before they are matched against the database, e.g.
+    #:  {'username': ('strip', 'lower')} for case-insensitive usernames (see `normalization.NORMALIZERS`).  Values
+    #:  read from the file are normalized as they're loaded (so objects created from them are created normalized)
+    normalize_keys: Dict[str,Sequence[str]] = dict()
+
+    #: (Dependencies) A bloom filter of the keys in the model's table: keys it rules out are treated as missing
+    #:  without being looked up (see `membership.KeyFilter`), e.g. `KeyFilter('/var/cache/imports/companies.bloom')`
+    key_filter: KeyFilter = None
+
+    #: Database aliases this model's objects are looked up in, and written to (override the `using`/`write_using`
+    #:  of the `SystemImporter`; None => defer to it)
+    using: str = None
+    write_using: str = None
+
+    #: Converter and type of every field, by name (see `self._build_converters`)
+    _converters: Dict[str,Callable[[Any],Any]] = None
+    _field_types: Dict[str,type] = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+
+        #: Built once per class (here if the models are loaded already, or else on first use)
+        cls._converters = cls._field_types = None
+
+        for operations in cls.normalize_keys.values():
+            normalization.validate(operations)
+        if cls.model is not None and apps.models_ready:
+            cls._build_converters()
+
+    @classmethod
+    def _build_converters(cls):
+        field_converters = converters.get_model_converters(cls.model)
+        field_types = {name: converters.get_python_type(cls.model._meta.get_field(name)) for name in field_converters}
+
+        for name, datatype in cls.field_types.items():
+            if field_types.get(name) != datatype:
+                field_types[name] = datatype
+                field_converters[name] = partial(helpers.get_typed_value, datatype)
+
+        cls._field_types, cls._converters = field_types, field_converters
+
+    @classmethod
+    def get_converter(cls, field_name: str) -> Callable[[Any],Any]:
+        """Converts raw values of `field_name`; raises ValueError for values that don't fit it
+        """
+        if cls._converters is None:
+            cls._build_converters()
+        try:
+            return cls._converters[field_name]
+        except KeyError:
+            raise KeyError(f'{cls.__name__} has no field or field_types entry for {field_name}.') from None
+
+    @classmethod
+    def get_field_type(cls, field_name: str) -> type:
+        """The (declared or derived) type of `field_name`'s values
+        """
+        if cls._field_types is None:
+            cls._build_converters()
+        try:
+            return cls._field_types[field_name]
+        except KeyError:
+            raise KeyError(f'{cls.__name__} has no field or field_types entry for {field_name}.') from None
+
+    @classmethod
+    def get_key_indexes(cls) -> List[models.Index]:
+        """Functional indexes for the normalized fields (for the model's `Meta.indexes`), so that normalized lookups
+        can use an index
+        """
+        return [
+            normalization.get_index(cls.model, field_name, operations)
+            for field_name, operations in cls.normalize_keys.items()
+        ]
+
     def validate(self):
         if not self.model:
             return False
         if not self.required_fields and not self.dependent_imports.keys():
             return False
-        return True
\ No newline at end of file
+        return True
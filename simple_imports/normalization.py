@@ -0,0 +1,79 @@
+"""Key normalization for case/whitespace/unicode-insensitive matching (see `ModelImporter.normalize_keys`).
+
+Values read from the file are normalized in python, and the database side is normalized by an annotation (e.g.
+`LOWER(TRIM(username))`), which is then filtered with a single `__in` lookup (rather than one `__iexact` clause
+per row).  On databases supporting functional indexes, an index on the same expression (see `get_index`) lets that
+lookup use the index.
+"""
+import unicodedata
+from functools import reduce
+
+from typing import *
+
+from django.db import models
+from django.db.backends.utils import names_digest
+from django.db.models import F
+from django.db.models.functions import Lower, Trim
+
+#: Python normalizers, by name
+NORMALIZERS: Dict[str,Callable[[str],str]] = {
+    'strip': str.strip,
+    'lower': str.lower,
+    #: N.B: databases lower-case rather than case-fold, so characters such as 'ß' only match through casefold in
+    #:      python; prefer 'lower' for data with such characters
+    'casefold': str.casefold,
+    'nfc': lambda value: unicodedata.normalize('NFC', value),
+    'nfkc': lambda value: unicodedata.normalize('NFKC', value),
+}
+
+#: Database counterparts of the normalizers.  Unicode normalization has no portable SQL equivalent: values stored in
+#:  the database are assumed to be in that form already.
+EXPRESSIONS: Dict[str,Optional[Callable]] = {
+    'strip': Trim,
+    'lower': Lower,
+    'casefold': Lower,
+    'nfc': None,
+    'nfkc': None,
+}
+
+
+def validate(operations: Sequence[str]):
+    for operation in operations:
+        if operation not in NORMALIZERS:
+            raise ValueError(f'Unknown key normalization: {operation} (expected one of {", ".join(NORMALIZERS)})')
+
+
+def normalize(value, operations: Sequence[str]):
+    """Normalize a value read from the file (values other than strings are returned as is)
+    """
+    if not isinstance(value, str):
+        return value
+    return reduce(lambda v, operation: NORMALIZERS[operation](v), operations, value)
+
+
+def get_expression(attname: str, operations: Sequence[str]):
+    """The SQL expression normalizing a column the way `normalize` does in python
+    """
+    expression = F(attname)
+    for operation in operations:
+        if EXPRESSIONS[operation] is not None:
+            expression = EXPRESSIONS[operation](expression)
+    return expression
+
+
+def get_alias(field_name: str) -> str:
+    """Name of the annotation holding a field's normalized value
+    """
+    return f'normalized_{field_name}'
+
+
+def get_index(model: Type[models.Model], field_name: str, operations: Sequence[str]) -> models.Index:
+    """A functional index matching the expression filtered on for a normalized field (to add to the model's
+    `Meta.indexes`)
+    """
+    field = model._meta.get_field(field_name)
+    db_table = model._meta.db_table
+    return models.Index(
+        get_expression(field.attname, operations),
+        name=f'{db_table[:13]}_{names_digest(db_table, field_name, length=8)}_nk'
+    )
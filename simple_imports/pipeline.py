@@ -0,0 +1,126 @@
+import threading
+from queue import Queue
+
+from typing import *
+
+#: Signals the end of a stage's input
+_DONE = object()
+
+
+class Stage(object):
+    """A step of a `Pipeline`: `func` is applied to every item, by `workers` threads.
+    """
+
+    def __init__(self, name: str, func: Callable[[Any],Any], workers: int = 1, ordered: bool = False):
+        """
+        :param name:
+        :param func:    Maps an item to the item handed to the next stage
+        :param workers: Number of threads running `func` (items may then leave the stage out of order)
+        :param ordered: Hand items to `func` in the order they entered the pipeline (requires a single worker)
+        """
+        if ordered and workers != 1:
+            raise ValueError(f'Stage {name} must have a single worker to process items in order.')
+
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.ordered = ordered
+
+
+class Pipeline(object):
+    """Runs items through a sequence of stages, each in its own thread(s), connected by bounded queues.
+
+    Stages work on different items at the same time (e.g. one chunk is parsed while the previous one waits on the
+    database), and a stage whose output queue is full blocks until the next stage catches up, so at most about
+    `queue_size` items per stage (plus one per worker) are held in memory.
+
+    If a stage raises, the remaining items are drained without being processed, and the exception is re-raised by
+    `self.run`.
+    """
+
+    def __init__(self, stages: List[Stage], queue_size: int = 2, on_thread_exit: Callable[[],None] = None):
+        """
+        :param stages:
+        :param queue_size:      Capacity of the queue feeding each stage
+        :param on_thread_exit:  Called by each worker thread as it finishes (e.g. to close database connections)
+        """
+        self.stages = stages
+        self.queue_size = queue_size
+        self.on_thread_exit = on_thread_exit
+
+        self.error: BaseException = None
+
+    def _work(self, stage: Stage, inbox: Queue, outbox: Optional[Queue], next_workers: int, alive: List[int],
+              lock: threading.Lock):
+        #: (ordered stages) items that arrived ahead of their turn
+        waiting: Dict[int,Any] = {}
+        next_sequence = 0
+
+        try:
+            while True:
+                entry = inbox.get()
+                if entry is _DONE:
+                    break
+
+                if stage.ordered:
+                    waiting[entry[0]] = entry[1]
+                    ready = []
+                    while next_sequence in waiting:
+                        ready.append((next_sequence, waiting.pop(next_sequence)))
+                        next_sequence += 1
+                else:
+                    ready = [entry]
+
+                for sequence, item in ready:
+                    if self.error is None:
+                        try:
+                            item = stage.func(item)
+                        except BaseException as e:
+                            self.error = e
+                    if outbox is not None:
+                        outbox.put((sequence, item))
+        finally:
+            if self.on_thread_exit is not None:
+                self.on_thread_exit()
+
+            with lock:
+                alive[0] -= 1
+                last = alive[0] == 0
+            if last and outbox is not None:
+                for _ in range(next_workers):
+                    outbox.put(_DONE)
+
+    def run(self, items: Iterable):
+        """Feed `items` through every stage (from the calling thread), and wait for the last one to finish
+        """
+        queues = [Queue(maxsize=self.queue_size) for _ in self.stages]
+        threads = []
+        for i,stage in enumerate(self.stages):
+            outbox = queues[i + 1] if i + 1 < len(self.stages) else None
+            next_workers = self.stages[i + 1].workers if outbox is not None else 0
+            alive = [stage.workers]
+            lock = threading.Lock()
+            for n in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._work, name=f'{stage.name}-{n}', daemon=True,
+                    args=(stage, queues[i], outbox, next_workers, alive, lock)
+                )
+                thread.start()
+                threads.append(thread)
+
+        try:
+            for sequence, item in enumerate(items):
+                if self.error is not None:
+                    break
+                queues[0].put((sequence, item))
+        except BaseException as e:
+            self.error = e
+        finally:
+            for _ in range(self.stages[0].workers):
+                queues[0].put(_DONE)
+
+            for thread in threads:
+                thread.join()
+
+        if self.error is not None:
+            raise self.error
@@ -0,0 +1,144 @@
+import time
+
+from typing import *
+
+
+class ChunkStats(object):
+    """Counters for one committed chunk of a `SystemImporter` run, handed to `ImportObserver.chunk_committed`.
+
+    Counters are gathered from state the importer keeps anyway (once per chunk, never per row), so leaving an
+    observer attached costs nothing measurable.
+    """
+    __slots__ = ('rows_read', 'rows_skipped', 'rows_resolved', 'rows_written', 'errors', 'position', 'size',
+                 'seconds')
+
+    def __init__(self, rows_read: int, rows_skipped: int, rows_resolved: int, rows_written: int, errors: int,
+                 position: Optional[int], size: Optional[int], seconds: float):
+        #: Rows streamed from the source for the chunk
+        self.rows_read = rows_read
+        #: Rows dropped before resolution (duplicates, or unchanged rows of an incremental import)
+        self.rows_skipped = rows_skipped
+        #: Rows whose dependencies were all found
+        self.rows_resolved = rows_resolved
+        #: Objects created
+        self.rows_written = rows_written
+        #: Rows with at least one error
+        self.errors = errors
+        #: Source position just past the chunk (a byte offset for csv/jsonl files)
+        self.position = position
+        #: The source position at its end, if known (None for compressed files and generators)
+        self.size = size
+        #: Wall time spent on the chunk, from the end of the previous one
+        self.seconds = seconds
+
+    @property
+    def done(self) -> Optional[float]:
+        """Fraction of the source consumed so far, if its size is known
+        """
+        if not self.size or self.position is None:
+            return None
+        return min(self.position / self.size, 1.0)
+
+    @property
+    def rows_per_second(self) -> Optional[float]:
+        return self.rows_read / self.seconds if self.seconds else None
+
+
+class ImportObserver(object):
+    """Hooks into a `SystemImporter` run (see its `observers` argument).  Subclasses override the hooks they need.
+
+    An exception raised from a hook aborts the import.  Since `chunk_committed` runs after the chunk's transaction
+    has committed (and its checkpoint has been saved), an import aborted from there (e.g. by a watchdog on a stalled
+    import) resumes from the next chunk.
+    """
+
+    def started(self, importer):
+        pass
+
+    def chunk_committed(self, importer, stats: ChunkStats):
+        pass
+
+    def finished(self, importer):
+        pass
+
+
+class CallbackObserver(ImportObserver):
+    """Adapts a plain `callback(importer, stats)` to the observer interface (the `progress` argument of
+    `SystemImporter`)
+    """
+
+    def __init__(self, callback: Callable[[Any,ChunkStats],None]):
+        self.callback = callback
+
+    def chunk_committed(self, importer, stats: ChunkStats):
+        self.callback(importer, stats)
+
+
+class ThroughputObserver(ImportObserver):
+    """Keeps running totals and throughput over the whole run, and raises `RuntimeError` when a chunk takes longer
+    than `stall_timeout` seconds.
+
+    A chunk that hangs never reaches `chunk_committed`: supervisors running the import in another thread or process
+    should poll `self.idle_seconds` instead.
+    """
+
+    def __init__(self, stall_timeout: float = None):
+        """
+        :param stall_timeout: Seconds a single chunk may take before the import is aborted (None => never)
+        """
+        self.stall_timeout = stall_timeout
+
+        self.rows_read = 0
+        self.rows_written = 0
+        self.errors = 0
+        self.last: ChunkStats = None
+
+        self.start: float = None
+        self.end: float = None
+        #: When the last chunk was committed (or the run started)
+        self.last_commit: float = None
+
+    def started(self, importer):
+        self.start = self.last_commit = time.monotonic()
+
+    def chunk_committed(self, importer, stats: ChunkStats):
+        self.rows_read += stats.rows_read
+        self.rows_written += stats.rows_written
+        self.errors += stats.errors
+        self.last = stats
+        self.last_commit = time.monotonic()
+
+        if self.stall_timeout is not None and stats.seconds > self.stall_timeout:
+            raise RuntimeError(f'Import stalled: a chunk of {stats.rows_read} rows took {stats.seconds:.1f}s '
+                               f'(limit {self.stall_timeout}s).')
+
+    def finished(self, importer):
+        self.end = time.monotonic()
+
+    @property
+    def seconds(self) -> float:
+        if self.start is None:
+            return 0.0
+        return (self.end if self.end is not None else time.monotonic()) - self.start
+
+    @property
+    def idle_seconds(self) -> float:
+        """Seconds since the last chunk was committed
+        """
+        if self.last_commit is None or self.end is not None:
+            return 0.0
+        return time.monotonic() - self.last_commit
+
+    @property
+    def rows_per_second(self) -> Optional[float]:
+        seconds = self.seconds
+        return self.rows_read / seconds if seconds else None
+
+    @property
+    def eta(self) -> Optional[float]:
+        """Estimated seconds until the source is consumed, if its size is known
+        """
+        done = self.last.done if self.last is not None else None
+        if not done:
+            return None
+        return self.seconds * (1 - done) / done
@@ -0,0 +1,134 @@
+"""A write path for root importers that skips model instantiation (see `ModelImporter.raw_insert`): rows go from the
+managers' key/values straight to INSERT parameters.
+
+Only models without save logic can take this path: `bulk_create` already skips `save()` and signals, but it does run
+the fields' `pre_save` (e.g. `auto_now`) and leaves `db_default` columns to the database, neither of which is done
+here.
+"""
+from typing import *
+
+from django.db import connections, models, router
+
+#: Fields whose (already converted) values are their database values
+SIMPLE_FIELDS = (models.CharField, models.TextField, models.IntegerField, models.AutoField, models.BigAutoField)
+
+
+def get_unsupported_reason(model: Type[models.Model]) -> Optional[str]:
+    """Why `model` can't be written by a `RawInserter` (None if it can)
+    """
+    if model.save is not models.Model.save:
+        return f'{model.__name__} has a custom save().'
+    if model._meta.parents:
+        return f'{model.__name__} inherits from a concrete model.'
+
+    for field in model._meta.concrete_fields:
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+            return f'{model.__name__}.{field.name} is set on save (auto_now).'
+        if getattr(field, 'db_default', models.NOT_PROVIDED) is not models.NOT_PROVIDED:
+            return f'{model.__name__}.{field.name} has a database default.'
+
+    return None
+
+
+def _is_simple(field: models.Field) -> bool:
+    if field.is_relation:
+        return _is_simple(field.target_field)
+    return isinstance(field, SIMPLE_FIELDS)
+
+
+class RawInserter(object):
+    """Inserts rows of key/values (as held by `ImporterManager.kvs`) into `model`'s table.
+
+    Each batch is a single multi-row INSERT ... RETURNING on backends that can return rows from bulk inserts (so the
+    new primary keys are known), and a prepared `executemany` of a single-row INSERT otherwise.
+    """
+
+    def __init__(self, model: Type[models.Model], using: str = None):
+        reason = get_unsupported_reason(model)
+        if reason is not None:
+            raise ValueError(f'Raw inserts are not supported: {reason}')
+
+        self.model = model
+        self.using = using or router.db_for_write(model)
+
+        meta = model._meta
+        #: The primary key is left to the database unless rows provide it
+        self.fields = [field for field in meta.concrete_fields if field is not meta.pk or not meta.pk.db_returning]
+        self.pk_provided = meta.pk in self.fields
+
+        #: Per field: (name, attname, how to prepare its values for the database (None => as is))
+        self.columns = [
+            (field.name, field.attname, None if _is_simple(field) else field.get_db_prep_save)
+            for field in self.fields
+        ]
+
+        qn = self.connection.ops.quote_name
+        self.insert_sql = 'INSERT INTO {} ({}) VALUES '.format(
+            qn(meta.db_table), ', '.join(qn(field.column) for field in self.fields)
+        )
+        self.placeholders = '({})'.format(', '.join(['%s'] * len(self.fields)))
+
+        self.returning_sql = None
+        if self.connection.features.can_return_rows_from_bulk_insert and not self.pk_provided:
+            returning, _ = self.connection.ops.return_insert_columns([meta.pk])
+            self.returning_sql = returning
+
+    @property
+    def connection(self):
+        """The connection of the current thread (connections are thread-local, and inserters are reused by every
+        thread writing the same model, see `SystemImporter.import_pipelined`)
+        """
+        return connections[self.using]
+
+    def get_params(self, kv: Dict[str,Any], connection=None) -> tuple:
+        connection = connection or self.connection
+        params = []
+        for (name, attname, prepare), field in zip(self.columns, self.fields):
+            if name in kv:
+                value = kv[name]
+                if isinstance(value, models.Model):
+                    value = getattr(value, field.target_field.attname)
+            elif attname in kv:
+                value = kv[attname]
+            else:
+                value = field.get_default()
+
+            if prepare is not None:
+                value = prepare(value, connection)
+            params.append(value)
+        return tuple(params)
+
+    def insert(self, rows: List[Dict[str,Any]], batch_size: int = None) -> List[Optional[Any]]:
+        """
+        :param rows:        Key/values for each new row
+        :param batch_size:  Rows per statement (capped by the backend's limit on query parameters)
+        :return: the primary key of each new row, or Nones if the backend can't return them
+        """
+        if not rows:
+            return []
+
+        connection = self.connection
+        max_batch_size = connection.ops.bulk_batch_size(self.fields, rows)
+        batch_size = min(batch_size, max_batch_size) if batch_size else max_batch_size
+
+        pks = []
+        with connection.cursor() as cursor:
+            for start in range(0, len(rows), batch_size):
+                batch = [self.get_params(kv, connection) for kv in rows[start:start + batch_size]]
+
+                if self.returning_sql is None:
+                    cursor.executemany(self.insert_sql + self.placeholders, batch)
+                    if self.pk_provided:
+                        pk_index = self.fields.index(self.model._meta.pk)
+                        pks.extend(params[pk_index] for params in batch)
+                    else:
+                        pks.extend([None] * len(batch))
+                    continue
+
+                cursor.execute(
+                    self.insert_sql + ', '.join([self.placeholders] * len(batch)) + ' ' + self.returning_sql,
+                    [param for params in batch for param in params]
+                )
+                pks.extend(row[0] for row in cursor.fetchall())
+
+        return pks
@@ -0,0 +1,16 @@
+"""Signals sent by `SystemImporter`.
+
+Objects are written with bulk inserts, so `post_save` is never sent for them: receivers of `chunk_imported` get
+every chunk's new objects at once instead, for set-based follow-up work (e.g. indexing them).
+"""
+from django.dispatch import Signal
+
+#: Sent for every root, once per committed chunk (or call to `SystemImporter.store_data`), after the transaction
+#:  writing its objects has committed (nothing is sent for chunks that are rolled back).  An exception raised by a
+#:  receiver aborts the import (after the chunk, which stays committed).
+#:  sender:     The root's model
+#:  importer:   The `SystemImporter`
+#:  pks:        Primary keys of the objects created (None for each object, where the backend doesn't return them)
+#:  rows:       The file row each of those objects was created from (or None if they aren't known)
+#:  using:      The database alias the objects were written to
+chunk_imported = Signal()
@@ -0,0 +1,231 @@
+import bz2
+import gzip
+import itertools
+import json
+import lzma
+import os
+
+from typing import *
+
+DEFAULT_DELIMITER = ','
+
+#: Opens (binary) files according to their extension
+COMPRESSED_OPENERS = {
+    '.gz': gzip.open,
+    '.bz2': bz2.open,
+    '.xz': lzma.open,
+}
+
+
+def open_binary(path: str, compression: str = None) -> BinaryIO:
+    """Open a plain, gzip, bz2 or xz file for (streamed) reading
+
+    :param compression: One of the keys of COMPRESSED_OPENERS; inferred from the file extension if not given
+    """
+    if compression is None:
+        compression = os.path.splitext(path)[1]
+
+    return COMPRESSED_OPENERS.get(compression, open)(path, 'rb')
+
+
+def get_file_identity(path: str) -> Dict[str,Any]:
+    """What tells a file apart from the next version of it (e.g. the next snapshot written to the same path)
+    """
+    stat = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime': stat.st_mtime}
+
+
+class Source(object):
+    """A stream of rows for `SystemImporter`.  Each row is a sequence of values laid out as the importer's
+    `csv_import_format`; values are raw strings, or already typed values (lists for m2m references).
+
+    Every row is yielded with a *position*, which can be passed back to `self.rows` to resume reading after it
+    (e.g. from a `Checkpoint`).
+    """
+
+    #: Whether `self.rows` can be called more than once (e.g. to scan the rows before importing them)
+    reiterable = True
+
+    def rows(self, position: int = 0) -> Iterator[Tuple[int,Sequence]]:
+        """
+        :param position: A position previously yielded by this method (0 => start of the source)
+        :return: (position just past the row, row) pairs
+        """
+        raise NotImplementedError
+
+    @property
+    def size(self) -> Optional[int]:
+        """The position at the end of the source, if it is known up front
+        """
+        return None
+
+    @property
+    def identity(self) -> Optional[Dict[str,Any]]:
+        """Identifies the data the source reads (None if it can't), so positions aren't resumed in other data
+        """
+        return None
+
+
+class LineSource(Source):
+    """Base for text formats with one row per line.  Positions are byte offsets into the (decompressed) file, so
+    resuming seeks rather than re-reading the file.
+    """
+
+    def __init__(self, path: str, encoding: str = 'utf-8', compression: str = None, header: bool = False):
+        """
+        :param path:
+        :param encoding:
+        :param compression: '.gz', '.bz2' or '.xz' (inferred from the path if not given)
+        :param header:      Whether the first line holds column names, rather than data
+        """
+        self.path = path
+        self.encoding = encoding
+        self.compression = compression
+        self.header = header
+
+    def parse_line(self, line: str) -> Sequence:
+        raise NotImplementedError
+
+    def rows(self, position: int = 0) -> Iterator[Tuple[int,Sequence]]:
+        with open_binary(self.path, self.compression) as f:
+            if position:
+                f.seek(position)
+            elif self.header:
+                position = len(f.readline())
+
+            for line in iter(f.readline, b''):
+                position += len(line)
+                line = line.decode(self.encoding).rstrip('\r\n')
+                if not line:
+                    continue
+                yield position, self.parse_line(line)
+
+    @property
+    def size(self) -> Optional[int]:
+        if os.path.splitext(self.path)[1] in COMPRESSED_OPENERS or self.compression:
+            return None
+        return os.path.getsize(self.path)
+
+    @property
+    def identity(self) -> Optional[Dict[str,Any]]:
+        return get_file_identity(self.path)
+
+
+class CsvSource(LineSource):
+    """Delimited text, with values split on `delimiter` (m2m references are split later, on M2M_DELIMITER)
+    """
+
+    def __init__(self, path: str, delimiter: str = DEFAULT_DELIMITER, **kwargs):
+        super().__init__(path, **kwargs)
+        self.delimiter = delimiter
+
+    def parse_line(self, line: str) -> Sequence:
+        return line.split(self.delimiter)
+
+
+class JsonLinesSource(LineSource):
+    """One json document per line: either an array of values (in import format order), or an object whose values
+    are picked out by `fields`.  Scalars are passed on as strings, arrays (m2m references) as lists of strings.
+    """
+
+    def __init__(self, path: str, fields: Sequence[str] = None, **kwargs):
+        """
+        :param fields:  Keys to read from each json object, in import format order (required for objects)
+        """
+        super().__init__(path, **kwargs)
+        self.fields = fields
+
+    @staticmethod
+    def to_value(value):
+        if isinstance(value, list):
+            return [str(v) for v in value]
+        return '' if value is None else str(value)
+
+    def parse_line(self, line: str) -> Sequence:
+        document = json.loads(line)
+        if isinstance(document, dict):
+            if self.fields is None:
+                raise ValueError('JsonLinesSource needs `fields` to read json objects.')
+            document = [document.get(f) for f in self.fields]
+
+        return [self.to_value(v) for v in document]
+
+
+class IterableSource(Source):
+    """Rows from any python iterable or generator.  Positions count rows, so resuming skips through the iterable.
+
+    Iterators (e.g. generators) can only be read once: imports that need a second pass over the rows (e.g. to scan
+    for duplicate keys) need a re-iterable (e.g. a list, or an object creating a fresh generator on `__iter__`).
+    """
+
+    def __init__(self, iterable: Iterable[Sequence]):
+        self.iterable = iterable
+        self.reiterable = iter(iterable) is not iterable
+        self._read = False
+
+    def rows(self, position: int = 0) -> Iterator[Tuple[int,Sequence]]:
+        if not self.reiterable:
+            if self._read:
+                raise RuntimeError('The rows of a one-shot iterable (e.g. a generator) can only be read once.')
+            self._read = True
+
+        for position, row in enumerate(itertools.islice(self.iterable, position, None), start=position + 1):
+            yield position, row
+
+    @property
+    def size(self) -> Optional[int]:
+        return len(self.iterable) if hasattr(self.iterable, '__len__') else None
+
+
+class ExcelSource(Source):
+    """Rows of an xlsx worksheet, streamed with openpyxl's read-only mode (requires the `excel` extra).  Cells keep
+    the types openpyxl reads them with (e.g. dates), empty cells become ''.  Positions count rows.
+    """
+
+    def __init__(self, path: str, sheet: str = None, header: bool = False):
+        """
+        :param sheet:   Name of the worksheet (defaults to the active one)
+        :param header:  Whether the first row holds column names, rather than data
+        """
+        self.path = path
+        self.sheet = sheet
+        self.header = header
+
+    def rows(self, position: int = 0) -> Iterator[Tuple[int,Sequence]]:
+        try:
+            import openpyxl
+        except ImportError:
+            raise ImportError('Reading xlsx files requires openpyxl: pip install django_simple_imports[excel]')
+
+        workbook = openpyxl.load_workbook(self.path, read_only=True, data_only=True)
+        try:
+            worksheet = workbook[self.sheet] if self.sheet else workbook.active
+            start = position + 1 if self.header else position
+            rows = worksheet.iter_rows(min_row=start + 1, values_only=True)
+            for position, row in enumerate(rows, start=position + 1):
+                if all(v is None for v in row):
+                    continue
+                yield position, ['' if v is None else v for v in row]
+        finally:
+            workbook.close()
+
+    @property
+    def identity(self) -> Optional[Dict[str,Any]]:
+        return {**get_file_identity(self.path), 'sheet': self.sheet}
+
+
+def get_source(path: str, **kwargs) -> Source:
+    """Pick a source by file extension: .jsonl (JsonLinesSource), .xlsx (ExcelSource), anything else is read as csv.
+    Compression extensions (.gz, .bz2, .xz) are looked through.
+
+    :param kwargs: Passed on to the source
+    """
+    base, extension = os.path.splitext(path)
+    if extension in COMPRESSED_OPENERS:
+        extension = os.path.splitext(base)[1]
+
+    if extension in ('.jsonl', '.ndjson'):
+        return JsonLinesSource(path, **kwargs)
+    if extension == '.xlsx':
+        return ExcelSource(path, **kwargs)
+    return CsvSource(path, **kwargs)
@@ -1,14 +1,31 @@
-from typing import Dict, List, Tuple
+import asyncio
+import time
+from functools import partial
+from typing import Any, Dict, List, Set, Tuple, Iterable, Iterator, Sequence, Union, Mapping, Optional, Callable
 from collections import defaultdict
+from contextlib import ExitStack
 
-from django.db import models
-from django.db.models.fields.related_descriptors import ManyToManyDescriptor
+from asgiref.sync import sync_to_async
+
+from django.core.exceptions import NON_FIELD_ERRORS
+from django.db import DEFAULT_DB_ALIAS, models, transaction, connections, router
 
 from dotdict import DotDict
 
-from .sorter import Sorter
+from . import helpers, columnar, indexes, signals
+from .graph import ImporterGraph
 from .model_importer import ModelImporter
-from .importer_manager import ImporterManager
+from .importer_manager import ImporterManager, get_model_scope
+from .checkpoint import Checkpoint
+from .fingerprints import FingerprintStore, CHANGED, UNCHANGED
+from .duplicates import DuplicateDetector
+from .sources import Source, CsvSource, DEFAULT_DELIMITER
+from .pipeline import Pipeline, Stage
+from .progress import ChunkStats, ImportObserver, CallbackObserver
+from .cache import DependencyCache
+from . import raw_insert
+from .raw_insert import RawInserter
+from .bulk_load import BulkLoad
 
 #: TODO: delete the commented delimiter for the following reasons, AFTER documenting how to specify multiple fields
 # (TODO) for an object referenced in a m2m relationship
@@ -18,19 +35,144 @@ from .importer_manager import ImporterManager
 
 #: TODO: Move to a settings file, which can be overridden
 M2M_DELIMITER = ';'
-DEFAULT_DELIMITER = ','
 
-class SystemImporter:
+class ChunkState(object):
+    """The managers (and bookkeeping) for one chunk of rows, so that several chunks can be in flight at once
+    """
+    __slots__ = ('managers', 'importers_to_manager', 'row_numbers', 'rows', 'n_rows', 'position', 'new_objects',
+                 'deferred')
+
+    def __init__(self, managers: List[ImporterManager], importers_to_manager: Dict[ModelImporter,ImporterManager],
+                 row_numbers: List[int], n_rows: int, position: int = None, rows: List[Sequence] = None,
+                 deferred: bool = False):
+        self.managers = managers
+        self.importers_to_manager = importers_to_manager
+        #: File row of each row loaded into the managers
+        self.row_numbers = row_numbers
+        #: The raw rows loaded into the managers
+        self.rows = rows
+        #: The chunk holds the rows deferred by earlier chunks (see `SystemImporter.deferred_rows`), rather than
+        #: rows read from the source
+        self.deferred = deferred
+        #: Number of rows read for the chunk (including any that were filtered out)
+        self.n_rows = n_rows
+        #: Source position just past the chunk
+        self.position = position
+        self.new_objects: List[models.Model] = []
+
 
-    def __init__(self, importers: List[ModelImporter], csvfilepath: str):
+class FileResult(object):
+    """The outcome of importing one file of a batch (see `SystemImporter.import_batch`)
+    """
+    __slots__ = ('source', 'rows', 'created', 'unchanged', 'errors', 'exception')
+
+    def __init__(self, source: Source):
+        self.source = source
+        self.rows = 0
+        #: Objects created (for every root)
+        self.created = 0
+        self.unchanged = 0
+        #: Row errors, keyed by row of the file
+        self.errors: Dict[int,Dict[str,str]] = {}
+        #: The exception that rolled the file back, if any
+        self.exception: Exception = None
+
+    @property
+    def committed(self) -> bool:
+        return self.exception is None
+
+
+class SystemImporter(ImporterGraph):
+
+    def __init__(self, importers: List[ModelImporter], csvfilepath: Union[str,Source], chunk_size: int = None,
+                 checkpoint: Checkpoint = None, fingerprints: FingerprintStore = None,
+                 duplicates: DuplicateDetector = None, concurrent: bool = False, max_retries: int = 3,
+                 retry_backoff: float = 0.1, batch_size: int = None, progress: Callable = None,
+                 observers: List[ImportObserver] = None, roots: List[ModelImporter] = None,
+                 cache: DependencyCache = None, using: str = None, write_using: str = None,
+                 consistent_reads: bool = True, scope: Dict[str,Any] = None, check_indexes: bool = False,
+                 encoding: str = 'utf-8'):
         """
 
         :param importers:   This must include all necessary importers needed for all dependencies to be met
                             (i.e. Must be the transitive closure of necessary dependencies)
-        :param csvfilepath:
+        :param csvfilepath: Path to a csv file (optionally gz/bz2/xz compressed), or any `Source` of rows
+        :param chunk_size:  If given, `import_data` reads, resolves and stores the file `chunk_size` rows at a time,
+                            committing each chunk in its own transaction.  Otherwise the whole file is loaded into
+                            the managers, and objects are created through `get_new_objects`/`store_data`.
+        :param checkpoint:  (Requires chunk_size) Records each committed chunk, so that a restarted import seeks
+                            directly to the first uncommitted one.  It's cleared once the import finishes, and a
+                            checkpoint saved by the import of another file (or version of it) is refused.
+        :param fingerprints: If given, the import is incremental: rows whose root key was imported by a previous
+                            run with identical content are skipped before they reach the managers, and rows whose
+                            key was imported with different content are reported in `self.errors` (objects are
+                            never updated).
+        :param duplicates:  If given, rows sharing the root importer's key with another row of the file are
+                            resolved according to the detector's policy while the file is streamed, so duplicate
+                            rows never reach `bulk_create`.
+        :param concurrent:  Makes the import safe to run alongside other imports writing to the same tables:
+                            objects are written in a deterministic (sorted) order, dependencies with `auto_create`
+                            are created with ON CONFLICT DO NOTHING and then retrieved again, and writes failing on
+                            a deadlock or lock timeout are retried.
+        :param max_retries: (concurrent) Number of retries for a write failing on a deadlock or lock timeout
+        :param retry_backoff: (concurrent) Seconds before the first retry; doubles with every further retry
+        :param batch_size:  Passed on to `bulk_create` (number of objects per INSERT)
+        :param progress:    (Chunked imports) Called as `progress(importer, stats)` after every committed chunk,
+                            with the chunk's `ChunkStats`
+        :param observers:   `ImportObserver`s notified when the import starts, after every committed chunk, and
+                            when it finishes
+        :param roots:       The importers whose objects are created from every row (defaults to the last importer
+                            in dependency order).  Dependencies shared by several roots are resolved once per chunk,
+                            and roots are written in dependency order (in the same transaction), so a root depending
+                            on another one is given the objects that were just created for its row.
+        :param cache:       Dependencies found by earlier chunks are taken from the cache rather than queried again
+        :param using:       Database alias dependencies are looked up in (e.g. a read replica; None => as routed by
+                            django).  Importers may override it with their own `using`.
+        :param write_using: Database alias objects are written to, and whose transactions wrap the writes (None =>
+                            as routed by django, in transactions on the default database).  Importers may override it
+                            with their own `write_using`, whose transactions then wrap their writes.
+        :param consistent_reads: Once an importer has auto-created objects, look its objects up in the alias they
+                            were written to for the rest of the import, rather than in `using` (which may lag
+                            behind, and would have the same objects created again)
+        :param scope:       Fixed filters every lookup is made within, for the models having those fields, e.g.
+                            {'company_id': 3} when every row belongs to one tenant (so that lookups use composite
+                            (company, key) indexes, and cached objects are cached per tenant).  Objects auto-created
+                            without those fields are given the scope's values.
+        :param check_indexes: Warn about dependencies whose lookups can't use an index (see `self.check_indexes`)
+        :param encoding:    (csv files)
         """
         self.importers = importers
 
+        if checkpoint is not None and chunk_size is None:
+            raise RuntimeError('Checkpointing an import requires a chunk_size.')
+        if concurrent and any(importer.key_filter is not None for importer in importers):
+            #: Objects committed by other imports out of primary key order would be missed by the filters
+            raise ValueError('Key filters can\'t be used by concurrent imports.')
+
+        self.chunk_size = chunk_size
+        self.checkpoint = checkpoint
+        self.fingerprints = fingerprints
+        self.duplicates = duplicates
+        self.concurrent = concurrent
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.cache = cache
+        self.using = using
+        self.write_using = write_using
+        self.consistent_reads = consistent_reads
+        self.scope = scope or {}
+        for name in self.scope:
+            if not any(get_model_scope(importer.model, {name: None}) for importer in importers):
+                raise ValueError(f'The scope\'s {name} is not a field of any of the importers\' models.')
+
+        #: (consistent_reads) Importers that auto-created objects during this import
+        self.written_importers: Set[ModelImporter] = set()
+        self.batch_size = batch_size
+        self.observers: List[ImportObserver] = list(observers or [])
+        if progress is not None:
+            self.observers.append(CallbackObserver(progress))
+        self.encoding = encoding
+
         #: Initialize dependency structure of imports
         self.graph = []
         """:type:list[DotDict]"""
@@ -40,6 +182,22 @@ class SystemImporter:
         self._construct_adjacency_graph()
         self._topologically_sort_graph()
 
+        #: The vertices of the importers creating objects, in dependency order
+        self.root_vertices: List[DotDict] = self._get_root_vertices(roots)
+        self.root_ids: Set[int] = {v.id for v in self.root_vertices}
+
+        #: (Roots with `raw_insert`) by importer and alias
+        self.inserters: Dict[Tuple[ModelImporter,str],RawInserter] = {}
+        for v in self.root_vertices:
+            reason = raw_insert.get_unsupported_reason(v.importer.model) if v.importer.raw_insert else None
+            if reason is not None:
+                raise ValueError(f'{v.importer.__name__} can\'t use raw inserts: {reason}')
+
+        #: Dependencies that may be defined by rows of the file itself (see `ModelImporter.file_references`)
+        self.file_reference_importers: Set[ModelImporter] = set()
+        for v in self.root_vertices:
+            self.file_reference_importers.update(self._get_file_reference_importers(v.importer))
+
         #: Initialize csv reading state machines (managers)
         self.managers = []
         """:type:list[ImportManager]"""
@@ -49,6 +207,7 @@ class SystemImporter:
 
         self.importers_to_verticies: Dict[ModelImporter,DotDict[str, object]] = {}
 
+        #: The model of the first root (i.e. of `self.new_objects`)
         self.create_model = None
         """:type:models.Model"""
 
@@ -66,116 +225,231 @@ class SystemImporter:
 
         self.csv_import_format = self._get_import_fields()
 
+        #: Locations of the root importer's fields, which identify the object created by each row
+        self.root_key_locations: List[int] = [
+            i for i,importer in self.location_to_importer.items() if importer == self.root_vertices[-1].importer
+        ]
+
         self.new_objects: List[models.Model] = []
 
 
         self.candidate_objects: List[models.Model] = []
 
-        self.lines = []
-        """:list[str]"""
+        #: Index (into the whole file) of the first row of the current chunk
+        self.row_offset = 0
 
-        if csvfilepath:
-            self.file_path = csvfilepath
+        #: Maps each row of the current managers back to its row in the file (rows may have been skipped)
+        self.row_numbers: List[int] = []
 
-            with open(self.file_path, 'r') as f:
-                self.lines = f.readlines()
+        #: The raw rows of the current chunk
+        self.chunk_rows: List[Sequence] = []
 
-        else:
-            raise RuntimeError("Must provide a file with data in the format: {}".format(self.csv_import_format))
+        #: (Chunked imports) Rows referencing other rows of the file (see `ModelImporter.file_references`) that are
+        #: neither in the database nor in the row's chunk, by file row.  They're imported once every chunk has been
+        #: written (see `self._import_deferred_rows`), when rows of later chunks can be found in the database.
+        self.deferred_rows: Dict[int,Sequence] = {}
+        self.defer_references = False
 
+        #: Number of rows skipped by an incremental import because they had not changed
+        self.unchanged_rows = 0
 
-    def _construct_adjacency_graph(self):
+        #: Number of objects written by `self.store_data` so far (for every root), and by its last call
+        self.stored_objects = 0
+        self.last_stored_objects = 0
 
-        for i,vertex in enumerate(self.importers):
-            #: TODO: Replace DotDict with a Node class
-            self.graph.append(DotDict({
-                'id': i,
-                'Adj': [],
-                'p': None,
-                'color': "WHITE",
-                'd': 0,
-                'f': 0,
-                'importer': vertex,
-                #: Discloses whether this vertex in the graph is m2m to any others (will be set by vertices with
-                #: dependent imports back to it)
-                'is_m2m': False
-            }))
+        #: (importer, manager, created objects) of every root written by the last call to `self.store_data`
+        self.last_created: List[Tuple[ModelImporter,ImporterManager,List[models.Model]]] = []
 
-        #: Once this for loop is complete, circle back and add to the Adjacencies
-        for vertex in self.graph:
+        #: Source position just past the last committed chunk
+        self.position = 0
 
-            #: Should return a dictionary
-            neighbors = vertex.importer.dependent_imports
+        #: (checkpoint) The input's `Source.identity`, and the state to save once the current chunk is stored
+        self.source_identity: Optional[Dict[str,Any]] = None
+        self.pending_checkpoint: Optional[Dict[str,Any]] = None
 
-            if not neighbors:
-                continue
+        #: Errors collected from the managers of every chunk processed so far, keyed by file row
+        self.errors: Dict[int,Dict[str,str]] = {}
+
+        #: When the current chunk was started (i.e. when the previous one was committed)
+        self.chunk_started: float = None
+
+        self.file_path: str = None
+        self.source: Source = None
+
+        self._set_source(csvfilepath)
+
+        if check_indexes:
+            self.check_indexes()
 
-            for field,importer in neighbors.items(): #: This is deterministic and therefore the results are.
-                inner_vertex = next((x for x in self.graph if x.importer==importer),None)
-                assert inner_vertex is not None
-                vertex.Adj.append(self.graph[inner_vertex.id])
+    def check_indexes(self, explain: bool = False) -> List[indexes.IndexReport]:
+        """Check that the lookups of every dependency (i.e. every importer but the roots) can use an index of the
+        database they're made in, warning (`indexes.ScanWarning`) about those that will scan their table
 
-                #: Tell the vertex that it is many-2-many with respect to itself
-                #: TODO: use this from the helpers file if it's still necesary
-                if self.is_many_to_many(field,vertex.importer.model):
-                    self.graph[inner_vertex.id].is_m2m = True
+        :param explain: Attach the database's plan for a sample lookup to each report
+        """
+        dependencies = [v.importer for v in self.sorted_vertices if v.id not in self.root_ids]
+        return indexes.check_indexes(dependencies, using=self.using, scope=self.scope, explain=explain)
+
+    def _set_source(self, csvfilepath: Union[str,Source]):
+        if isinstance(csvfilepath, Source):
+            self.file_path = None
+            self.source = csvfilepath
 
-    def _topologically_sort_graph(self):
-        sorter = Sorter()
-        sorter.dfs(self.graph)
-        self.sorted_vertices = sorter.sorted_vertices
+        elif csvfilepath:
+            self.file_path = csvfilepath
+            self.source = CsvSource(csvfilepath, encoding=self.encoding)
+
+        else:
+            raise RuntimeError("Must provide a file with data in the format: {}".format(self.csv_import_format))
+
+
+    def _get_root_vertices(self, roots: Optional[List[ModelImporter]]) -> List[DotDict]:
+        if not roots:
+            return [self.sorted_vertices[-1]]
+
+        for importer in roots:
+            if importer not in self.importers:
+                raise ValueError(f'Root {importer.__name__} is not one of the importers.')
+
+        root_vertices = [v for v in self.sorted_vertices if v.importer in roots]
+        for v in self.sorted_vertices:
+            if v.importer in roots:
+                continue
+            #: Dependencies are all resolved before any root is written
+            for dependency in v.Adj:
+                if dependency.importer in roots:
+                    raise ValueError(f'{v.importer.__name__} depends on the root {dependency.importer.__name__}, '
+                                     f'so it must be a root as well.')
+
+        return root_vertices
+
+    @staticmethod
+    def _get_file_reference_importers(importer: ModelImporter) -> List[ModelImporter]:
+        """Check `importer`'s `file_references`, and return the importers they're made through
+        """
+        dependencies = []
+        for fname in importer.file_references:
+            dependency = importer.dependent_imports.get(fname)
+            if dependency is None:
+                raise ValueError(f'{importer.__name__} has a file reference to {fname}, which isn\'t one of its '
+                                 f'dependent_imports.')
+            if dependency.model is not importer.model:
+                raise ValueError(f'{importer.__name__}.{fname} refers to {dependency.model.__name__}: only references '
+                                 f'to {importer.model.__name__} can be defined by the file.')
+            if not set(dependency.required_fields or ()) <= set(importer.required_fields or ()):
+                raise ValueError(f'The required_fields of {dependency.__name__} must be required_fields of '
+                                 f'{importer.__name__}, to match its references against the rows of the file.')
+            dependencies.append(dependency)
+        return dependencies
 
     def _initialize_managers(self):
         for i,v in enumerate(self.sorted_vertices):
-            #: N.B: This Assume that only one model type is being created for each import (everything else defines getters
-            #:      for FK fields or fields of the new object)
-            if i == len(self.sorted_vertices)-1:
-                create = True
-            else:
-                create = False
-
-            self.managers.append(
-                ImporterManager(v.importer,create=create)
-            )
-            self.importers_to_manager[v.importer] = self.managers[i]
-
             self.importers_to_verticies[v.importer] = v
 
+        self._reset_managers()
+
         #: TODO: Check whether any dependent_importer fields in self.sorted_vertices[-1].importer are m2m, and
         #:       throw an error if they are
-        self.create_model = self.sorted_vertices[-1].importer.model
+        self.create_model = self.root_vertices[0].importer.model
 
-    def _get_import_fields(self):
-        fields = ""
-        count = 0; #: TODO: Move to enumerated field
-        for v in self.sorted_vertices:
-            if v.importer.required_fields is None:
-                continue
+    def _create_managers(self) -> Tuple[List[ImporterManager],Dict[ModelImporter,ImporterManager]]:
+        """Empty managers (managers hold the state of a single chunk of rows)
+        """
+        managers = []
+        importers_to_manager = {}
+        for i,v in enumerate(self.sorted_vertices):
+            #: Only the roots create objects (everything else defines getters for FK fields or fields of the new
+            #: objects)
+            create = v.id in self.root_ids
 
-            for field in v.importer.required_fields:
+            managers.append(
+                ImporterManager(v.importer,create=create,cache=self.cache,using=self.using,
+                                write_using=self.write_using,scope=self.scope)
+            )
+            if self.consistent_reads and v.importer in self.file_reference_importers:
+                #: (References to rows of the file are written by earlier chunks)
+                managers[i].using = managers[i].write_using
+            importers_to_manager[v.importer] = managers[i]
 
-                self.location_to_importer[count] = v.importer
+        return managers, importers_to_manager
 
-                self.location_to_csv_field[count] = field
+    def _reset_managers(self):
+        """Replace the current managers with empty ones
+        """
+        self.managers, self.importers_to_manager = self._create_managers()
 
-                fields = f'{fields}{field},'
-                count+=1
+    def _read_chunks(self, position: int = 0) -> Iterator[Tuple[List[Sequence],int]]:
+        """Group the rows streamed from `self.source` into lists of `self.chunk_size` (or a single list of every
+        row if there is no chunk size)
 
-        return fields
+        The size of each chunk is read as the chunk is started (observers may change `self.chunk_size` while chunks
+        are read ahead, see `tuning.AdaptiveChunkSize`).
 
-    def is_many_to_many(self, field: str, model: models.Model):
-        if isinstance(getattr(model,field),models.ManyToManyField) or \
-                isinstance(getattr(model,field),ManyToManyDescriptor):
-            return True
-        else:
-            return False
+        :return: (rows of field values, source position just past the last row) pairs
+        """
+        rows = []
+        chunk_size = self.chunk_size
+        for position, fields in self.source.rows(position):
+            rows.append(fields)
+            if chunk_size is not None and len(rows) >= chunk_size:
+                yield rows, position
+                rows = []
+                chunk_size = self.chunk_size
+
+        if rows:
+            yield rows, position
+
+    def get_root_key(self, fields: Sequence) -> List[str]:
+        """The raw values of the root importer's `required_fields` in a row
+        """
+        return [fields[i] for i in self.root_key_locations]
 
-    def import_data(self):
-        #: TODO: Make it so you don't need to assume there's no header
-        # Loop 1: Extract data from file, and prep importer managers to pull related data from disk
-        for row,line in enumerate(self.lines):
+    def _scan_duplicates(self, until_row: int = None):
+        """Stream root keys through `self.duplicates.scan`, from the start of the file up to `until_row`
+        """
+        for row, (_, fields) in enumerate(self.source.rows()):
+            if until_row is not None and row >= until_row:
+                break
+            self.duplicates.scan(row, self.get_root_key(fields))
+
+    def _filter_rows(self, rows: List[Sequence], row_offset: int) -> Tuple[List[Sequence],List[int]]:
+        """Drop the rows that don't need to be imported
+
+        :param row_offset:  File row of `rows[0]`
+        :return: (remaining rows, file row of each remaining row)
+        """
+        row_numbers = []
+        filtered = []
+        for i,fields in enumerate(rows):
+            if self.duplicates is not None and \
+                    not self.duplicates.accept(row_offset + i, self.get_root_key(fields)):
+                continue
+
+            if self.fingerprints is not None:
+                status, key_digest, row_digest = self.fingerprints.compare(self.get_root_key(fields), fields)
+                if status == UNCHANGED:
+                    self.unchanged_rows += 1
+                    continue
+                if status == CHANGED:
+                    #: There is no update path: importing the row would create a second object for its key
+                    self.errors[row_offset + i] = {NON_FIELD_ERRORS: 'The row has changed since its key was '
+                                                                     'imported, and objects are never updated.'}
+                    continue
+                self.fingerprints.stage(row_offset + i, key_digest, row_digest)
+
+            row_numbers.append(row_offset + i)
+            filtered.append(fields)
+
+        return filtered, row_numbers
+
+    def _parse_rows(self, rows: List[Sequence], importers_to_manager: Dict[ModelImporter,ImporterManager] = None):
+        """Extract data from each row, and prep importer managers to pull related data from disk
+        """
+        if importers_to_manager is None:
+            importers_to_manager = self.importers_to_manager
 
-            fields = line.split(DEFAULT_DELIMITER)
+        #: TODO: Make it so you don't need to assume there's no header
+        for row,fields in enumerate(rows):
 
             #: Iterate accross row of csv file
             for i,value in enumerate(fields):
@@ -185,58 +459,831 @@ class SystemImporter:
                 #region Handle Parsing out M2M relationships if present
                 if self.importers_to_verticies[_importer].is_m2m:
 
-                    m2m_refs = value.split(M2M_DELIMITER)
+                    m2m_refs = value if isinstance(value, list) else value.split(M2M_DELIMITER)
                     for col,ref in enumerate(m2m_refs):
-                        self.importers_to_manager[_importer].update_kvs( #: Added
+                        importers_to_manager[_importer].update_kvs( #: Added
                             field_name=_field, value=ref, row=row, col=col
                         )
 
                 #endregion
                 else:
-                    self.importers_to_manager[_importer].update_kvs(
-                        _field, value.replace('\n',''), row=row
+                    importers_to_manager[_importer].update_kvs(
+                        _field, value, row=row
+                    )
+
+    def _push_dependencies(self, vertex: DotDict, importers_to_manager: Dict[ModelImporter,ImporterManager]):
+        """Push the objects retrieved by the managers of `vertex`'s dependencies into its own manager's kvs
+        """
+        manager = importers_to_manager[vertex.importer]
+        for fname, _importer in vertex.importer.dependent_imports.items():
+
+            _manager = importers_to_manager[_importer]
+
+            for row in range(_manager.get_latest_row() + 1): #range is exclusive of upper bound
+                records = _manager.get_objs_and_meta(row)
+                if (not records or not all(rec.available for rec in records)) and \
+                        manager.create and fname in vertex.importer.file_references:
+                    #: Left to the rows of the file (see `self._insert_in_waves`)
+                    key = tuple(_manager.kvs[row][0].get(f) for f in _importer.required_fields)
+                    if any(value not in (None, '') for value in key):
+                        manager.file_references[row][fname] = key
+                    manager.update_kvs(field_name=fname, value=None, row=row)
+                    continue
+
+                if not records or not all(rec.available for rec in records):
+                    manager.errors.setdefault(row, {})[fname] = \
+                        f'{_importer.model.__name__} not found for this row.'
+                    manager.update_kvs(field_name=fname, value=None, row=row)
+                    continue
+
+                if row in _manager.errors:
+                    manager.errors.setdefault(row, {})[fname] = \
+                        f'{_importer.model.__name__} could not be resolved for this row.'
+
+                manager.update_kvs(
+                    field_name=fname, value=_manager.get_object_or_list(row), row=row
+                )
+
+    def _set_read_alias(self, importer: ModelImporter, manager: ImporterManager):
+        """(consistent_reads) Look `importer`'s objects up where they were written to, once an earlier chunk has
+        auto-created some.  Decided as the chunk is resolved rather than parsed, since chunks may be parsed ahead
+        (see `self.aimport_data` and `self.import_pipelined`).
+        """
+        if importer in self.written_importers:
+            manager.using = manager.write_using
+
+    def _resolve_vertex(self, vertex: DotDict, importers_to_manager: Dict[ModelImporter,ImporterManager]):
+        if vertex.id in self.root_ids and vertex.id != self.root_vertices[0].id:
+            #: Depends on objects that don't exist until the roots before it are written (see `self._create_roots`)
+            return
+
+        manager = importers_to_manager[vertex.importer]
+        self._push_dependencies(vertex, importers_to_manager)
+
+        #: Now that your dependencies should be satisfied, get data from disk to enable the next row
+        if not manager.create:
+            self._set_read_alias(vertex.importer, manager)
+            manager.get_available_rows()
+
+            if vertex.importer.auto_create:
+                created = self._write(lambda: manager.create_missing_rows(ignore_conflicts=self.concurrent),
+                                      using=[manager.write_using])
+                if created and self.consistent_reads:
+                    self.written_importers.add(vertex.importer)
+
+    def _resolve_rows(self):
+        """Work up the (topologically sorted) dependency tree: each manager's dependencies have been retrieved by
+        the time it is reached, so their objects are pushed into its kvs before its own rows are retrieved.
+        """
+        for vertex in self.sorted_vertices:
+            self._resolve_vertex(vertex, self.importers_to_manager)
+
+    async def _aresolve_rows(self):
+        """Async counterpart to `self._resolve_rows`
+        """
+        for vertex in self.sorted_vertices:
+            if vertex.id in self.root_ids and vertex.id != self.root_vertices[0].id:
+                continue
+
+            manager = self.importers_to_manager[vertex.importer]
+            self._push_dependencies(vertex, self.importers_to_manager)
+
+            if not manager.create:
+                self._set_read_alias(vertex.importer, manager)
+                await manager.aget_available_rows()
+
+                created = None
+                if vertex.importer.auto_create and self.concurrent:
+                    #: Retrying on deadlocks needs a (synchronous) transaction
+                    created = await sync_to_async(self._write)(
+                        lambda: manager.create_missing_rows(ignore_conflicts=True)
                     )
+                elif vertex.importer.auto_create:
+                    created = await manager.acreate_missing_rows()
+
+                if created and self.consistent_reads:
+                    self.written_importers.add(vertex.importer)
+
+    def _collect_errors(self):
+        for manager in self.managers:
+            for row, errors in manager.errors.items():
+                if self.row_numbers[row] in self.deferred_rows:
+                    #: (e.g. a further root depending on the deferred object: retried with it)
+                    continue
+                self.errors.setdefault(self.row_numbers[row], {}).update(errors)
+
+    def _prepare_chunk(self, rows: List[Sequence], row_offset: int, position: int = None) -> ChunkState:
+        """Filter and parse a chunk of rows into new managers, without disturbing the current ones (so that the
+        next chunk can be prepared while the current one is resolved, see `self.aimport_data`)
+        """
+        managers, importers_to_manager = self._create_managers()
+        filtered, row_numbers = self._filter_rows(rows, row_offset)
+        if filtered:
+            self._parse_rows(filtered, importers_to_manager)
+
+        return ChunkState(managers, importers_to_manager, row_numbers, len(rows), position, rows=filtered)
+
+    def _install_chunk(self, chunk: ChunkState):
+        """Make `chunk` the current chunk (i.e. the one the getters and `self.store_data` work on)
+        """
+        self.managers, self.importers_to_manager, self.row_numbers, self.chunk_rows = \
+            chunk.managers, chunk.importers_to_manager, chunk.row_numbers, chunk.rows or []
+
+    def _begin_import(self) -> int:
+        """Resume from the checkpoint (if any) and run any scans needed before rows are streamed
+
+        :return: the source position to start streaming from
+        """
+        self._notify('started')
+        self.chunk_started = time.monotonic()
+
+        state = None
+        if self.checkpoint is not None:
+            self.source_identity = self.source.identity
+            state = self.checkpoint.load()
+
+        position = 0
+        if state:
+            if state.get('source') is not None and state['source'] != self.source_identity:
+                raise RuntimeError(f'The checkpoint was saved by an import of {state["source"]}, not of '
+                                   f'{self.source_identity}: clear it to import this file from the start.')
+            self.row_offset, position = state['row'], state['offset']
+            self.position = position
+            self.deferred_rows = {row: fields for row, fields in state.get('deferred') or ()}
+
+        self.defer_references = self.chunk_size is not None and bool(self.file_reference_importers)
+
+        if self.duplicates is not None:
+            if (self.duplicates.requires_scan or self.row_offset) and not self.source.reiterable:
+                raise RuntimeError('Scanning for duplicate keys reads the rows before they\'re imported, which a '
+                                   'one-shot source (e.g. a generator) can\'t do: pass a list, or a re-iterable.')
+            if self.duplicates.requires_scan:
+                self._scan_duplicates()
+            elif self.row_offset:
+                #: Rows committed before the restart still count as the first of their keys
+                self._scan_duplicates(until_row=self.row_offset)
+
+        return position
+
+    def _notify(self, hook: str, *args):
+        for observer in self.observers:
+            getattr(observer, hook)(self, *args)
+
+    def _get_chunk_stats(self, n_rows: int, position: Optional[int], size: Optional[int]) -> ChunkStats:
+        """Counters for the current chunk, taken from the managers' bookkeeping (rather than counted per row)
+        """
+        error_rows = set()
+        for manager in self.managers:
+            error_rows.update(manager.errors.keys())
+
+        now = time.monotonic()
+        stats = ChunkStats(
+            rows_read=n_rows,
+            rows_skipped=n_rows - len(self.row_numbers),
+            rows_resolved=len(self.row_numbers) - len(self._get_failed_rows()),
+            rows_written=self.last_stored_objects,
+            errors=len(error_rows),
+            position=position,
+            size=size,
+            seconds=now - self.chunk_started if self.chunk_started is not None else 0.0,
+        )
+        self.chunk_started = now
+        return stats
+
+    def _commit_chunk(self, chunk: ChunkState):
+        """(Chunked imports) Store `self.new_objects` for the current chunk, and record the chunk as committed
+        """
+        if self.checkpoint is not None:
+            self.pending_checkpoint = {
+                'row': self.row_offset + chunk.n_rows, 'offset': chunk.position, 'source': self.source_identity,
+            }
+        try:
+            self.store_data()
+        finally:
+            pending_checkpoint, self.pending_checkpoint = self.pending_checkpoint, None
+
+        if not chunk.deferred:
+            self.row_offset += chunk.n_rows
+        self.position = chunk.position
+        if pending_checkpoint is not None and not self._is_checkpoint_transactional():
+            self._save_checkpoint(pending_checkpoint)
+
+        if self.observers:
+            self._notify('chunk_committed', self._get_chunk_stats(chunk.n_rows, chunk.position, self.source.size))
+
+    def _save_checkpoint(self, state: Dict[str,Any]):
+        #: Deferred rows are only imported at the end: a restart must still import them
+        self.checkpoint.save(**state, deferred=[[row, list(fields)] for row, fields in self.deferred_rows.items()])
+
+    def _is_checkpoint_transactional(self) -> bool:
+        return any(
+            self.checkpoint.is_transactional(using or DEFAULT_DB_ALIAS) for using in self._get_roots_write_using()
+        )
+
+    def _import_deferred_rows(self):
+        """Import `self.deferred_rows` as a last chunk: the rows they reference were written by later chunks (or are
+        deferred rows themselves).  References that still aren't found are reported in `self.errors`.
+        """
+        self.defer_references = False
+        if not self.deferred_rows:
+            return
+
+        row_numbers, rows = list(self.deferred_rows.keys()), list(self.deferred_rows.values())
+        managers, importers_to_manager = self._create_managers()
+        self._parse_rows(rows, importers_to_manager)
+        if self.fingerprints is not None:
+            #: (Staged again: the chunks the rows were read with committed without them)
+            for row, fields in zip(row_numbers, rows):
+                _, key_digest, row_digest = self.fingerprints.compare(self.get_root_key(fields), fields)
+                self.fingerprints.stage(row, key_digest, row_digest)
+
+        chunk = ChunkState(managers, importers_to_manager, row_numbers, len(rows), self.position, rows=rows,
+                           deferred=True)
+        self._install_chunk(chunk)
+        self._resolve_rows()
+        self.deferred_rows = {}
+        self._collect_errors()
+
+        self.new_objects = self.get_new_objects()
+        self._commit_chunk(chunk)
+
+    def _finish_import(self):
+        """The whole source has been imported: there is nothing left to resume
+        """
+        self._import_deferred_rows()
+        if self.checkpoint is not None:
+            self.checkpoint.clear()
+        self._notify('finished')
+
+    def import_data(self):
+        position = self._begin_import()
+
+        for rows, position in self._read_chunks(position):
+            chunk = self._prepare_chunk(rows, self.row_offset, position)
+            self._install_chunk(chunk)
+            if self.row_numbers:
+                self._resolve_rows()
+                self._collect_errors()
+
+            if self.chunk_size is not None:
+                self.new_objects = self.get_new_objects()
+                self._commit_chunk(chunk)
+
+        self._finish_import()
+
+    async def aimport_data(self):
+        """Async counterpart to `self.import_data`, for use from ASGI services without blocking the event loop.
 
-        #: TODO: Maybe combine loop 2 and 3 <-- there separation is maybe only useful for readability
-        # Loop 2: Get all the related data from for the leaf nodes of the dependency tree
-        for i,vertex in enumerate(self.sorted_vertices):
+        Lookups go through django's async queryset interface, and while chunk N is being resolved and written,
+        chunk N+1 is read, filtered and parsed in a worker thread, so parsing overlaps with database I/O.
 
-            if vertex.importer.dependent_imports is not None:
-                break;
+        Requires django 4.1+ (async queryset interface).
+        """
+        position = await sync_to_async(self._begin_import, thread_sensitive=False)()
+        chunks = self._read_chunks(position)
+
+        def prepare_next(row_offset: int) -> Optional[ChunkState]:
+            item = next(chunks, None)
+            if item is None:
+                return None
+            rows, position = item
+            return self._prepare_chunk(rows, row_offset, position)
+
+        pending = asyncio.ensure_future(sync_to_async(prepare_next, thread_sensitive=False)(self.row_offset))
+        try:
+            while True:
+                chunk = await pending
+                if chunk is None:
+                    break
+
+                #: Start on the next chunk before this one goes to the database
+                pending = asyncio.ensure_future(
+                    sync_to_async(prepare_next, thread_sensitive=False)(self.row_offset + chunk.n_rows)
+                )
+
+                self._install_chunk(chunk)
+                if self.row_numbers:
+                    await self._aresolve_rows()
+                    self._collect_errors()
+
+                if self.chunk_size is not None:
+                    self.new_objects = self.get_new_objects()
+                    await sync_to_async(self._commit_chunk)(chunk)
+        finally:
+            if not pending.done():
+                pending.cancel()
+
+        await sync_to_async(self._finish_import)()
+
+    def _get_levels(self) -> List[List[DotDict]]:
+        """Group the vertices below the root by their depth in the dependency graph: vertices of a level only depend
+        on vertices of earlier levels, so each level can be resolved as a unit.
+        """
+        depths = {}
+        for v in self.sorted_vertices:
+            depths[v.id] = 1 + max((depths[a.id] for a in v.Adj), default=-1)
+
+        levels = defaultdict(list)
+        for v in self.sorted_vertices:
+            if v.id not in self.root_ids:
+                levels[depths[v.id]].append(v)
+
+        return [levels[depth] for depth in sorted(levels.keys())]
+
+    def _resolve_level(self, level: List[DotDict], chunk: ChunkState) -> ChunkState:
+        if chunk.row_numbers:
+            for vertex in level:
+                self._resolve_vertex(vertex, chunk.importers_to_manager)
+        return chunk
+
+    def _get_resolve_stages(self, workers: int) -> List[Stage]:
+        """One stage per level of the dependency graph.  Levels with `auto_create` importers get a single worker:
+        chunks resolved at once would each miss (and create) the same keys.
+        """
+        stages = []
+        for depth, level in enumerate(self._get_levels()):
+            level_workers = 1 if any(v.importer.auto_create for v in level) else workers
+            stages.append(Stage(f'resolve-{depth}', partial(self._resolve_level, level), level_workers))
+        return stages
+
+    def _build_chunk(self, chunk: ChunkState) -> ChunkState:
+        if chunk.row_numbers:
+            root = self.root_vertices[0]
+            self._push_dependencies(root, chunk.importers_to_manager)
+            chunk.new_objects = self._get_root_objects(root, chunk.importers_to_manager[root.importer])
+        return chunk
+
+    def _store_chunk(self, chunk: ChunkState) -> ChunkState:
+        self._install_chunk(chunk)
+        if self.row_numbers:
+            self._collect_errors()
+
+        self.new_objects = chunk.new_objects
+        self._commit_chunk(chunk)
+        return chunk
+
+    def import_pipelined(self, workers: Union[int,Dict[str,int]] = 1, queue_size: int = 2):
+        """Chunked import, run as a pipeline of stages connected by bounded queues, so that parsing, the lookups
+        for each level of the dependency graph, object construction and writes all overlap (see `Pipeline`).
+
+        Chunks are parsed and stored one at a time and in order (so duplicate detection, fingerprints and
+        checkpoints behave as they do for `self.import_data`), while the lookup and build stages can run several
+        chunks at once.  Each worker thread uses its own database connection.  Levels with `auto_create` importers
+        are resolved by a single worker, so that chunks missing the same key don't each create it.
+
+        :param workers:     Threads per stage: either one number for the 'resolve' and 'build' stages, or a dict
+                            keyed by stage ('resolve', 'build')
+        :param queue_size:  Number of chunks queued in front of each stage
+        """
+        if self.chunk_size is None:
+            raise RuntimeError('Pipelined imports require a chunk_size.')
+
+        if isinstance(workers, int):
+            workers = {'resolve': workers, 'build': workers}
 
-            else:
-                self.importers_to_manager[
-                    vertex.importer
-                ].get_available_rows()
+        position = self._begin_import()
+        row_offset = [self.row_offset]
 
-        # Loop 3: Work your way up the dependency tree
-        for i,vertex in enumerate(self.sorted_vertices):
+        def parse(item: Tuple[List[Sequence],int]) -> ChunkState:
+            rows, position = item
+            chunk = self._prepare_chunk(rows, row_offset[0], position)
+            row_offset[0] += len(rows)
+            return chunk
 
-            if vertex.importer.dependent_imports is None:
+        stages = [Stage('parse', parse)]
+        stages.extend(self._get_resolve_stages(workers.get('resolve', 1)))
+        stages.append(Stage('build', self._build_chunk, workers.get('build', 1)))
+        stages.append(Stage('store', self._store_chunk, ordered=True))
+
+        Pipeline(stages, queue_size=queue_size, on_thread_exit=connections.close_all).run(
+            self._read_chunks(position)
+        )
+
+        self._finish_import()
+
+    def _import_file(self, source: Union[str,Source]) -> FileResult:
+        """Import one file of a batch, under its own savepoint
+        """
+        self._set_source(source)
+        self.row_offset = self.position = 0
+        self.row_numbers, self.errors, self.new_objects = [], {}, []
+
+        result = FileResult(self.source)
+        stored_objects, unchanged_rows = self.stored_objects, self.unchanged_rows
+        cache_savepoint = self.cache.savepoint()
+
+        try:
+            with transaction.atomic(using=self.write_using):
+                self.import_data()
+                if self.chunk_size is None:
+                    self.new_objects = self.get_new_objects()
+                    self.store_data()
+                    self.row_offset = len(self.row_numbers) + self.unchanged_rows - unchanged_rows
+        except Exception as e:
+            #: Objects auto-created (and cached) by the file were rolled back with it
+            self.cache.rollback(cache_savepoint)
+            result.exception = e
+            self.stored_objects = stored_objects
+        else:
+            result.created = self.stored_objects - stored_objects
+
+        result.rows = self.row_offset
+        result.unchanged = self.unchanged_rows - unchanged_rows
+        result.errors = self.errors
+        return result
+
+    def import_batch(self, sources: Iterable[Union[str,Source]], batch_rows: int = 10000) -> List[FileResult]:
+        """Import many (typically small) files with the same importers, reusing this importer's dependency graph,
+        and a `DependencyCache` shared by every file (so keys referenced by several files are looked up once).
+
+        Files are committed together, in transactions of at least `batch_rows` rows (rather than one commit per
+        file), but each file runs under its own savepoint: a file that raises is rolled back on its own, and its
+        `FileResult.exception` is set, while the other files of the transaction are still committed.  Observers are
+        notified of every file as its own import.
+
+        :param sources:     Paths to csv files, or `Source`s
+        :param batch_rows:  Rows of input after which the current transaction is committed
+        :return: one result per file, in order
+        """
+        #: (Fingerprints are committed to their own store, which a file's savepoint would not roll back)
+        if self.checkpoint is not None or self.duplicates is not None or self.fingerprints is not None:
+            raise RuntimeError('Checkpoints, fingerprints and duplicate detection apply to a single file, '
+                               'not to a batch.')
+
+        if self.cache is None:
+            self.cache = DependencyCache()
+
+        sources = iter(sources)
+        results = []
+        done = False
+        while not done:
+            rows = 0
+            with transaction.atomic(using=self.write_using):
+                while rows < batch_rows:
+                    source = next(sources, None)
+                    if source is None:
+                        done = True
+                        break
+
+                    result = self._import_file(source)
+                    results.append(result)
+                    rows += result.rows
+
+            self.cache.commit()
+
+        return results
+
+    def _get_columns(self, columns) -> Dict[int,Sequence]:
+        """Map the columns given to `self.import_columns` to their locations in `self.csv_import_format`
+        """
+        if hasattr(columns, 'columns') and not isinstance(columns, Mapping):
+            columns = {name: columns[name] for name in columns.columns}  #: pandas DataFrame
+
+        field_locations = defaultdict(list)
+        for location,field in self.location_to_csv_field.items():
+            field_locations[field].append(location)
+
+        located = {}
+        for key,values in columns.items():
+            if isinstance(key, int):
+                located[key] = columnar.as_sequence(values)
                 continue
 
-            for fname, _importer in vertex.importer.dependent_imports.items():
+            if len(field_locations[key]) != 1:
+                raise ValueError(f'Column {key} is ambiguous or unknown; key columns by location instead '
+                                 f'(import format: {self.csv_import_format})')
+            located[field_locations[key][0]] = columnar.as_sequence(values)
+
+        missing = set(self.location_to_csv_field.keys()) - set(located.keys())
+        if missing:
+            raise ValueError(f'Missing columns for locations {sorted(missing)} of the import format '
+                             f'{self.csv_import_format}')
+
+        return located
+
+    def import_columns(self, columns):
+        """Import from columns of data (e.g. a pandas DataFrame, or a dict of lists/numpy/arrow arrays) instead of
+        rows.  Each column is typed as a whole where it can be (see `ImporterManager.load_column`), and its distinct
+        values are handed to the managers' batch lookups.
+
+        Duplicate detection, fingerprints and checkpoints only apply to `self.import_data`; chunking behaves the same.
+
+        :param columns: Maps either locations or (unambiguous) field names of `self.csv_import_format` to columns
+        """
+        columns = self._get_columns(columns)
+        n_rows = len(next(iter(columns.values())))
+
+        self._notify('started')
+        self.chunk_started = time.monotonic()
 
+        for start in range(0, n_rows, self.chunk_size or max(n_rows, 1)):
+            stop = min(start + (self.chunk_size or n_rows), n_rows)
+
+            self._reset_managers()
+            self.row_numbers = list(range(self.row_offset, self.row_offset + stop - start))
+
+            for location,values in columns.items():
+                _field = self.location_to_csv_field[location]
+                _importer = self.location_to_importer[location]
                 _manager = self.importers_to_manager[_importer]
 
-                for row in range(_manager.get_latest_row() + 1): #range is exclusive of upper bound
-                    #: Get objects, or log an error (TODO - check for errors as below - maybe put the task in a function)
-                    objects = self.importers_to_manager[_importer].get_objs(row=row)
-                    if len(objects)>1:
-                        self.importers_to_manager[vertex.importer].update_kvs(
-                            field_name=fname, value=objects, row=row
-                        )
+                if self.importers_to_verticies[_importer].is_m2m:
+                    #: (Each value is converted by `ImporterManager.update_kvs`)
+                    _manager.update_kvs_column(_field, [
+                        v if isinstance(v, list) else str(v).split(M2M_DELIMITER) for v in values[start:stop]
+                    ])
+                    continue
+
+                _manager.load_column(_field, values[start:stop])
+
+            self._resolve_rows()
+            self._collect_errors()
+
+            if self.chunk_size is not None:
+                self.new_objects = self.get_new_objects()
+                self.store_data()
+                self.row_offset += stop - start
+
+                #: Positions count rows here
+                if self.observers:
+                    self._notify('chunk_committed', self._get_chunk_stats(stop - start, stop, n_rows))
+
+        self._notify('finished')
+
+    def _write(self, func, using: List[Optional[str]] = None):
+        """Run `func` in a transaction, retrying it on deadlocks/lock timeouts if the import is concurrent
+
+        :param using: The aliases `func` writes to, each of which gets a transaction (defaults to `self.write_using`)
+        """
+        if using is None:
+            using = [self.write_using]
+
+        def atomic_func():
+            with ExitStack() as stack:
+                for alias in using:
+                    stack.enter_context(transaction.atomic(using=alias))
+                return func()
+
+        if not self.concurrent:
+            return atomic_func()
+
+        return helpers.retry_on_lock(atomic_func, retries=self.max_retries, backoff=self.retry_backoff, using=using)
+
+    def _get_roots_write_using(self) -> List[Optional[str]]:
+        """The (distinct) aliases the roots are written to: `self.write_using`, unless their importers override it
+        """
+        return list(dict.fromkeys(
+            vertex.importer.write_using if vertex.importer.write_using is not None else self.write_using
+            for vertex in self.root_vertices
+        ))
+
+    def bulk_load(self, settings: Dict[str,Union[str,int]] = None, defer_indexes: bool = False) -> BulkLoad:
+        """A context manager tuning the write database's sessions for a large import (see `bulk_load.BulkLoad`):
+
+            with importer.bulk_load(defer_indexes=True):
+                importer.import_data()
+
+        :param settings:        Overrides of the backend's bulk-load settings (e.g. {'synchronous': 'OFF'} on SQLite)
+        :param defer_indexes:   Drop the secondary indexes of the roots' tables, and re-create them at the end
+        """
+        return BulkLoad(models=[vertex.importer.model for vertex in self.root_vertices], using=self.write_using,
+                        settings=settings, defer_indexes=defer_indexes)
+
+    def _get_failed_rows(self) -> Set[int]:
+        """Rows (of the current managers) for which at least one root could not create its object
+        """
+        failed = set()
+        for vertex in self.root_vertices:
+            failed.update(self.importers_to_manager[vertex.importer].errors.keys())
+        if self.deferred_rows:
+            failed.update(row for row, file_row in enumerate(self.row_numbers) if file_row in self.deferred_rows)
+        return failed
+
+    def _get_root_objects(self, vertex: DotDict, manager: ImporterManager) -> List[Union[models.Model,Dict]]:
+        """The new objects of a root: model instances, or only their key/values for roots with `raw_insert`
+        """
+        if vertex.importer.raw_insert:
+            return manager.get_kvs_from_rows(ordered=self.concurrent)
+        return manager.get_objects_from_rows(ordered=self.concurrent)
+
+    def _insert(self, vertex: DotDict, manager: ImporterManager,
+                objects: List[Union[models.Model,Dict]]) -> List[models.Model]:
+        """Write the new objects of a root (see `self._get_root_objects`)
+
+        :return: the created objects (for roots with `raw_insert`, unsaved instances holding only the primary key,
+                 or None where the backend doesn't return primary keys)
+        """
+        if manager.file_references:
+            created = self._insert_in_waves(vertex, manager, objects)
+        else:
+            created = self._insert_objects(vertex, manager, objects)
+
+        self.last_created.append((vertex.importer, manager, created))
+        return created
+
+    def _insert_objects(self, vertex: DotDict, manager: ImporterManager,
+                        objects: List[Union[models.Model,Dict]]) -> List[models.Model]:
+        model = vertex.importer.model
+        if not vertex.importer.raw_insert:
+            return model.objects.using(manager.write_using).bulk_create(objects, batch_size=self.batch_size)
+
+        key = (vertex.importer, manager.write_using)
+        if key not in self.inserters:
+            self.inserters[key] = RawInserter(model, using=manager.write_using)
+        pks = self.inserters[key].insert(objects, batch_size=self.batch_size)
+        return [model(pk=pk) if pk is not None else None for pk in pks]
+
+    def _insert_in_waves(self, vertex: DotDict, manager: ImporterManager,
+                         objects: List[Union[models.Model,Dict]]) -> List[models.Model]:
+        """Write objects referencing other objects of the same file (see `ModelImporter.file_references`): each wave
+        is a single bulk insert of the objects whose references have all been written by the previous waves (so a
+        hierarchy takes one insert per level, rather than one per row).
+
+        Rows referencing keys that are neither in the database nor in the chunk (or rows of a cycle) are left out:
+        they're deferred to the end of chunked imports (see `self.deferred_rows`), and recorded in `manager.errors`
+        otherwise.  `manager.object_rows` is updated to match the returned objects.
+        """
+        importer = vertex.importer
+        key_fields = {
+            fname: importer.dependent_imports[fname].required_fields for fname in importer.file_references
+        }
+
+        #: Position (in `objects`) of the first row defining each key
+        positions: Dict[Tuple[str,tuple],int] = {}
+        for i,row in enumerate(manager.object_rows):
+            for fname, fields in key_fields.items():
+                positions.setdefault((fname, tuple(manager.kvs[row][0].get(f) for f in fields)), i)
+
+        #: The positions referenced by each object (that are still to be written)
+        references: Dict[int,Dict[str,int]] = defaultdict(dict)
+        failed = set()
+        for i,row in enumerate(manager.object_rows):
+            for fname, key in manager.file_references.get(row, {}).items():
+                if (fname, key) not in positions:
+                    if self.defer_references:
+                        self.deferred_rows[self.row_numbers[row]] = self.chunk_rows[row]
                     else:
-                        self.importers_to_manager[vertex.importer].update_kvs(
-                            field_name=fname, value=objects[0], row=row
-                        )
+                        manager.errors.setdefault(row, {})[fname] = \
+                            f'{importer.model.__name__} not found in the database or the file for this row.'
+                    failed.add(i)
+                else:
+                    references[i][fname] = positions[(fname, key)]
+
+        created: Dict[int,models.Model] = {}
+        pending = [i for i in range(len(objects)) if i not in failed]
+        while pending:
+            wave = [i for i in pending if all(j in created for j in references[i].values())]
+            if not wave:
+                #: Every remaining row references itself, a cycle, or a row that could not be written
+                for i in pending:
+                    row = manager.object_rows[i]
+                    if self.defer_references and any(j in failed for j in self._get_referenced(references, i)):
+                        #: (Waits on a deferred row)
+                        self.deferred_rows[self.row_numbers[row]] = self.chunk_rows[row]
+                        continue
+                    manager.errors.setdefault(row, {})[next(iter(references[i]))] = \
+                        f'{importer.model.__name__} references of this row could not be resolved within the file.'
+                break
+
+            for i in wave:
+                for fname, j in references[i].items():
+                    if isinstance(objects[i], dict):
+                        objects[i][fname] = created[j]
+                    else:
+                        setattr(objects[i], fname, created[j])
+
+            wave_objects = self._insert_objects(vertex, manager, [objects[i] for i in wave])
+            if any(obj is None or obj.pk is None for obj in wave_objects):
+                #: The backend doesn't return primary keys from bulk inserts
+                wave_objects = self._get_written_objects(vertex, manager, wave)
+            created.update(zip(wave, wave_objects))
+
+            written = set(wave)
+            pending = [i for i in pending if i not in written]
+
+        manager.object_rows = [manager.object_rows[i] for i in sorted(created)]
+        return [created[i] for i in sorted(created)]
+
+    @staticmethod
+    def _get_referenced(references: Dict[int,Dict[str,int]], i: int) -> Set[int]:
+        """Positions `i` references, directly or through the rows it references
+        """
+        referenced = set()
+        stack = list(references[i].values())
+        while stack:
+            j = stack.pop()
+            if j not in referenced:
+                referenced.add(j)
+                stack.extend(references[j].values())
+        return referenced
+
+    def _get_written_objects(self, vertex: DotDict, manager: ImporterManager, wave: List[int]) -> List[models.Model]:
+        """Retrieve the objects just written for `wave` (positions in `manager.object_rows`) by their keys
+        """
+        fields = vertex.importer.required_fields
+        keys = [tuple(manager.kvs[manager.object_rows[i]][0].get(f) for f in fields) for i in wave]
+
+        query = models.Q()
+        for key in keys:
+            query |= models.Q(**dict(zip(fields, key)))
+        objects = {
+            tuple(getattr(obj, f) for f in fields): obj
+            for obj in vertex.importer.model.objects.using(manager.write_using).filter(query)
+        }
+        return [objects.get(key) for key in keys]
+
+    def _create_roots(self) -> int:
+        """Write `self.new_objects`, then build and write the objects of every further root, feeding each one the
+        objects created by the roots it depends on.
+
+        :return: the number of objects written
+        """
+        stored = 0
+        objects = self.new_objects
+        #: (A retried write starts over)
+        self.last_created = []
+        for i,vertex in enumerate(self.root_vertices):
+            manager = self.importers_to_manager[vertex.importer]
+            if i:
+                if not self.row_numbers:
+                    break
+                self._push_dependencies(vertex, self.importers_to_manager)
+                objects = self._get_root_objects(vertex, manager)
+
+            objects = self._insert(vertex, manager, objects)
+            stored += len(objects)
+
+            if i < len(self.root_vertices) - 1:
+                manager.set_created_objects(objects)
+
+        return stored
+
+    def _store_roots(self) -> int:
+        """Write every root, and the chunk's checkpoint if it can be written in the same transaction
+
+        :return: the number of objects written
+        """
+        if len(self.root_vertices) == 1:
+            #: (A retried write starts over)
+            self.last_created = []
+            root = self.root_vertices[0]
+            stored = len(self._insert(root, self.importers_to_manager[root.importer], self.new_objects))
+        else:
+            stored = self._create_roots()
 
-            #: Now that your dependencies should be satisfied, get data from disk to enable the next row
-            if not self.importers_to_manager[ vertex.importer ].create:
-                self.importers_to_manager[ vertex.importer ].get_available_rows()
+        if self.pending_checkpoint is not None and self._is_checkpoint_transactional():
+            self._save_checkpoint(self.pending_checkpoint)
+        return stored
 
     def store_data(self):
-        self.create_model.objects.bulk_create(self.new_objects)
+        """Create `self.new_objects` (and the objects of any further roots) in a single transaction
+        """
+        self.last_stored_objects = self._write(self._store_roots, using=self._get_roots_write_using())
+
+        #: Rows whose dependency on an earlier root (or on another row of the file) failed are only known once
+        #: the roots are written
+        if self.row_numbers:
+            self._collect_errors()
+        self.stored_objects += self.last_stored_objects
+        self._send_chunk_imported()
+
+        if self.fingerprints is not None:
+            #: Rows that weren't created are left out, so they are retried by the next run.  The fingerprints are
+            #: written once the chunk's transaction commits (so rows rolled back with an outer transaction aren't
+            #: skipped by the next run): see `FingerprintStore`
+            failed = self._get_failed_rows()
+            rows = [file_row for row,file_row in enumerate(self.row_numbers) if row not in failed]
+            transaction.on_commit(partial(self.fingerprints.commit, rows), using=self._get_roots_write_using()[0])
+
+    def _send_chunk_imported(self):
+        """Send `signals.chunk_imported` for every root written by the last `self.store_data`, once the transaction
+        it was written in commits (i.e. right away, unless the import runs within an outer transaction)
+        """
+        for importer, manager, objects in self.last_created:
+            model = importer.model
+            if not objects or not signals.chunk_imported.has_listeners(model):
+                continue
+
+            pks = [obj.pk if obj is not None else None for obj in objects]
+            rows = None
+            if self.row_numbers and len(manager.object_rows) == len(objects):
+                rows = [self.row_numbers[row] for row in manager.object_rows]
+
+            transaction.on_commit(partial(
+                signals.chunk_imported.send, sender=model, importer=self, pks=pks, rows=rows,
+                using=manager.write_using or router.db_for_write(model)
+            ), using=manager.write_using)
+
+    async def astore_data(self):
+        """Async counterpart to `self.store_data`
+        """
+        await sync_to_async(self.store_data)()
+
+    def get_new_objects(self) -> List[Union[models.Model,Dict]]:
+        """The objects of the first root (only their key/values if it has `raw_insert`)
+        """
+        if not self.row_numbers:
+            return []
 
-    def get_new_objects(self):
-        self.importers_to_manager[ self.sorted_vertices[-1].importer ].get_objects_from_rows()
\ No newline at end of file
+        root = self.root_vertices[0]
+        return self._get_root_objects(root, self.importers_to_manager[root.importer])
@@ -0,0 +1,166 @@
+"""Adaptive chunk sizes for chunked imports (see `AdaptiveChunkSize`).
+
+The best chunk size depends on the tables, the backend and the machine: larger chunks amortize the per-chunk
+lookups and INSERTs over more rows, until the `__in` lookups, the transactions and the memory held by the managers
+grow large enough to slow everything down again.  Rather than a fixed number, an `AdaptiveChunkSize` observer
+measures the throughput of every chunk and searches for the best size as the import runs.
+
+Memory is read from /proc where it exists (i.e. on Linux), and otherwise through psutil, which is optional
+(`pip install django_simple_imports[tuning]`): without either, the memory budget is ignored.
+"""
+import math
+import os
+
+from typing import *
+
+from .progress import ChunkStats, ImportObserver
+
+try:
+    import psutil
+except ImportError:  # pragma: no cover
+    psutil = None
+
+
+def get_rss() -> Optional[int]:
+    """The resident memory of this process in bytes (None if it can't be read)
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    return None
+
+
+class AdaptiveChunkSize(ImportObserver):
+    """Tunes `SystemImporter.chunk_size` between chunks, by hill climbing on throughput (rows read per second).
+
+    Starting from the importer's chunk size, the size is multiplied by `factor` for as long as throughput improves.
+    Once it doesn't, the search turns around from the best size so far with a smaller step (the square root of the
+    previous one), until the step falls below `min_factor`: the size is then fixed at the best one measured.
+
+    Sizes are always kept within [min_size, max_size].  Independently of the search:
+      * a chunk taking longer than `max_seconds` (e.g. holding locks for too long) halves the size, and
+      * resident memory above `memory_budget` halves the size,
+    and the size that broke the limit becomes the new `max_size` (for the rest of the import: every import, e.g.
+    every file of `SystemImporter.import_batch`, starts from the original bounds).
+
+    Chunk sizes apply to the whole chunk, i.e. to the lookups of every manager as well as to the roots' inserts.
+    Chunks already read when the size changes (e.g. by `SystemImporter.import_pipelined`) aren't measured.
+    """
+
+    def __init__(self, min_size: int = 100, max_size: int = 100000, factor: float = 2.0, min_factor: float = 1.1,
+                 samples: int = 2, max_seconds: float = None, memory_budget: int = None):
+        """
+        :param min_size:        Smallest chunk size
+        :param max_size:        Largest chunk size
+        :param factor:          Initial step (chunk sizes are multiplied or divided by it)
+        :param min_factor:      Step below which the search stops
+        :param samples:         Chunks measured at each size (throughput is averaged over them)
+        :param max_seconds:     Longest a single chunk should take
+        :param memory_budget:   Most resident memory (in bytes) the process should use
+        """
+        if not 0 < min_size <= max_size:
+            raise ValueError('Chunk size bounds must satisfy 0 < min_size <= max_size.')
+        if factor <= min_factor or min_factor <= 1:
+            raise ValueError('The search needs factor > min_factor > 1.')
+
+        self.min_size = min_size
+        self.max_size = max_size
+        #: (`self.max_size` is lowered by broken limits, until the next import starts)
+        self.initial_max_size = max_size
+        self.initial_factor = factor
+        self.min_factor = min_factor
+        self.samples = samples
+        self.max_seconds = max_seconds
+        self.memory_budget = memory_budget
+
+        self.factor = factor
+        self.direction = 1
+        self.size: int = None
+        self.best: Optional[Tuple[int,float]] = None
+        self.converged = False
+
+        #: Throughput measured at the current size, not yet averaged
+        self.measurements: List[float] = []
+        #: (size, mean rows per second) of every size measured, in order
+        self.history: List[Tuple[int,float]] = []
+
+    def _clamp(self, size: float) -> int:
+        return max(self.min_size, min(self.max_size, int(round(size))))
+
+    def _set_size(self, importer, size: int):
+        self.size = size
+        self.measurements = []
+        importer.chunk_size = size
+
+    def started(self, importer):
+        if importer.chunk_size is None:
+            raise RuntimeError('Adaptive chunk sizes require a chunked import (a chunk_size to start from).')
+
+        self.max_size = self.initial_max_size
+        self.factor = self.initial_factor
+        self.direction = 1
+        self.best = None
+        self.converged = False
+        self.history = []
+        self._set_size(importer, self._clamp(importer.chunk_size))
+
+    def _shrink(self, importer):
+        """A limit was broken at the current size: halve it, and never go back above it
+        """
+        self.max_size = max(self.min_size, self.size - 1)
+        if self.best is not None and self.best[0] > self.max_size:
+            self.best = None
+        self._set_size(importer, self._clamp(self.size / 2))
+
+    def _get_next_size(self, rows_per_second: float) -> Optional[int]:
+        """The size to measure next (None once the search is over)
+        """
+        if self.best is None or rows_per_second > self.best[1]:
+            self.best = (self.size, rows_per_second)
+        else:
+            #: Past the peak: search the other side of the best size, with a finer step
+            self.direction = -self.direction
+            self.factor = math.sqrt(self.factor)
+
+        while self.factor >= self.min_factor:
+            size = self._clamp(self.best[0] * self.factor ** self.direction)
+            if size != self.best[0] and size != self.size:
+                return size
+            #: (At a bound, or the step rounds to nothing)
+            self.direction = -self.direction
+            self.factor = math.sqrt(self.factor)
+
+        return None
+
+    def chunk_committed(self, importer, stats: ChunkStats):
+        if self.size is None:
+            return
+
+        rss = get_rss() if self.memory_budget is not None else None
+        if (rss is not None and rss > self.memory_budget) or \
+                (self.max_seconds is not None and stats.seconds > self.max_seconds):
+            if self.size > self.min_size:
+                self._shrink(importer)
+            return
+
+        #: Partial (last) chunks, and chunks read before the last change, say nothing about the current size
+        if self.converged or stats.rows_read != self.size or not stats.seconds:
+            return
+
+        self.measurements.append(stats.rows_read / stats.seconds)
+        if len(self.measurements) < self.samples:
+            return
+
+        rows_per_second = sum(self.measurements) / len(self.measurements)
+        self.history.append((self.size, rows_per_second))
+
+        size = self._get_next_size(rows_per_second)
+        if size is None:
+            self.converged = True
+            size = self.best[0]
+        self._set_size(importer, size)
@@ -0,0 +1,86 @@
+import os
+import tempfile
+from typing import *
+
+from django.db import connection, transaction
+from django.test import TransactionTestCase
+
+from .factory import create_multiple_users
+
+from ..simple_imports.system_importer import SystemImporter
+
+from ..tests_app.models import Tag
+from ..tests_app.importers import CompanyImporter,UserImporter,UserProfileImporter,RankedTagImporter
+
+
+class TestBulkLoad(TransactionTestCase):
+
+    def setUp(self):
+        self.n_objs = 2
+        self.usernames, self.users, self.user_profiles, self.company = create_multiple_users(self.n_objs)
+
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.csvpath = os.path.join(self.tmpdir.name, 'tags.csv')
+        with open(self.csvpath, 'w') as f:
+            for i in range(5):
+                f.write(f'{self.company.natural_id},{self.usernames[i % self.n_objs]},slug{i},{i}\n')
+
+        self.importer = SystemImporter(
+            [CompanyImporter, UserImporter, UserProfileImporter, RankedTagImporter], self.csvpath, chunk_size=2
+        )
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def pragma(self, name: str):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def tag_indexes(self) -> Set[str]:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = %s", [Tag._meta.db_table]
+            )
+            return {name for name, in cursor.fetchall()}
+
+    def test_settings_are_restored(self):
+        synchronous = self.pragma('synchronous')
+
+        with self.importer.bulk_load(settings={'synchronous': 'OFF'}):
+            self.assertEqual(self.pragma('synchronous'), 0)
+
+        self.assertEqual(self.pragma('synchronous'), synchronous)
+
+    def test_import_with_deferred_indexes(self):
+        indexes = self.tag_indexes()
+        self.assertTrue(indexes)
+
+        with self.importer.bulk_load(defer_indexes=True) as bulk_load:
+            self.assertEqual(self.tag_indexes(), set())
+            self.assertEqual(len(bulk_load.dropped_indexes), len(indexes))
+            self.importer.import_data()
+
+        self.assertEqual(self.tag_indexes(), indexes)
+        self.assertEqual(bulk_load.dropped_indexes, [])
+        self.assertEqual(Tag.objects.count(), 5)
+
+    def test_indexes_are_rebuilt_on_error(self):
+        indexes = self.tag_indexes()
+
+        with self.assertRaises(ValueError):
+            with self.importer.bulk_load(defer_indexes=True):
+                raise ValueError()
+
+        self.assertEqual(self.tag_indexes(), indexes)
+
+    def test_invalid_pragma(self):
+        with self.assertRaises(ValueError):
+            with self.importer.bulk_load(settings={'synchronous': 'OFF; DROP TABLE x'}):
+                pass
+
+    def test_not_within_transaction(self):
+        with transaction.atomic():
+            with self.assertRaises(RuntimeError):
+                with self.importer.bulk_load():
+                    pass
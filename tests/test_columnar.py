@@ -0,0 +1,102 @@
+from datetime import date
+from decimal import Decimal
+from unittest import skipIf
+
+from django.test import TestCase
+
+from .factory import create_multiple_users
+
+from ..simple_imports import columnar
+from ..simple_imports.system_importer import SystemImporter
+from ..simple_imports.sources import IterableSource
+
+from ..tests_app.models import Tag
+from ..tests_app.importers import CompanyImporter,UserImporter,UserProfileImporter,RankedTagImporter
+
+
+class TestColumnar(TestCase):
+
+    def setUp(self):
+        self.usernames, _, _, self.company = create_multiple_users(3)
+        self.importers = [CompanyImporter, UserImporter, UserProfileImporter, RankedTagImporter]
+
+    def test_type_column(self):
+        self.assertEqual(columnar.type_column(date, ['2018-03-01', '2018-03-02']),
+                         [date(2018, 3, 1), date(2018, 3, 2)])
+        self.assertEqual(columnar.type_column(Decimal, ['1.10', 2.5]), [Decimal('1.10'), Decimal('2.5')])
+        self.assertEqual(columnar.type_column(int, ['1', '2']), [1, 2])
+        self.assertEqual(columnar.unique(['a', 'b', 'a']), ['a', 'b'])
+
+        self.assertEqual(columnar.type_column(bool, ['yes', 'No', True]), [True, False, True])
+        self.assertEqual(columnar.type_column(str, ['a', 1]), ['a', '1'])
+
+        for values in ([1.0, float('nan')], [1.0, 1.7], ['1', '']):
+            with self.assertRaises(ValueError):
+                columnar.type_column(int, values)
+
+    def test_type_column_with_missing_values(self):
+        for datatype in (str, float, Decimal, bool):
+            for missing in (None, float('nan')):
+                with self.subTest(datatype=datatype, missing=missing), self.assertRaises(ValueError):
+                    columnar.type_column(datatype, ['1', missing])
+
+    def get_columns(self, n: int):
+        return {
+            'natural_id': [self.company.natural_id] * n,
+            'username': [self.usernames[i % 3] for i in range(n)],
+            'slug': [f'slug{i}' for i in range(n)],
+            'rank': [str(i) for i in range(n)],
+        }
+
+    def test_import_columns(self):
+        #: A SystemImporter still needs a source; it's just not read by import_columns
+        importer = SystemImporter(self.importers, IterableSource([]), chunk_size=4)
+        importer.import_columns(self.get_columns(10))
+
+        self.assertEqual(sorted(Tag.objects.values_list('rank', flat=True)), list(range(10)))
+        self.assertEqual(Tag.objects.get(slug='slug4').created_by.user.username, self.usernames[1])
+
+    def test_import_columns_by_location(self):
+        columns = self.get_columns(3)
+        importer = SystemImporter(self.importers, IterableSource([]))
+        importer.import_columns(dict(enumerate(columns.values())))
+        importer.new_objects = importer.get_new_objects()
+        importer.store_data()
+
+        self.assertEqual(Tag.objects.count(), 3)
+
+        with self.assertRaises(ValueError):
+            importer.import_columns({'slug': columns['slug']})
+
+    @skipIf(columnar.pd is None, 'pandas is not installed')
+    def test_import_dataframe(self):
+        frame = columnar.pd.DataFrame(self.get_columns(5))
+        frame['rank'] = frame['rank'].astype(int)
+
+        SystemImporter(self.importers, IterableSource([]), chunk_size=2).import_columns(frame)
+
+        self.assertEqual(sorted(Tag.objects.values_list('rank', flat=True)), list(range(5)))
+
+    @skipIf(columnar.pd is None, 'pandas is not installed')
+    def test_invalid_values_are_row_errors(self):
+        frame = columnar.pd.DataFrame(self.get_columns(4))
+        frame['rank'] = [0, None, 1.7, 3]
+
+        importer = SystemImporter(self.importers, IterableSource([]), chunk_size=4)
+        importer.import_columns(frame)
+
+        self.assertEqual(sorted(Tag.objects.values_list('rank', flat=True)), [0, 3])
+        self.assertEqual(sorted(importer.errors), [1, 2])
+        self.assertIn('rank', importer.errors[2])
+
+    @skipIf(columnar.pd is None, 'pandas is not installed')
+    def test_missing_values_are_row_errors(self):
+        frame = columnar.pd.DataFrame(self.get_columns(4))
+        frame['slug'] = ['slug0', None, float('nan'), 'slug3']
+
+        importer = SystemImporter(self.importers, IterableSource([]), chunk_size=4)
+        importer.import_columns(frame)
+
+        self.assertEqual(sorted(Tag.objects.values_list('slug', flat=True)), ['slug0', 'slug3'])
+        self.assertEqual(sorted(importer.errors), [1, 2])
+        self.assertIn('slug', importer.errors[1])
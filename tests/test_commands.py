@@ -0,0 +1,67 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from .factory import create_multiple_users
+
+from ..tests_app.models import Tag
+
+IMPORTERS = 'django_simple_imports.tests_app.importers.RANKED_TAG_IMPORTERS'
+
+
+class TestSimpleImportCommand(TestCase):
+
+    def setUp(self):
+        self.usernames, _, _, self.company = create_multiple_users(2)
+
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.csvpath = os.path.join(self.tmpdir.name, 'tags.csv')
+        with open(self.csvpath, 'w') as f:
+            f.write('natural_id,username,slug,rank\n')
+            for i in range(7):
+                f.write(f'{self.company.natural_id},{self.usernames[i % 2]},slug{i},{i}\n')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def call(self, *args) -> dict:
+        stdout, stderr = StringIO(), StringIO()
+        call_command('simple_import', IMPORTERS, self.csvpath, '--header', *args, stdout=stdout, stderr=stderr)
+        self.progress = stderr.getvalue()
+        return json.loads(stdout.getvalue())
+
+    def test_import(self):
+        summary = self.call('--chunk-size', '3', '--batch-size', '2')
+
+        self.assertEqual(Tag.objects.count(), 7)
+        self.assertEqual(summary['rows'], 7)
+        self.assertEqual(summary['created'], 7)
+        self.assertEqual(summary['errors'], 0)
+        self.assertEqual(len(self.progress.strip().splitlines()), 3)
+        self.assertIn('rows/s', self.progress)
+
+    def test_dry_run(self):
+        summary = self.call('--dry-run')
+
+        self.assertEqual(summary['created'], 7)
+        self.assertTrue(summary['dry_run'])
+        self.assertEqual(Tag.objects.count(), 0)
+
+    def test_check_indexes(self):
+        self.call('--check-indexes')
+
+        self.assertIn('CompanyImporter looks Company up by natural_id', self.progress)
+
+    def test_adaptive(self):
+        summary = self.call('--chunk-size', '2', '--adaptive', '--memory-budget', '100000')
+
+        self.assertEqual(summary['created'], 7)
+
+    def test_dry_run_with_workers(self):
+        with self.assertRaises(CommandError):
+            self.call('--dry-run', '--workers', '2')
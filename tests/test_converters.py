@@ -0,0 +1,64 @@
+from datetime import date,datetime
+from decimal import Decimal
+
+from django.db import models
+from django.test import TestCase
+
+from ..simple_imports import converters
+from ..simple_imports.importer_manager import ImporterManager
+from ..simple_imports.model_importer import ModelImporter
+
+from ..tests_app.models import UserProfile
+from ..tests_app.importers import RankedTagImporter
+
+
+class UserProfileTypeImporter(ModelImporter):
+    """No field_types: everything is derived from the model
+    """
+    model = UserProfile
+
+    required_fields = ('user_type',)
+
+
+class TestConverters(TestCase):
+
+    def test_field_converters(self):
+        self.assertEqual(converters.get_converter(models.IntegerField())('12'), 12)
+        self.assertEqual(converters.get_converter(models.DecimalField())(1.1), Decimal('1.1'))
+        self.assertEqual(converters.get_converter(models.DateField())('2020-02-29'), date(2020, 2, 29))
+        self.assertEqual(converters.get_converter(models.DateField())('Feb 29 2020'), date(2020, 2, 29))
+        self.assertEqual(converters.get_converter(models.DateTimeField())('2020-02-29T10:30:00'),
+                         datetime(2020, 2, 29, 10, 30))
+        self.assertEqual(converters.get_converter(models.BooleanField())('Yes'), True)
+        self.assertIsNone(converters.get_converter(models.IntegerField(null=True))(''))
+
+        with self.assertRaises(ValueError):
+            converters.get_converter(models.BooleanField())('maybe')
+
+    def test_derived_converters(self):
+        self.assertEqual(UserProfileTypeImporter.get_field_type('user_type'), str)
+        self.assertEqual(UserProfileTypeImporter.get_field_type('company'), models.Model)
+
+        convert = UserProfileTypeImporter.get_converter('user_type')
+        self.assertEqual(convert(UserProfile.USER_TYPE_BOSS), UserProfile.USER_TYPE_BOSS)
+        #: Labels map to their values
+        self.assertEqual(convert('Worker'), UserProfile.USER_TYPE_WORKER)
+        with self.assertRaises(ValueError):
+            convert('Intern')
+
+        #: Declared types matching the field's keep the derived (fast) converter
+        self.assertIs(RankedTagImporter.get_converter('rank'), RankedTagImporter._converters['rank'])
+        self.assertEqual(RankedTagImporter.get_converter('rank')('3'), 3)
+
+        with self.assertRaises(KeyError):
+            UserProfileTypeImporter.get_converter('nonexistent')
+
+    def test_invalid_values_are_row_errors(self):
+        manager = ImporterManager(importer=UserProfileTypeImporter())
+        manager.update_kvs('user_type', 'Boss', row=0)
+        manager.update_kvs('user_type', 'Intern', row=1)
+
+        self.assertEqual(manager.kvs[0][0]['user_type'], UserProfile.USER_TYPE_BOSS)
+        self.assertIsNone(manager.kvs[1][0]['user_type'])
+        self.assertIn('user_type', manager.errors[1])
+        self.assertNotIn(0, manager.errors)
@@ -0,0 +1,80 @@
+import io
+import os
+import tempfile
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from .factory import create_multiple_users, create_tags_images
+
+from ..simple_imports.exporter import SystemExporter
+from ..simple_imports.sources import CsvSource
+from ..simple_imports.system_importer import SystemImporter
+
+from ..tests_app.models import Tag
+from ..tests_app.importers import RANKED_TAG_IMPORTERS, CompanyImporter, UserImporter, UserProfileImporter
+from ..tests_app.importers import TagImporter, ImageImporter
+
+
+class TestSystemExporter(TestCase):
+
+    def setUp(self):
+        self.n_objs = 4
+        self.usernames, self.users, self.user_profiles, self.company = create_multiple_users(self.n_objs)
+
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.csvpath = os.path.join(self.tmpdir.name, 'tags.csv')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_round_trip(self):
+        rows = [f'{self.company.natural_id},{self.usernames[i % self.n_objs]},slug{i},{i}' for i in range(7)]
+        with open(self.csvpath, 'w') as f:
+            f.write('\n'.join(rows) + '\n')
+        SystemImporter(RANKED_TAG_IMPORTERS, self.csvpath, chunk_size=3).import_data()
+
+        exporter = SystemExporter(RANKED_TAG_IMPORTERS, chunk_size=3)
+        output = io.StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(exporter.export(output), 7)
+
+        #: A single (joined) query, however many columns come from related objects
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(output.getvalue().splitlines(), rows)
+
+        exported = os.path.join(self.tmpdir.name, 'exported.csv')
+        exporter.export(exported, header=True)
+        Tag.objects.all().delete()
+
+        SystemImporter(RANKED_TAG_IMPORTERS, CsvSource(exported, header=True), chunk_size=3).import_data()
+        self.assertEqual(
+            sorted(Tag.objects.values_list('slug', 'rank', 'created_by__user__username')),
+            sorted((f'slug{i}', i, self.usernames[i % self.n_objs]) for i in range(7))
+        )
+
+    def test_many_to_many_columns(self):
+        images, tags = create_tags_images(self.user_profiles[0], self.company)
+
+        importers = [CompanyImporter, UserImporter, UserProfileImporter, TagImporter, ImageImporter]
+        exporter = SystemExporter(importers)
+        self.assertEqual(exporter.csv_import_format, 'natural_id,username,slug,path,name,')
+
+        with CaptureQueriesContext(connection) as queries:
+            rows = list(exporter.rows())
+
+        #: The images (joined with their company), then their tags, and the tags' creators
+        self.assertEqual(len(queries), 4)
+        grass, sun = rows[0], rows[1]
+        self.assertEqual(grass, [self.company.natural_id, self.usernames[0], 'blue;green', 'to/the/pic', 'grass'])
+        self.assertEqual(sun[2], 'yellow')
+
+    def test_unreachable_columns(self):
+        with self.assertRaises(ValueError):
+            SystemExporter(RANKED_TAG_IMPORTERS, root=UserProfileImporter)
+
+    def test_values_with_delimiters(self):
+        Tag.objects.create(company=self.company, created_by=self.user_profiles[0], slug='a,b', rank=0)
+        with self.assertRaises(ValueError):
+            list(SystemExporter(RANKED_TAG_IMPORTERS).rows())
@@ -1,13 +1,18 @@
 from typing import *
 
+from django.db import connection
+from django.db.models import Q
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from .factory import create_multiple_users, create_tags_images, create_base_models
 
 from ..simple_imports.importer_manager import ImporterManager,RecordData
+from ..simple_imports.cache import DependencyCache
 
 from django.contrib.auth.models import User
 from ..tests_app.models import UserProfile,Company,Image,Tag
 from ..tests_app.importers import UserImporter,UserProfileImporter,CompanyImporter,ImageImporter,TagImporter
+from ..tests_app.importers import AutoCompanyImporter,CaseInsensitiveUserImporter
 
 
 class TestImporterManager(TestCase):
@@ -89,6 +94,96 @@ class TestImporterManager(TestCase):
 
         del manager
 
+    def test_records_are_compact(self):
+        manager = ImporterManager(importer=UserImporter())
+        for row,name in enumerate(self.usernames):
+            manager.update_kvs(field_name='username',value=name,row=row)
+
+        manager.get_available_rows()
+        record = manager.get_objs_and_meta(1)[0]
+        self.assertFalse(hasattr(record, '__dict__'))
+        #: The query is derived from the kvs, rather than stored
+        self.assertEqual(record.query, Q(username=self.usernames[1]))
+        self.assertEqual(manager.get_object_or_list(1), self.users[1])
+
+    def test_create_missing_rows(self):
+        """Objects not found by an auto_create importer are created once per distinct key, and then available
+        """
+        manager = ImporterManager(importer=AutoCompanyImporter())
+        for row,natural_id in enumerate([self.company.natural_id, 'new1', 'new0', 'new1']):
+            manager.update_kvs(field_name='natural_id', value=natural_id, row=row)
+
+        manager.get_available_rows()
+        self.assertEqual(manager.get_objs_and_meta(1)[0].available, False)
+
+        created = manager.create_missing_rows()
+        self.assertEqual([c.natural_id for c in created], ['new0', 'new1'])
+
+        for row in range(4):
+            self.assertIsInstance(manager.get_object_or_list(row), Company)
+        self.assertEqual(manager.get_object_or_list(1), manager.get_object_or_list(3))
+        self.assertEqual(manager.get_object_or_list(0), self.company)
+        self.assertEqual(Company.objects.count(), 3)
+
+    def test_database_aliases(self):
+        """Lookups go to `using`, writes (and the lookups following them) to `write_using`
+        """
+        manager = ImporterManager(importer=AutoCompanyImporter(), using='replica', write_using='default')
+        manager.update_kvs(field_name='natural_id', value='new0', row=0)
+
+        #: Stand in for a lookup on the replica that found nothing
+        manager._prepare_records()
+        fields = manager._get_lookup_fields(manager.object_row_map)
+        self.assertEqual(manager._get_indexed_query(manager.object_row_map, fields).db, 'replica')
+
+        manager.create_missing_rows()
+        self.assertEqual(manager.using, 'default')
+        self.assertEqual(manager.get_object_or_list(0).natural_id, 'new0')
+
+    def test_normalized_keys(self):
+        """Case and whitespace differences still match, in a single (un-OR'd) query
+        """
+        manager = ImporterManager(importer=CaseInsensitiveUserImporter())
+        for row,name in enumerate(self.usernames):
+            manager.update_kvs('username', f' {name.lower()} ' if row % 2 else name.title(), row=row)
+        manager.update_kvs('username', 'nobody', row=len(self.usernames))
+
+        with CaptureQueriesContext(connection) as queries:
+            manager.get_available_rows()
+
+        self.assertEqual(len(queries), 1)
+        self.assertIn('LOWER', queries[0]['sql'].upper())
+        for row,name in enumerate(self.usernames):
+            self.assertEqual(manager.get_object_or_list(row).username, name)
+        self.assertFalse(manager.get_objs_and_meta(len(self.usernames))[0].available)
+
+        index, = CaseInsensitiveUserImporter.get_key_indexes()
+        self.assertEqual(len(index.expressions), 1)
+
+    def test_scope(self):
+        """Lookups (and cached objects) are confined to the scope; auto-created objects are created within it
+        """
+        other = Company.objects.create(natural_id='other')
+        other_blue = Tag.objects.create(company=other, created_by=self.user_profiles[0], slug='blue', rank=0)
+
+        cache = DependencyCache()
+        for company, tag in ((other, other_blue), (self.company, self.tags[0]), (other, other_blue)):
+            manager = ImporterManager(importer=TagImporter(), cache=cache, scope={'company_id': company.id})
+            manager.update_kvs(field_name='slug', value='blue', row=0)
+            manager.get_available_rows()
+            self.assertEqual(manager.get_object_or_list(0), tag)
+        self.assertEqual(cache.hits, 1)
+
+        #: (Companies have no company_id: that entry is ignored for them)
+        manager = ImporterManager(importer=AutoCompanyImporter(), scope={'name': 'Scoped', 'company_id': 1})
+        manager.update_kvs(field_name='natural_id', value=self.company.natural_id, row=0)
+        manager.get_available_rows()
+        self.assertFalse(manager.get_objs_and_meta(0)[0].available)
+
+        manager.create_missing_rows()
+        self.assertEqual(manager.get_object_or_list(0).name, 'Scoped')
+        self.assertEqual(manager.get_object_or_list(0).natural_id, self.company.natural_id)
+
     def test_dependent_object_import(self):
         """Ensures any object with an analagous dependency relationship to
                             UserProfile --> User  && UserProfile --> Company
@@ -0,0 +1,64 @@
+import warnings
+
+from django.test import TestCase
+
+from .factory import create_multiple_users
+
+from ..simple_imports import indexes
+from ..simple_imports.system_importer import SystemImporter
+
+from ..tests_app.importers import RANKED_TAG_IMPORTERS, CompanyImporter, UserImporter, UserProfileImporter
+from ..tests_app.importers import CaseInsensitiveUserImporter, TagImporter
+
+
+class TestIndexes(TestCase):
+
+    def setUp(self):
+        create_multiple_users(2)
+
+    def test_check_importer(self):
+        #: Company.natural_id has no index
+        report = indexes.check_importer(CompanyImporter)
+        self.assertTrue(report.scans)
+        self.assertEqual(report.columns, ['natural_id'])
+        self.assertIn('scan', report.message)
+
+        #: ... unless the lookups are scoped to an indexed column
+        self.assertFalse(indexes.check_importer(CompanyImporter, scope={'id': 1}).scans)
+
+        #: username is unique, and UserProfile's foreign keys are indexed
+        self.assertFalse(indexes.check_importer(UserImporter).scans)
+        self.assertFalse(indexes.check_importer(UserProfileImporter).scans)
+
+    def test_key_needs_its_own_index(self):
+        """Tag.slug has no index: the index of a foreign key only narrows the lookups down
+        """
+        report = indexes.check_importer(TagImporter)
+        self.assertTrue(report.scans)
+        self.assertEqual(report.key_columns, ['slug'])
+        self.assertIsNotNone(report.partial)
+        self.assertIn(report.partial, report.message)
+
+        #: ... as does a (non-unique) scope
+        self.assertTrue(indexes.check_importer(TagImporter, scope={'company_id': 1}).scans)
+
+    def test_normalized_keys_need_their_functional_index(self):
+        report = indexes.check_importer(CaseInsensitiveUserImporter)
+        self.assertTrue(report.scans)
+        self.assertEqual(report.columns, [])
+
+    def test_system_importer_check(self):
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            #: (The file is never read)
+            importer = SystemImporter(RANKED_TAG_IMPORTERS, __file__, check_indexes=True)
+
+        self.assertEqual([str(w.message) for w in caught if issubclass(w.category, indexes.ScanWarning)],
+                         [indexes.check_importer(CompanyImporter).message])
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            reports = importer.check_indexes(explain=True)
+        #: (The root, which only creates objects, isn't checked)
+        self.assertEqual([r.importer for r in reports], RANKED_TAG_IMPORTERS[:-1])
+        self.assertTrue(all(r.plan for r in reports))
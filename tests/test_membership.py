@@ -0,0 +1,95 @@
+import os
+import tempfile
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from .factory import create_multiple_users
+
+from ..simple_imports.importer_manager import ImporterManager
+from ..simple_imports.membership import BloomFilter, KeyFilter
+
+from ..tests_app.models import Company
+from ..tests_app.importers import AutoCompanyImporter, CaseInsensitiveUserImporter
+
+
+class TestBloomFilter(TestCase):
+
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add((f'key{i}', i))
+
+        for i in range(1000):
+            self.assertIn((f'key{i}', i), bloom)
+
+        false_positives = sum((f'other{i}', i) in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+class TestKeyFilter(TestCase):
+
+    def setUp(self):
+        self.usernames, self.users, self.user_profiles, self.company = create_multiple_users(2)
+
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'companies.bloom')
+
+        self.key_filter = KeyFilter(self.path, capacity=100)
+
+        class FilteredCompanyImporter(AutoCompanyImporter):
+            key_filter = self.key_filter
+
+        self.importer = FilteredCompanyImporter
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def lookup(self, natural_ids):
+        manager = ImporterManager(importer=self.importer())
+        for row,natural_id in enumerate(natural_ids):
+            manager.update_kvs(field_name='natural_id', value=natural_id, row=row)
+        manager.get_available_rows()
+        return manager
+
+    def test_absent_keys_are_not_looked_up(self):
+        self.lookup([self.company.natural_id])
+
+        with CaptureQueriesContext(connection) as queries:
+            manager = self.lookup(['absent0', 'absent1'])
+
+        #: Only the incremental refresh (nothing new since the last one)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(self.key_filter.skipped, 2)
+        self.assertFalse(manager.get_objs_and_meta(0)[0].available)
+
+        #: ... and are auto-created
+        manager.create_missing_rows()
+        self.assertEqual(manager.get_object_or_list(1).natural_id, 'absent1')
+
+        manager = self.lookup(['absent1', self.company.natural_id])
+        self.assertEqual(manager.get_object_or_list(0).natural_id, 'absent1')
+        self.assertEqual(manager.get_object_or_list(1), self.company)
+
+    def test_persisted_filter_is_refreshed_incrementally(self):
+        self.lookup([self.company.natural_id])
+        self.assertTrue(os.path.exists(self.path))
+        Company.objects.create(natural_id='later')
+
+        #: A new run loads the filter, and only scans objects created since
+        key_filter = KeyFilter(self.path, capacity=100)
+        self.assertEqual(key_filter.state['last_pk'], self.company.pk)
+        key_filter.refresh(Company, ['natural_id'])
+        self.assertTrue(key_filter.might_contain(('later',)))
+        self.assertTrue(key_filter.might_contain((self.company.natural_id,)))
+
+    def test_normalized_keys(self):
+        class FilteredUserImporter(CaseInsensitiveUserImporter):
+            key_filter = KeyFilter()
+
+        manager = ImporterManager(importer=FilteredUserImporter())
+        manager.update_kvs(field_name='username', value=f' {self.usernames[0].upper()} ', row=0)
+        manager.get_available_rows()
+
+        self.assertEqual(manager.get_object_or_list(0), self.users[0])
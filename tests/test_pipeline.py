@@ -0,0 +1,112 @@
+import os
+import tempfile
+import threading
+
+from django.test import TestCase, TransactionTestCase
+
+from .factory import create_multiple_users
+
+from ..simple_imports.pipeline import Pipeline, Stage
+from ..simple_imports.system_importer import SystemImporter
+
+from ..tests_app.models import Tag
+from ..tests_app.importers import AutoParentCategoryImporter,ChildCategoryImporter
+from ..tests_app.importers import CompanyImporter,UserImporter,UserProfileImporter,RankedTagImporter
+from ..tests_app.importers import RawRankedTagImporter
+
+
+class TestPipeline(TestCase):
+
+    def test_ordered_stage(self):
+        stored = []
+        pipeline = Pipeline([
+            Stage('double', lambda x: x * 2, workers=3),
+            Stage('store', stored.append, ordered=True),
+        ], queue_size=1)
+        pipeline.run(range(20))
+
+        self.assertEqual(stored, [x * 2 for x in range(20)])
+
+    def test_error_is_raised(self):
+        def fail(x):
+            if x == 3:
+                raise ValueError(x)
+            return x
+
+        with self.assertRaises(ValueError):
+            Pipeline([Stage('fail', fail, workers=2), Stage('store', lambda x: x)]).run(range(10))
+
+    def test_backpressure(self):
+        """The producer can't get more than a few items ahead of a blocked stage
+        """
+        release = threading.Event()
+        produced = []
+
+        def items():
+            for i in range(50):
+                produced.append(i)
+                yield i
+
+        def blocked(x):
+            release.wait()
+            return x
+
+        thread = threading.Thread(target=Pipeline([Stage('blocked', blocked)], queue_size=2).run, args=(items(),))
+        thread.start()
+        thread.join(timeout=0.2)
+        self.assertLessEqual(len(produced), 5)
+
+        release.set()
+        thread.join()
+        self.assertEqual(len(produced), 50)
+
+
+class TestPipelinedImport(TransactionTestCase):
+
+    def setUp(self):
+        self.usernames, _, _, self.company = create_multiple_users(3)
+
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.csvpath = os.path.join(self.tmpdir.name, 'tags.csv')
+        with open(self.csvpath, 'w') as f:
+            for i in range(25):
+                f.write(f'{self.company.natural_id},{self.usernames[i % 3]},slug{i},{i}\n')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_import_pipelined(self):
+        importer = SystemImporter(
+            [CompanyImporter, UserImporter, UserProfileImporter, RankedTagImporter], self.csvpath, chunk_size=4
+        )
+        self.assertEqual([[v.importer for v in level] for level in importer._get_levels()],
+                         [[CompanyImporter, UserImporter], [UserProfileImporter]])
+
+        importer.import_pipelined(workers=2)
+
+        self.assertEqual(sorted(Tag.objects.values_list('rank', flat=True)), list(range(25)))
+        self.assertEqual(importer.row_offset, 25)
+
+    def test_raw_inserts_from_another_thread(self):
+        """Inserters are reused across imports, from whichever thread stores the chunks
+        """
+        importer = SystemImporter(
+            [CompanyImporter, UserImporter, UserProfileImporter, RawRankedTagImporter], self.csvpath, chunk_size=4
+        )
+        importer.import_data()
+
+        with open(self.csvpath, 'w') as f:
+            for i in range(25, 30):
+                f.write(f'{self.company.natural_id},{self.usernames[i % 3]},slug{i},{i}\n')
+        importer.import_pipelined(workers=2)
+
+        self.assertEqual(sorted(Tag.objects.values_list('rank', flat=True)), list(range(30)))
+
+    def test_auto_create_is_resolved_by_one_worker(self):
+        importer = SystemImporter([AutoParentCategoryImporter, ChildCategoryImporter], self.csvpath, chunk_size=2)
+        self.assertEqual([stage.workers for stage in importer._get_resolve_stages(8)], [1])
+
+        importer = SystemImporter(
+            [CompanyImporter, UserImporter, UserProfileImporter, RankedTagImporter], self.csvpath, chunk_size=2
+        )
+        self.assertEqual([stage.workers for stage in importer._get_resolve_stages(8)], [8, 8])
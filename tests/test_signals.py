@@ -0,0 +1,67 @@
+import os
+import tempfile
+from typing import *
+
+from django.db import transaction
+from django.test import TestCase
+
+from .factory import create_multiple_users
+
+from ..simple_imports.signals import chunk_imported
+from ..simple_imports.system_importer import SystemImporter
+
+from ..tests_app.models import Tag, Comment
+from ..tests_app.importers import RANKED_TAG_IMPORTERS, RankedTagImporter, CommentImporter
+
+
+class TestChunkImported(TestCase):
+
+    def setUp(self):
+        self.usernames, _, _, self.company = create_multiple_users(2)
+
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.csvpath = os.path.join(self.tmpdir.name, 'tags.csv')
+        rows = [f'{self.company.natural_id},{self.usernames[i % 2]},slug{i},{i},comment{i}' for i in range(5)]
+        rows[1] = f'{self.company.natural_id},nobody,slug1,1,comment1'
+        with open(self.csvpath, 'w') as f:
+            f.write('\n'.join(rows) + '\n')
+
+        self.received: List[dict] = []
+        chunk_imported.connect(self.receive)
+        self.addCleanup(chunk_imported.disconnect, self.receive)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def get_importer(self) -> SystemImporter:
+        return SystemImporter(RANKED_TAG_IMPORTERS + [CommentImporter], self.csvpath, chunk_size=2,
+                              roots=[RankedTagImporter, CommentImporter])
+
+    def receive(self, sender, **kwargs):
+        self.received.append({'sender': sender, **kwargs})
+
+    def test_one_signal_per_chunk_and_root(self):
+        importer = self.get_importer()
+        with self.captureOnCommitCallbacks(execute=True):
+            importer.import_data()
+
+        self.assertEqual([(s['sender'], s['rows']) for s in self.received], [
+            (Tag, [0]), (Comment, [0]), (Tag, [2, 3]), (Comment, [2, 3]), (Tag, [4]), (Comment, [4]),
+        ])
+        for signal in self.received:
+            self.assertIs(signal['importer'], importer)
+            self.assertEqual(signal['using'], 'default')
+
+        pks = [pk for signal in self.received if signal['sender'] is Tag for pk in signal['pks']]
+        self.assertEqual(sorted(Tag.objects.filter(pk__in=pks).values_list('slug', flat=True)),
+                         ['slug0', 'slug2', 'slug3', 'slug4'])
+        self.assertEqual(Tag.objects.count(), 4)
+
+    def test_nothing_is_sent_for_rolled_back_chunks(self):
+        importer = self.get_importer()
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                importer.import_data()
+                transaction.set_rollback(True)
+
+        self.assertEqual(self.received, [])
@@ -0,0 +1,89 @@
+import gzip
+import json
+import os
+import tempfile
+
+from django.test import TestCase
+
+from .factory import create_multiple_users
+
+from ..simple_imports.duplicates import DuplicateDetector, LAST_WINS
+from ..simple_imports.system_importer import SystemImporter
+from ..simple_imports.sources import CsvSource, JsonLinesSource, IterableSource
+
+from ..tests_app.models import Tag
+from ..tests_app.importers import CompanyImporter,UserImporter,UserProfileImporter,RankedTagImporter
+
+
+class TestSources(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.rows = [['fft', 'ABCD', f'slug{i}', str(i)] for i in range(5)]
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_gzipped_csv_source(self):
+        path = os.path.join(self.tmpdir.name, 'rows.csv.gz')
+        with gzip.open(path, 'wt') as f:
+            f.write('natural_id,username,slug,rank\n')
+            for row in self.rows:
+                f.write(','.join(row) + '\n')
+
+        source = CsvSource(path, header=True)
+        read = list(source.rows())
+        self.assertEqual([row for _, row in read], self.rows)
+        self.assertIsNone(source.size)
+
+        #: Resuming from a position skips every row before it
+        self.assertEqual([row for _, row in source.rows(read[2][0])], self.rows[3:])
+
+    def test_json_lines_source(self):
+        path = os.path.join(self.tmpdir.name, 'rows.jsonl')
+        fields = ['natural_id', 'username', 'slug', 'rank']
+        with open(path, 'w') as f:
+            for row in self.rows:
+                f.write(json.dumps(dict(zip(fields, row[:3] + [int(row[3])]))) + '\n')
+
+        self.assertEqual([row for _, row in JsonLinesSource(path, fields=fields).rows()], self.rows)
+
+        with self.assertRaises(ValueError):
+            list(JsonLinesSource(path).rows())
+
+    def test_iterable_source(self):
+        source = IterableSource(self.rows)
+        self.assertEqual(source.size, 5)
+        self.assertEqual(list(source.rows(3)), [(4, self.rows[3]), (5, self.rows[4])])
+
+    def test_import_iterable_source(self):
+        usernames, _, _, company = create_multiple_users(2)
+        rows = ((company.natural_id, usernames[i % 2], f'slug{i}', i) for i in range(5))
+
+        SystemImporter(
+            [CompanyImporter, UserImporter, UserProfileImporter, RankedTagImporter], IterableSource(rows),
+            chunk_size=2
+        ).import_data()
+
+        self.assertEqual(sorted(Tag.objects.values_list('rank', flat=True)), list(range(5)))
+
+    def test_generator_source_is_read_once(self):
+        usernames, _, _, company = create_multiple_users(2)
+        importers = [CompanyImporter, UserImporter, UserProfileImporter, RankedTagImporter]
+
+        #: Scanning for duplicates would use up the generator before the import reads it
+        rows = ((company.natural_id, usernames[i % 2], f'slug{i % 3}', i % 3) for i in range(5))
+        with self.assertRaises(RuntimeError):
+            SystemImporter(importers, IterableSource(rows), chunk_size=2,
+                           duplicates=DuplicateDetector(policy=LAST_WINS)).import_data()
+
+        rows = [(company.natural_id, usernames[i % 2], f'slug{i % 3}', i % 3) for i in range(5)]
+        SystemImporter(importers, IterableSource(rows), chunk_size=2,
+                       duplicates=DuplicateDetector(policy=LAST_WINS)).import_data()
+        self.assertEqual(Tag.objects.count(), 3)
+        self.assertEqual(Tag.objects.get(slug='slug0').created_by.user.username, usernames[1])
+
+        source = IterableSource(iter(rows))
+        list(source.rows())
+        with self.assertRaises(RuntimeError):
+            list(source.rows())
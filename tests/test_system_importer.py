@@ -0,0 +1,541 @@
+import os
+import tempfile
+from typing import *
+
+from django.core.management import call_command
+from django.db import OperationalError, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from .factory import create_multiple_users
+
+from ..simple_imports import helpers
+from ..simple_imports.system_importer import SystemImporter
+from ..simple_imports.checkpoint import FileCheckpoint, CacheCheckpoint
+from ..simple_imports.fingerprints import FingerprintStore
+from ..simple_imports.duplicates import DuplicateDetector, FIRST_WINS, LAST_WINS, REPORT
+from ..simple_imports.progress import ChunkStats, ThroughputObserver
+from ..simple_imports.cache import DependencyCache
+from ..simple_imports.sources import IterableSource, get_file_identity
+
+from ..tests_app.models import Company,Tag,Comment,Category
+from ..tests_app.importers import CompanyImporter,UserImporter,UserProfileImporter,RankedTagImporter,CommentImporter
+from ..tests_app.importers import RawRankedTagImporter,RawCommentImporter
+from ..tests_app.importers import ParentCategoryImporter,CategoryImporter,RawCategoryImporter
+from ..tests_app.importers import DefaultParentCategoryImporter,DefaultChildCategoryImporter
+
+
+class TestSystemImporter(TestCase):
+
+    def setUp(self):
+        self.n_objs = 4
+        self.usernames, self.users, self.user_profiles, self.company = create_multiple_users(self.n_objs)
+
+        self.importers = [CompanyImporter, UserImporter, UserProfileImporter, RankedTagImporter]
+
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.csvpath = os.path.join(self.tmpdir.name, 'tags.csv')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write_rows(self, rows: List[str]):
+        with open(self.csvpath, 'w') as f:
+            for row in rows:
+                f.write(f'{row}\n')
+
+    def tag_rows(self, n: int) -> List[str]:
+        return [
+            f'{self.company.natural_id},{self.usernames[i % self.n_objs]},slug{i},{i}' for i in range(n)
+        ]
+
+    def test_import_format(self):
+        self.write_rows([])
+        importer = SystemImporter(self.importers, self.csvpath)
+        self.assertEqual(importer.csv_import_format, 'natural_id,username,slug,rank,')
+        self.assertEqual(importer.create_model, Tag)
+
+    def test_import_data(self):
+        self.write_rows(self.tag_rows(6))
+
+        importer = SystemImporter(self.importers, self.csvpath)
+        importer.import_data()
+        importer.new_objects = importer.get_new_objects()
+        importer.store_data()
+
+        self.assertEqual(Tag.objects.count(), 6)
+        for i, tag in enumerate(Tag.objects.order_by('rank')):
+            self.assertEqual(tag.slug, f'slug{i}')
+            self.assertEqual(tag.company_id, self.company.id)
+            self.assertEqual(tag.created_by.user.username, self.usernames[i % self.n_objs])
+
+    def test_chunked_import_data(self):
+        self.write_rows(self.tag_rows(7))
+
+        SystemImporter(self.importers, self.csvpath, chunk_size=3).import_data()
+
+        self.assertEqual(Tag.objects.count(), 7)
+
+    def test_missing_dependency_is_reported(self):
+        rows = self.tag_rows(3)
+        rows[1] = f'{self.company.natural_id},nobody,slug1,1'
+        self.write_rows(rows)
+
+        importer = SystemImporter(self.importers, self.csvpath, chunk_size=2)
+        importer.import_data()
+
+        self.assertEqual(sorted(Tag.objects.values_list('slug', flat=True)), ['slug0', 'slug2'])
+        self.assertIn(1, importer.errors)
+        self.assertNotIn(0, importer.errors)
+        self.assertNotIn(2, importer.errors)
+
+    def test_multiple_roots(self):
+        rows = [f'{row},comment{i}' for i,row in enumerate(self.tag_rows(5))]
+        rows[1] = f'{self.company.natural_id},nobody,slug1,1,comment1'
+        self.write_rows(rows)
+
+        importers = self.importers + [CommentImporter]
+        importer = SystemImporter(importers, self.csvpath, chunk_size=2, roots=[RankedTagImporter, CommentImporter])
+        self.assertEqual(importer.csv_import_format, 'natural_id,username,slug,rank,body,')
+        importer.import_data()
+
+        self.assertEqual(importer.stored_objects, 8)
+        self.assertIn(1, importer.errors)
+        comments = Comment.objects.select_related('tag', 'created_by__user').order_by('body')
+        self.assertEqual([c.body for c in comments], ['comment0', 'comment2', 'comment3', 'comment4'])
+        for comment in comments:
+            #: Each comment points at the tag created from its own row
+            self.assertEqual(comment.tag.slug, comment.body.replace('comment', 'slug'))
+            self.assertEqual(comment.created_by_id, comment.tag.created_by_id)
+
+    def test_raw_insert(self):
+        rows = [f'{row},comment{i}' for i,row in enumerate(self.tag_rows(5))]
+        rows[1] = f'{self.company.natural_id},nobody,slug1,1,comment1'
+        self.write_rows(rows)
+
+        importers = [CompanyImporter, UserImporter, UserProfileImporter, RawRankedTagImporter, RawCommentImporter]
+        importer = SystemImporter(importers, self.csvpath, chunk_size=2, batch_size=1,
+                                  roots=[RawRankedTagImporter, RawCommentImporter])
+        importer.import_data()
+
+        self.assertEqual(importer.stored_objects, 8)
+        self.assertIn(1, importer.errors)
+        tags = Tag.objects.order_by('slug')
+        self.assertEqual([(t.slug, t.rank, t.name) for t in tags], [(f'slug{i}', i, '') for i in (0, 2, 3, 4)])
+        self.assertEqual(tags[0].created_by, self.user_profiles[0])
+        for comment in Comment.objects.select_related('tag'):
+            self.assertEqual(comment.tag.slug, comment.body.replace('comment', 'slug'))
+            self.assertEqual(comment.created_by_id, comment.tag.created_by_id)
+
+    def test_raw_insert_requires_plain_model(self):
+        class RawUserImporter(UserImporter):
+            raw_insert = True
+
+        #: User has a custom save()
+        with self.assertRaises(ValueError):
+            SystemImporter([RawUserImporter], self.csvpath)
+
+    def test_file_references(self):
+        Category.objects.create(slug='existing')
+        #: (parent, slug): children before their parents, a missing parent, a cycle, and a parent in the database
+        self.write_rows(['b,c', ',a', 'a,b', 'nowhere,x', 'e,d', 'd,e', 'existing,f', 'c,g'])
+
+        for importer_class in (CategoryImporter, RawCategoryImporter):
+            Category.objects.exclude(slug='existing').delete()
+
+            importer = SystemImporter([ParentCategoryImporter, importer_class], self.csvpath)
+            importer.import_data()
+            importer.new_objects = importer.get_new_objects()
+            importer.store_data()
+
+            self.assertEqual(importer.last_stored_objects, 5)
+            self.assertEqual(sorted(importer.errors), [3, 4, 5])
+            parents = {c.slug: c.parent.slug if c.parent else None for c in Category.objects.select_related('parent')}
+            self.assertEqual(parents, {
+                'existing': None, 'a': None, 'b': 'a', 'c': 'b', 'f': 'existing', 'g': 'c',
+            })
+
+    def test_file_references_across_chunks(self):
+        self.write_rows([',a', 'a,b', 'b,c', 'a,d'])
+
+        SystemImporter([ParentCategoryImporter, CategoryImporter], self.csvpath, chunk_size=2).import_data()
+
+        parents = {c.slug: c.parent.slug if c.parent else None for c in Category.objects.select_related('parent')}
+        self.assertEqual(parents, {'a': None, 'b': 'a', 'c': 'b', 'd': 'a'})
+
+    def test_file_references_to_later_chunks(self):
+        """Rows referencing rows of later chunks are imported once the whole file has been read
+        """
+        self.write_rows(['a,b', 'b,c', ',a', 'nowhere,x', 'c,d'])
+
+        checkpoint = FileCheckpoint(os.path.join(self.tmpdir.name, 'categories.checkpoint'))
+        states = []
+        importer = SystemImporter([ParentCategoryImporter, CategoryImporter], self.csvpath, chunk_size=1,
+                                  checkpoint=checkpoint,
+                                  progress=lambda importer, stats: states.append(checkpoint.load()))
+        importer.import_data()
+
+        parents = {c.slug: c.parent.slug if c.parent else None for c in Category.objects.select_related('parent')}
+        self.assertEqual(parents, {'a': None, 'b': 'a', 'c': 'b', 'd': 'c'})
+        self.assertEqual(list(importer.errors), [3])
+        #: A restart would still import the deferred rows
+        self.assertEqual(states[1]['deferred'], [[0, ['a', 'b']], [1, ['b', 'c']]])
+        self.assertEqual(importer.row_offset, 5)
+
+        #: Resumed after the second chunk
+        Category.objects.all().delete()
+        checkpoint.save(row=2, offset=len('a,b\nb,c\n'), source=get_file_identity(self.csvpath),
+                        deferred=states[1]['deferred'])
+        SystemImporter([ParentCategoryImporter, CategoryImporter], self.csvpath, chunk_size=1,
+                       checkpoint=checkpoint).import_data()
+        self.assertEqual(Category.objects.count(), 4)
+
+    def test_file_references_must_be_self_references(self):
+        class BadImporter(RankedTagImporter):
+            file_references = ('company',)
+
+        with self.assertRaises(ValueError):
+            SystemImporter([CompanyImporter, UserImporter, UserProfileImporter, BadImporter], self.csvpath)
+
+    def test_scope(self):
+        self.write_rows(self.tag_rows(3))
+
+        with self.assertRaises(ValueError):
+            SystemImporter(self.importers, self.csvpath, scope={'tenant': self.company.id})
+
+        importer = SystemImporter(self.importers, self.csvpath, chunk_size=2, scope={'company_id': self.company.id})
+        importer.import_data()
+        self.assertEqual(Tag.objects.count(), 3)
+
+        other = Company.objects.create(natural_id='other')
+        importer = SystemImporter(self.importers, self.csvpath, scope={'company_id': other.id})
+        importer.import_data()
+        #: The user profiles belong to another tenant
+        self.assertEqual(sorted(importer.errors), [0, 1, 2])
+
+    def test_non_root_depending_on_root(self):
+        with self.assertRaises(ValueError):
+            SystemImporter(self.importers + [CommentImporter], self.csvpath, roots=[RankedTagImporter])
+
+    def test_import_batch(self):
+        paths = []
+        for n in range(3):
+            paths.append(os.path.join(self.tmpdir.name, f'tags{n}.csv'))
+            with open(paths[-1], 'w') as f:
+                for i in range(3):
+                    f.write(f'{self.company.natural_id},{self.usernames[i]},file{n}-slug{i},{i}\n')
+
+        #: A malformed row (one column too many) fails the second file
+        with open(paths[1], 'a') as f:
+            f.write(f'{self.company.natural_id},{self.usernames[0]},file1-slug3,3,extra\n')
+
+        cache = DependencyCache()
+        importer = SystemImporter(self.importers, paths[0], chunk_size=2, cache=cache)
+        results = importer.import_batch(paths, batch_rows=4)
+
+        self.assertEqual([r.committed for r in results], [True, False, True])
+        self.assertEqual([r.created for r in results], [3, 0, 3])
+        self.assertEqual([r.rows for r in results], [3, 2, 3])
+        self.assertEqual(
+            sorted(Tag.objects.values_list('slug', flat=True)),
+            [f'file{n}-slug{i}' for n in (0, 2) for i in range(3)]
+        )
+        #: The company, users and profiles of later files come from the cache
+        self.assertGreater(cache.hits, 0)
+
+    def test_database_aliases(self):
+        importer = SystemImporter(self.importers, self.csvpath, using='replica', write_using='default')
+        importer.written_importers.add(CompanyImporter)
+
+        managers, importers_to_manager = importer._create_managers()
+        self.assertEqual(importers_to_manager[UserImporter].using, 'replica')
+        #: Read back from where it was written to, once the chunk is resolved
+        self.assertEqual(importers_to_manager[CompanyImporter].using, 'replica')
+        importer._set_read_alias(CompanyImporter, importers_to_manager[CompanyImporter])
+        self.assertEqual(importers_to_manager[CompanyImporter].using, 'default')
+        self.assertEqual(importers_to_manager[RankedTagImporter].write_using, 'default')
+
+    def test_importers_write_using(self):
+        """Writes of importers with their own write_using (auto-created dependencies, and roots) run in transactions
+        on their alias rather than the import's (which isn't even configured here)
+        """
+        rows = [['parent0', 'child0'], ['parent0', 'child1'], ['parent1', 'child2']]
+        importer = SystemImporter([DefaultParentCategoryImporter, DefaultChildCategoryImporter], IterableSource(rows),
+                                  write_using='unconfigured', chunk_size=2, concurrent=True)
+        importer.import_data()
+
+        self.assertEqual(
+            sorted(Category.objects.filter(parent__isnull=False).values_list('slug', 'parent__slug')),
+            [('child0', 'parent0'), ('child1', 'parent0'), ('child2', 'parent1')]
+        )
+
+    def test_progress(self):
+        rows = self.tag_rows(5)
+        rows[1] = f'{self.company.natural_id},nobody,slug1,1'
+        self.write_rows(rows)
+
+        chunks: List[ChunkStats] = []
+        throughput = ThroughputObserver()
+        importer = SystemImporter(self.importers, self.csvpath, chunk_size=2,
+                                  progress=lambda importer, stats: chunks.append(stats), observers=[throughput])
+        importer.import_data()
+
+        self.assertEqual([stats.rows_read for stats in chunks], [2, 2, 1])
+        self.assertEqual([stats.rows_resolved for stats in chunks], [1, 2, 1])
+        self.assertEqual([stats.rows_written for stats in chunks], [1, 2, 1])
+        self.assertEqual([stats.errors for stats in chunks], [1, 0, 0])
+        self.assertEqual(chunks[-1].position, os.path.getsize(self.csvpath))
+        self.assertEqual(chunks[-1].done, 1.0)
+
+        self.assertEqual(throughput.rows_read, 5)
+        self.assertEqual(throughput.rows_written, 4)
+        self.assertEqual(throughput.errors, 1)
+        self.assertEqual(throughput.eta, 0.0)
+        self.assertIsNotNone(throughput.end)
+
+    def test_stalled_import_is_aborted(self):
+        self.write_rows(self.tag_rows(4))
+
+        importer = SystemImporter(self.importers, self.csvpath, chunk_size=2,
+                                  observers=[ThroughputObserver(stall_timeout=-1)])
+        with self.assertRaises(RuntimeError):
+            importer.import_data()
+
+        #: The chunk that tripped the watchdog had already been committed
+        self.assertEqual(Tag.objects.count(), 2)
+
+    def test_checkpoint_resume(self):
+        rows = self.tag_rows(5)
+        self.write_rows(rows)
+
+        checkpoint = FileCheckpoint(os.path.join(self.tmpdir.name, 'tags.checkpoint'))
+        #: Pretend a previous run committed the first two rows
+        identity = get_file_identity(self.csvpath)
+        checkpoint.save(row=2, offset=len(rows[0]) + len(rows[1]) + 2, source=identity)
+
+        states = []
+        importer = SystemImporter(self.importers, self.csvpath, chunk_size=2, checkpoint=checkpoint,
+                                  progress=lambda importer, stats: states.append(checkpoint.load()))
+        importer.import_data()
+
+        self.assertEqual(sorted(Tag.objects.values_list('slug', flat=True)), ['slug2', 'slug3', 'slug4'])
+        self.assertEqual(states[-1], {'row': 5, 'offset': os.path.getsize(self.csvpath), 'source': identity,
+                                      'deferred': []})
+        #: Nothing is left to resume
+        self.assertIsNone(checkpoint.load())
+
+    def test_checkpoint_of_another_file(self):
+        self.write_rows(self.tag_rows(5))
+        checkpoint = FileCheckpoint(os.path.join(self.tmpdir.name, 'tags.checkpoint'))
+        checkpoint.save(row=2, offset=10, source={**get_file_identity(self.csvpath), 'size': 1})
+
+        with self.assertRaises(RuntimeError):
+            SystemImporter(self.importers, self.csvpath, chunk_size=2, checkpoint=checkpoint).import_data()
+        self.assertEqual(Tag.objects.count(), 0)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+                                           'LOCATION': 'simple_imports_cache'}})
+    def test_checkpoint_in_chunk_transaction(self):
+        """A checkpoint kept in the database is rolled back with the chunk it records
+        """
+        call_command('createcachetable', verbosity=0)
+        self.write_rows(self.tag_rows(4))
+
+        class FailingCheckpoint(CacheCheckpoint):
+            def save(self, row, offset, source=None, deferred=None):
+                super().save(row, offset, source, deferred)
+                if row == 4:
+                    raise RuntimeError('Crash')
+
+        checkpoint = FailingCheckpoint('tags')
+        self.assertTrue(checkpoint.is_transactional('default'))
+        with self.assertRaises(RuntimeError):
+            SystemImporter(self.importers, self.csvpath, chunk_size=2, checkpoint=checkpoint).import_data()
+
+        self.assertEqual(Tag.objects.count(), 2)
+        self.assertEqual(checkpoint.load()['row'], 2)
+
+    def test_incremental_import_skips_unchanged_rows(self):
+        fingerprints = FingerprintStore(os.path.join(self.tmpdir.name, 'tags.fingerprints'))
+        rows = self.tag_rows(4)
+        self.write_rows(rows)
+        #: (Fingerprints are written as chunks commit)
+        with self.captureOnCommitCallbacks(execute=True):
+            SystemImporter(self.importers, self.csvpath, chunk_size=2, fingerprints=fingerprints).import_data()
+        self.assertEqual(Tag.objects.count(), 4)
+
+        #: Next snapshot: one row changed, one row added
+        rows[1] = f'{self.company.natural_id},{self.usernames[1]},slug1,99'
+        rows.append(f'{self.company.natural_id},{self.usernames[0]},slug4,4')
+        self.write_rows(rows)
+
+        importer = SystemImporter(self.importers, self.csvpath, chunk_size=2, fingerprints=fingerprints)
+        importer.import_data()
+        fingerprints.close()
+
+        self.assertEqual(importer.unchanged_rows, 3)
+        self.assertEqual(Tag.objects.count(), 6)
+        self.assertTrue(Tag.objects.filter(slug='slug1', rank=99).exists())
+        self.assertTrue(Tag.objects.filter(slug='slug4').exists())
+
+    def test_incremental_import_reports_changed_rows(self):
+        fingerprints = FingerprintStore(os.path.join(self.tmpdir.name, 'tags.fingerprints'))
+        rows = self.tag_rows(4)
+        self.write_rows(rows)
+        with self.captureOnCommitCallbacks(execute=True):
+            SystemImporter(self.importers, self.csvpath, chunk_size=2, fingerprints=fingerprints).import_data()
+
+        #: Same key (slug, rank), created by another user
+        rows[1] = f'{self.company.natural_id},{self.usernames[2]},slug1,1'
+        self.write_rows(rows)
+
+        importer = SystemImporter(self.importers, self.csvpath, chunk_size=2, fingerprints=fingerprints)
+        importer.import_data()
+        fingerprints.close()
+
+        self.assertEqual(importer.unchanged_rows, 3)
+        self.assertEqual(list(importer.errors), [1])
+        self.assertEqual(Tag.objects.filter(slug='slug1', rank=1).count(), 1)
+        self.assertEqual(Tag.objects.count(), 4)
+
+    def test_fingerprints_are_written_on_commit(self):
+        fingerprints = FingerprintStore(os.path.join(self.tmpdir.name, 'tags.fingerprints'))
+        self.write_rows(self.tag_rows(4))
+
+        #: The import is rolled back with the outer transaction, so its rows are new to the next run
+        with transaction.atomic():
+            SystemImporter(self.importers, self.csvpath, chunk_size=2, fingerprints=fingerprints).import_data()
+            transaction.set_rollback(True)
+
+        importer = SystemImporter(self.importers, self.csvpath, chunk_size=2, fingerprints=fingerprints)
+        importer.import_data()
+        fingerprints.close()
+
+        self.assertEqual(importer.unchanged_rows, 0)
+        self.assertEqual(Tag.objects.count(), 4)
+
+    def write_duplicate_rows(self):
+        rows = self.tag_rows(4)
+        #: Same key (slug, rank) as row 1, created by different users
+        rows.append(f'{self.company.natural_id},{self.usernames[2]},slug1,1')
+        rows.append(f'{self.company.natural_id},{self.usernames[3]},slug1,1')
+        self.write_rows(rows)
+
+    def test_duplicates_first_wins(self):
+        self.write_duplicate_rows()
+        #: max_keys=2 forces the detector to spill keys to disk part way through the file
+        detector = DuplicateDetector(policy=FIRST_WINS, max_keys=2, spill_dir=self.tmpdir.name)
+        SystemImporter(self.importers, self.csvpath, chunk_size=2, duplicates=detector).import_data()
+
+        self.assertEqual(
+            list(Tag.objects.filter(slug='slug1').values_list('created_by__user__username', flat=True)),
+            [self.usernames[1]]
+        )
+        self.assertEqual([(row, kept) for row, _, kept in detector.duplicates], [(4, 1), (5, 1)])
+        detector.close()
+
+    def test_duplicates_last_wins(self):
+        self.write_duplicate_rows()
+        detector = DuplicateDetector(policy=LAST_WINS)
+        SystemImporter(self.importers, self.csvpath, chunk_size=2, duplicates=detector).import_data()
+
+        self.assertEqual(
+            list(Tag.objects.filter(slug='slug1').values_list('created_by__user__username', flat=True)),
+            [self.usernames[3]]
+        )
+        self.assertEqual(Tag.objects.count(), 4)
+
+    def test_duplicates_report(self):
+        self.write_duplicate_rows()
+        detector = DuplicateDetector(policy=REPORT)
+        SystemImporter(self.importers, self.csvpath, chunk_size=2, duplicates=detector).import_data()
+
+        self.assertFalse(Tag.objects.filter(slug='slug1').exists())
+        self.assertEqual(Tag.objects.count(), 3)
+        self.assertEqual([row for row, _, _ in detector.duplicates], [1, 4, 5])
+
+    def test_concurrent_import(self):
+        self.write_rows(list(reversed(self.tag_rows(5))))
+
+        importer = SystemImporter(self.importers, self.csvpath, chunk_size=5, concurrent=True)
+        importer.import_data()
+
+        #: Written in key order, rather than file order
+        self.assertEqual(
+            list(Tag.objects.order_by('pk').values_list('slug', flat=True)), [f'slug{i}' for i in range(5)]
+        )
+
+    def test_no_retry_on_lock_within_transaction(self):
+        attempts = []
+
+        def deadlocked_once():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise OperationalError('database is locked')
+            return 'done'
+
+        #: Inside a TestCase's transaction, nothing is retried
+        with self.assertRaises(OperationalError):
+            helpers.retry_on_lock(deadlocked_once, backoff=0)
+
+    async def test_aimport_data(self):
+        rows = self.tag_rows(7)
+        rows[4] = f'{self.company.natural_id},nobody,slug4,4'
+        self.write_rows(rows)
+
+        importer = SystemImporter(self.importers, self.csvpath, chunk_size=3)
+        await importer.aimport_data()
+
+        self.assertEqual(await Tag.objects.acount(), 6)
+        self.assertEqual(list(importer.errors.keys()), [4])
+
+
+class DriverError(Exception):
+    """Stands in for the exceptions of database drivers
+    """
+
+    def __init__(self, *args, **attributes):
+        super().__init__(*args)
+        self.__dict__.update(attributes)
+
+
+def get_driver_error(*args, **attributes) -> OperationalError:
+    error = OperationalError(*args)
+    error.__cause__ = DriverError(*args, **attributes)
+    return error
+
+
+class TestRetryOnLock(TransactionTestCase):
+
+    def test_is_lock_error(self):
+        self.assertTrue(helpers.is_lock_error(get_driver_error('deadlock detected', pgcode='40P01')))
+        self.assertTrue(helpers.is_lock_error(get_driver_error('timeout', sqlstate='55P03')))
+        self.assertFalse(helpers.is_lock_error(get_driver_error('block size exceeded', pgcode='54000')))
+        self.assertTrue(helpers.is_lock_error(get_driver_error(1213, 'Deadlock found')))
+        self.assertFalse(helpers.is_lock_error(get_driver_error(1064, 'Syntax error near "lock"')))
+        #: (SQLITE_BUSY_SNAPSHOT is an extended SQLITE_BUSY)
+        self.assertTrue(helpers.is_lock_error(get_driver_error('database is locked', sqlite_errorcode=517)))
+        self.assertTrue(helpers.is_lock_error(OperationalError('database is locked')))
+        self.assertFalse(helpers.is_lock_error(OperationalError('no such table: block')))
+
+    def test_retry_on_lock(self):
+        attempts = []
+
+        def locked_once():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise get_driver_error('database is locked', sqlite_errorcode=5)
+            return 'done'
+
+        self.assertEqual(helpers.retry_on_lock(locked_once, backoff=0), 'done')
+        self.assertEqual(len(attempts), 2)
+
+    def test_retries_are_limited(self):
+        attempts = []
+
+        def locked():
+            attempts.append(1)
+            raise OperationalError('database is locked')
+
+        with self.assertRaises(OperationalError):
+            helpers.retry_on_lock(locked, retries=2, backoff=0)
+        self.assertEqual(len(attempts), 3)
@@ -0,0 +1,106 @@
+import math
+import os
+import tempfile
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import TestCase
+
+from .factory import create_multiple_users
+
+from ..simple_imports import tuning
+from ..simple_imports.progress import ChunkStats
+from ..simple_imports.sources import IterableSource
+from ..simple_imports.system_importer import SystemImporter
+from ..simple_imports.tuning import AdaptiveChunkSize
+
+from ..tests_app.models import Tag
+from ..tests_app.importers import RANKED_TAG_IMPORTERS
+
+
+def get_stats(rows: int, seconds: float) -> ChunkStats:
+    return ChunkStats(rows_read=rows, rows_skipped=0, rows_resolved=rows, rows_written=rows, errors=0,
+                      position=None, size=None, seconds=seconds)
+
+
+class TestAdaptiveChunkSize(TestCase):
+
+    def run_search(self, tuner: AdaptiveChunkSize, importer, rows_per_second, max_chunks: int = 200):
+        for _ in range(max_chunks):
+            size = importer.chunk_size
+            tuner.chunk_committed(importer, get_stats(size, size / rows_per_second(size)))
+            if tuner.converged:
+                return
+        self.fail('The chunk size search did not converge.')
+
+    def test_converges_on_the_fastest_size(self):
+        #: Throughput peaks at 1600 rows per chunk
+        def rows_per_second(size: int) -> float:
+            return 1000 - 50 * (math.log2(size) - math.log2(1600)) ** 2
+
+        importer = SimpleNamespace(chunk_size=100)
+        tuner = AdaptiveChunkSize(min_size=10, max_size=100000, samples=1)
+        tuner.started(importer)
+        self.run_search(tuner, importer, rows_per_second)
+
+        self.assertLess(abs(math.log2(importer.chunk_size / 1600)), math.log2(1.5))
+        self.assertEqual(importer.chunk_size, max(tuner.history, key=lambda h: h[1])[0])
+
+    def test_bounds(self):
+        importer = SimpleNamespace(chunk_size=100)
+        tuner = AdaptiveChunkSize(min_size=50, max_size=400, samples=1)
+        tuner.started(importer)
+        #: Always faster with larger chunks
+        self.run_search(tuner, importer, lambda size: size)
+
+        self.assertEqual(importer.chunk_size, 400)
+
+    def test_limits_shrink_chunks(self):
+        importer = SimpleNamespace(chunk_size=1000)
+        tuner = AdaptiveChunkSize(min_size=10, max_seconds=5, memory_budget=10 ** 9)
+        tuner.started(importer)
+
+        tuner.chunk_committed(importer, get_stats(1000, 6))
+        self.assertEqual(importer.chunk_size, 500)
+        self.assertEqual(tuner.max_size, 999)
+
+        with mock.patch.object(tuning, 'get_rss', return_value=2 * 10 ** 9):
+            tuner.chunk_committed(importer, get_stats(500, 1))
+        self.assertEqual(importer.chunk_size, 250)
+
+        #: The next import (e.g. the next file of a batch) starts from the original bounds
+        tuner.started(importer)
+        self.assertEqual(tuner.max_size, 100000)
+
+    def test_chunks_read_ahead(self):
+        """A chunk size lowered below the rows already read for a chunk still ends chunks
+        """
+        importer = SystemImporter(RANKED_TAG_IMPORTERS, IterableSource([]), chunk_size=4)
+
+        def rows():
+            for i in range(12):
+                if i == 6:
+                    importer.chunk_size = 2
+                yield [str(i)]
+        importer.source = IterableSource(rows())
+
+        self.assertEqual([[row[0] for row in chunk] for chunk, _ in importer._read_chunks()],
+                         [['0', '1', '2', '3'], ['4', '5', '6', '7'], ['8', '9'], ['10', '11']])
+
+    def test_requires_chunked_import(self):
+        with self.assertRaises(RuntimeError):
+            AdaptiveChunkSize().started(SimpleNamespace(chunk_size=None))
+
+    def test_import(self):
+        usernames, _, _, company = create_multiple_users(2)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'tags.csv')
+            with open(path, 'w') as f:
+                for i in range(60):
+                    f.write(f'{company.natural_id},{usernames[i % 2]},slug{i},{i}\n')
+
+            tuner = AdaptiveChunkSize(min_size=2, max_size=16, samples=1)
+            SystemImporter(RANKED_TAG_IMPORTERS, path, chunk_size=4, observers=[tuner]).import_data()
+
+        self.assertEqual(Tag.objects.count(), 60)
+        self.assertTrue(tuner.history)
@@ -5,7 +5,7 @@ from django.db import models
 from ..simple_imports.model_importer import ModelImporter
 
 from django.contrib.auth.models import User
-from .models import Company,UserProfile,Tag,Image
+from .models import Company,UserProfile,Tag,Image,Comment,Category
 
 class CompanyImporter(ModelImporter):
     model = Company
@@ -17,6 +17,10 @@ class CompanyImporter(ModelImporter):
     required_fields = ('natural_id',)
 
 
+class AutoCompanyImporter(CompanyImporter):
+    auto_create = True
+
+
 class UserImporter(ModelImporter):
     model = User
 
@@ -27,6 +31,12 @@ class UserImporter(ModelImporter):
     required_fields = ('username',)
 
 
+class CaseInsensitiveUserImporter(UserImporter):
+    normalize_keys = {
+        'username': ('strip', 'lower'),
+    }
+
+
 class UserProfileImporter(ModelImporter):
     model = UserProfile
 
@@ -58,6 +68,109 @@ class TagImporter(ModelImporter):
     })
 
 
+class RankedTagImporter(TagImporter):
+    """Supplies every field needed to create a Tag (rather than just look one up)
+    """
+    field_types = {
+        'slug':str,
+        'rank': int,
+        'created_by': models.Model,
+        'company': models.Model,
+    }
+
+    required_fields = ('slug','rank',)
+
+
+class RawRankedTagImporter(RankedTagImporter):
+    raw_insert = True
+
+
+#: Everything needed to create Tags (see `simple_import` management command tests)
+RANKED_TAG_IMPORTERS = [CompanyImporter, UserImporter, UserProfileImporter, RankedTagImporter]
+
+
+class CommentImporter(ModelImporter):
+    """Created alongside the Tag it comments on (i.e. a second root, see `SystemImporter`'s `roots`)
+    """
+    model = Comment
+
+    field_types = {
+        'body': str,
+        'tag': models.Model,
+        'created_by': models.Model,
+    }
+
+    required_fields = ('body',)
+
+    dependent_imports = OrderedDict({
+        'tag': RankedTagImporter,
+        'created_by': UserProfileImporter,
+    })
+
+
+class RawCommentImporter(CommentImporter):
+    raw_insert = True
+
+    dependent_imports = OrderedDict({
+        'tag': RawRankedTagImporter,
+        'created_by': UserProfileImporter,
+    })
+
+
+class ParentCategoryImporter(ModelImporter):
+    model = Category
+
+    required_fields = ('slug',)
+
+
+class CategoryImporter(ModelImporter):
+    """Rows may reference parents defined anywhere in the same file (empty => no parent)
+    """
+    model = Category
+
+    required_fields = ('slug',)
+
+    dependent_imports = OrderedDict({
+        'parent': ParentCategoryImporter,
+    })
+
+    file_references = ('parent',)
+
+
+class RawCategoryImporter(CategoryImporter):
+    raw_insert = True
+
+
+class AutoParentCategoryImporter(ParentCategoryImporter):
+    auto_create = True
+
+
+class ChildCategoryImporter(ModelImporter):
+    """Parents missing from the database are created
+    """
+    model = Category
+
+    required_fields = ('slug',)
+
+    dependent_imports = OrderedDict({
+        'parent': AutoParentCategoryImporter,
+    })
+
+
+class DefaultParentCategoryImporter(AutoParentCategoryImporter):
+    write_using = 'default'
+
+
+class DefaultChildCategoryImporter(ChildCategoryImporter):
+    """Writes to the default database, whatever the `SystemImporter`'s write_using
+    """
+    write_using = 'default'
+
+    dependent_imports = OrderedDict({
+        'parent': DefaultParentCategoryImporter,
+    })
+
+
 class ImageImporter(ModelImporter):
     model = Image
 
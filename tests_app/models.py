@@ -47,6 +47,20 @@ class Document(models.Model):
     image = models.ForeignKey(Image, on_delete=models.CASCADE)
 
 
+class Comment(models.Model):
+    tag = models.ForeignKey(Tag,on_delete=models.CASCADE)
+    created_by = models.ForeignKey(UserProfile,on_delete=models.CASCADE)
+
+    body = models.CharField(max_length=255,null=False)
+
+
+
+class Category(models.Model):
+    """A hierarchy, whose parents are usually defined by rows of the same file
+    """
+    slug = models.CharField(max_length=255)
+    parent = models.ForeignKey('self',on_delete=models.CASCADE,null=True)
+
 # *******************************************************************************
 # ******************* Generic Tables to Keep Tests Systematic *******************
 # *******************************************************************************